@@ -0,0 +1,103 @@
+"""
+Events per second through the backtest loop: the previous queue.Queue and
+if/elif dispatch against DequeEventBus/ThreadSafeEventBus with a Dispatcher.
+
+Each simulated bar posts one MarketEvent and a configurable number of
+signal/order/fill events, which are drained before the next bar, as in
+main_loop.backtest. Handlers are no-ops so only the loop overhead is measured.
+
+    python benchmarks/bench_event_loop.py [--bars 200000] [--events-per-bar 4]
+"""
+import argparse
+import queue
+import time
+
+from backtester.bus import DequeEventBus, Dispatcher, ThreadSafeEventBus
+from backtester.event import FillEvent, MarketEvent, OrderEvent, SignalEvent
+
+
+class Counter(object):
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, event):
+        self.count += 1
+
+
+def make_bar(events_per_bar):
+    follow_up = [
+        SignalEvent("BTC-USD", None, "LONG"),
+        OrderEvent("BTC-USD", "MKT", 100, "BUY"),
+        FillEvent(None, "BTC-USD", "ARCA", 100, "BUY", 1.0, 1.3),
+    ]
+    return [MarketEvent()] + [follow_up[i % 3] for i in range(events_per_bar - 1)]
+
+
+def legacy_loop(bars, bar, handler):
+    # The loop as it was: locking queue, queue.Empty to end each bar, string dispatch
+    events = queue.Queue()
+    for _ in range(bars):
+        for event in bar:
+            events.put(event)
+        while True:
+            try:
+                event = events.get(block=False)
+            except queue.Empty:
+                break
+            if event is not None:
+                if event.type == "MARKET":
+                    handler(event)
+                    handler(event)
+                elif event.type == "SIGNAL":
+                    handler(event)
+                elif event.type == "ORDER":
+                    handler(event)
+                elif event.type == "FILL":
+                    handler(event)
+
+
+def bus_loop(bars, bar, handler, events):
+    dispatcher = Dispatcher()
+    dispatcher.subscribe(MarketEvent, handler)
+    dispatcher.subscribe(MarketEvent, handler)
+    for event_class in (SignalEvent, OrderEvent, FillEvent):
+        dispatcher.subscribe(event_class, handler)
+    dispatch = dispatcher.dispatch
+    put = events.put
+    get = events.get
+    for _ in range(bars):
+        for event in bar:
+            put(event)
+        event = get()
+        while event is not None:
+            dispatch(event)
+            event = get()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--bars", type=int, default=200_000)
+    parser.add_argument("--events-per-bar", type=int, default=4)
+    args = parser.parse_args()
+    bar = make_bar(args.events_per_bar)
+    total = args.bars * len(bar)
+
+    runs = [
+        ("queue.Queue + if/elif", lambda handler: legacy_loop(args.bars, bar, handler)),
+        ("DequeEventBus + Dispatcher", lambda handler: bus_loop(args.bars, bar, handler, DequeEventBus())),
+        ("ThreadSafeEventBus + Dispatcher", lambda handler: bus_loop(args.bars, bar, handler, ThreadSafeEventBus())),
+    ]
+    baseline = None
+    print(f"{args.bars:,} bars x {len(bar)} events")
+    for name, run in runs:
+        handler = Counter()
+        start = time.perf_counter()
+        run(handler)
+        seconds = time.perf_counter() - start
+        rate = total / seconds
+        baseline = baseline or rate
+        print(f"{name:<32} {rate / 1e6:6.2f}M events/s  {rate / baseline:5.2f}x  ({handler.count:,} handler calls)")
+
+
+if __name__ == "__main__":
+    main()
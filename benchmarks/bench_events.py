@@ -0,0 +1,111 @@
+"""
+Allocation and memory cost of event objects, before and after the move to
+__slots__ and class-level `type`, plus the cost of recycling MarketEvents
+through an EventPool.
+
+    python benchmarks/bench_events.py [--events 1000000]
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from backtester.event import EventPool, FillEvent, MarketEvent, SignalEvent
+
+
+class LegacyMarketEvent:
+    # The dict-based MarketEvent the slotted one replaced
+    def __init__(self, datetime=None, symbols=None):
+        self.type = "MARKET"
+        self.datetime = datetime
+        self.symbols = symbols
+
+
+class LegacySignalEvent:
+    def __init__(self, symbol, datetime, signal_type):
+        self.type = "SIGNAL"
+        self.symbol = symbol
+        self.datetime = datetime
+        self.signal_type = signal_type
+
+
+class LegacyFillEvent:
+    def __init__(self, timeindex, symbol, exchange, quantity, direction, fill_cost, commission=None):
+        self.type = "FILL"
+        self.timeindex = timeindex
+        self.symbol = symbol
+        self.exchange = exchange
+        self.quantity = quantity
+        self.direction = direction
+        self.fill_cost = fill_cost
+        self.commision = commission
+
+
+def retained(factory, n):
+    """
+    Allocates n live events and returns (allocations, bytes) held by them.
+    """
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    events = [factory() for _ in range(n)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    allocations = sum(stat.count_diff for stat in stats)
+    size = sum(stat.size_diff for stat in stats)
+    # The list holding the events is not part of the cost of an event
+    size -= 8 * n
+    del events
+    return allocations, size
+
+
+def churn(factory, n, pool=None):
+    """
+    Creates and drops n events one at a time, returning the wall time.
+    """
+    start = time.perf_counter()
+    if pool is None:
+        for _ in range(n):
+            factory()
+    else:
+        for _ in range(n):
+            pool.release(factory())
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=1_000_000)
+    args = parser.parse_args()
+    n = args.events
+    scale = 1_000_000 / n
+    stamp = np.datetime64("2024-01-01T00:00", "ns")
+    symbols = ["BTC-USD"]
+
+    cases = [
+        ("MarketEvent", lambda: LegacyMarketEvent(stamp, symbols), lambda: MarketEvent(stamp, symbols)),
+        ("SignalEvent", lambda: LegacySignalEvent("BTC-USD", stamp, "LONG"),
+         lambda: SignalEvent("BTC-USD", stamp, "LONG")),
+        ("FillEvent", lambda: LegacyFillEvent(stamp, "BTC-USD", "ARCA", 100, "BUY", 1.0, 1.3),
+         lambda: FillEvent(stamp, "BTC-USD", "ARCA", 100, "BUY", 1.0, 1.3)),
+    ]
+    print(f"Per million live events ({n:,} measured)")
+    print(f"{'event':<12} {'version':<8} {'allocations':>12} {'MiB':>8}")
+    for name, legacy, slotted in cases:
+        for version, factory in (("dict", legacy), ("slots", slotted)):
+            allocations, size = retained(factory, n)
+            print(f"{name:<12} {version:<8} {allocations * scale:>12,.0f} {size * scale / 2**20:>8.1f}")
+
+    pool = EventPool(MarketEvent)
+    print(f"\nCreate and drop {n:,} MarketEvents")
+    for version, seconds in (
+        ("dict", churn(lambda: LegacyMarketEvent(stamp, symbols), n)),
+        ("slots", churn(lambda: MarketEvent(stamp, symbols), n)),
+        ("pooled", churn(lambda: pool.acquire(stamp, symbols), n, pool)),
+    ):
+        print(f"{version:<8} {seconds:8.3f}s  {n / seconds / 1e6:6.2f}M events/s")
+
+
+if __name__ == "__main__":
+    main()
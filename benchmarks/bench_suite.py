@@ -0,0 +1,215 @@
+"""
+Throughput benchmarks of the whole backtester on synthetic market data, with
+machine-readable results so runs can be compared over time.
+
+Every scenario runs in a fresh process so its peak RSS is its own, and reports:
+
+    startup_seconds      HistoricCSVDataHandler loading the CSV files
+    data_bars_per_second the data handler alone, pushing every bar to a null bus
+    loop_bars_per_second the event loop with the strategy, NaivePortfolio and
+    loop_events_per_second  SimulatedExecutionHandler
+    equity_curve_seconds NaivePortfolio.create_equity_curve_dataframe
+    performance_seconds  the performance statistics of NaivePortfolio.output_summary_stats
+    peak_rss_mb          the peak resident memory of the process
+
+The scenarios are a single symbol with 10M minute bars, 5,000 symbols of
+daily bars and a strategy that flips its position on every bar. --scale
+multiplies every number of bars, e.g. --scale 0.01 for a quick run.
+
+    python benchmarks/bench_suite.py [--scale 1.0] [--scenarios churn ...]
+        [--data-dir DIR] [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from backtester.bus import DequeEventBus, Dispatcher, default_dispatcher
+from backtester.data import HistoricCSVDataHandler
+from backtester.event import MarketEvent, SignalEvent
+from backtester.execution import SimulatedExecutionHandler
+from backtester.main_loop import backtest
+from backtester.portfolio import NaivePortfolio
+from backtester.strategy import BuyAndHoldStrategy, Strategy
+from backtester.synthetic import generate_universe, write_csv
+
+
+class ChurnStrategy(Strategy):
+    # Alternates LONG and SHORT on every bar of every symbol, the most events per bar
+    def __init__(self, data, events):
+        self.data = data
+        self.symbol_list = data.symbol_list
+        self.events = events
+        self.bought = {symbol: False for symbol in self.symbol_list}
+
+    def calculate_signals(self, event):
+        if isinstance(event, MarketEvent):
+            for symbol in event.symbols or self.symbol_list:
+                self.bought[symbol] = not self.bought[symbol]
+                self.events.put(SignalEvent(symbol, event.datetime, 'LONG' if self.bought[symbol] else 'SHORT'))
+
+
+class CountingDispatcher(Dispatcher):
+    def __init__(self, dispatcher):
+        Dispatcher.__init__(self)
+        self.handlers = dispatcher.handlers
+        self.count = 0
+
+    def dispatch(self, event):
+        self.count += 1
+        Dispatcher.dispatch(self, event)
+
+
+class NullBus(object):
+    def put(self, event):
+        pass
+
+
+# name: (symbols, bars, freq, strategy)
+SCENARIOS = {
+    "single_10m": (1, 10_000_000, "1min", BuyAndHoldStrategy),
+    "universe_5000": (5000, 252, "1D", BuyAndHoldStrategy),
+    "churn": (10, 100_000, "1min", ChurnStrategy),
+}
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def prepare(name, scale, data_dir):
+    """
+    Writes the CSV files of a scenario once, reused by later runs with the same scale.
+    """
+    symbols, bars, freq, _ = SCENARIOS[name]
+    bars = max(int(bars * scale), 10)
+    csv_dir = os.path.join(data_dir, f"{name}-{bars}")
+    universe_symbols = [f"SYM{i:05d}" for i in range(symbols)]
+    if not os.path.exists(os.path.join(csv_dir, universe_symbols[-1] + ".csv")):
+        os.makedirs(csv_dir, exist_ok=True)
+        for symbol_bars in generate_universe(universe_symbols, bars, freq=freq, seed=0).values():
+            write_csv(symbol_bars, csv_dir)
+    return csv_dir, universe_symbols
+
+
+def run_scenario(name, csv_dir, symbols):
+    strategy_class = SCENARIOS[name][3]
+
+    start = time.perf_counter()
+    data = HistoricCSVDataHandler(NullBus(), csv_dir, symbols)
+    startup = time.perf_counter() - start
+    total_bars = sum(len(data.symbol_data[symbol]) for symbol in symbols)
+
+    start = time.perf_counter()
+    while data.continue_backtest:
+        data.update_latest_data()
+    data_seconds = time.perf_counter() - start
+
+    events = DequeEventBus()
+    data = HistoricCSVDataHandler(events, csv_dir, symbols)
+    portfolio = NaivePortfolio(data, events, None)
+    strategy = strategy_class(data, events)
+    broker = SimulatedExecutionHandler(events)
+    dispatcher = CountingDispatcher(default_dispatcher(strategy, portfolio, broker))
+    start = time.perf_counter()
+    backtest(events, data, portfolio, strategy, broker, dispatcher=dispatcher)
+    total_seconds = time.perf_counter() - start
+
+    # backtest() ends by building the equity curve and the statistics, timed
+    # again on their own here and taken out of the loop time
+    start = time.perf_counter()
+    portfolio.create_equity_curve_dataframe()
+    curve_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    portfolio.output_summary_stats()
+    performance_seconds = time.perf_counter() - start
+    loop_seconds = max(total_seconds - curve_seconds - performance_seconds, 1e-9)
+
+    return {
+        "symbols": len(symbols),
+        "bars": total_bars,
+        "events": dispatcher.count,
+        "startup_seconds": startup,
+        "data_bars_per_second": total_bars / data_seconds,
+        "loop_seconds": loop_seconds,
+        "loop_bars_per_second": total_bars / loop_seconds,
+        "loop_events_per_second": dispatcher.count / loop_seconds,
+        "equity_curve_seconds": curve_seconds,
+        "performance_seconds": performance_seconds,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "time": pd.Timestamp.now(tz="UTC").isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    print(f"\nAgainst {baseline_path} (new / old):")
+    for name, metrics in results.items():
+        if name not in baseline:
+            continue
+        for key in ("data_bars_per_second", "loop_bars_per_second", "loop_events_per_second"):
+            print(f"{name:<16} {key:<24} {metrics[key] / baseline[name][key]:6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "backtester-bench"))
+    parser.add_argument("--output")
+    parser.add_argument("--compare")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.scenarios:
+        csv_dir, symbols = prepare(name, args.scale, args.data_dir)
+        # A fresh process per scenario, so the peak RSS is the scenario's own
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results[name] = pool.submit(run_scenario, name, csv_dir, symbols).result()
+        metrics = results[name]
+        print(f"{name:<16} {metrics['bars']:>11,} bars  startup {metrics['startup_seconds']:7.2f}s  "
+              f"data {metrics['data_bars_per_second']:>11,.0f} bars/s  "
+              f"loop {metrics['loop_bars_per_second']:>9,.0f} bars/s {metrics['loop_events_per_second']:>9,.0f} events/s  "
+              f"curve {metrics['equity_curve_seconds']:6.2f}s  perf {metrics['performance_seconds']:7.2f}s  "
+              f"rss {metrics['peak_rss_mb']:7.0f}MB")
+
+    report = {"meta": metadata(), "scale": args.scale, "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from backtester.performance import create_batch_drawdowns, create_batch_sharpe_ratios
+
+STATISTICS = ("total_return", "cagr", "sharpe_ratio", "sortino_ratio", "calmar_ratio", "max_drawdown",
+              "drawdown_duration", "rolling_sharpe_min", "rolling_sharpe_median", "hit_rate",
+              "tail_ratio")
+
+
+def rolling_sharpe(returns, window=63, N=252, block=4096):
+    """
+    Calculate the annualised Sharpe ratio over a rolling window of every run,
+    from running sums so the cost does not depend on the window.
+
+    The sums are restarted every block of windows on returns centred on the
+    block's mean, so they stay small however long the runs are, and a
+    variance lost in the rounding of the sums counts as zero (an infinite or
+    NaN ratio).
+
+    Args:
+        returns (np.ndarray) - A (periods x runs) array of period returns
+        window (int, optional) - Number of periods in the window
+        N (float, optional) - Number of periods per year, see create_sharpe_ratio
+        block (int, optional) - Number of windows per restart of the sums
+
+    Returns:
+        A (periods - window + 1) x runs float array, the ratio of the window
+        ending at each period.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    if len(returns) < window:
+        return np.empty((0,) + returns.shape[1:])
+    ratios = np.empty((len(returns) - window + 1,) + returns.shape[1:])
+    zero = np.zeros((1,) + returns.shape[1:])
+    for start in range(0, len(ratios), block):
+        stop = min(start + block, len(ratios))
+        chunk = returns[start:stop + window - 1]
+        centre = chunk.mean(axis=0)
+        chunk = chunk - centre
+        sums = np.concatenate((zero, np.cumsum(chunk, axis=0)))
+        squares = np.concatenate((zero, np.cumsum(chunk * chunk, axis=0)))
+        mean = (sums[window:] - sums[:-window]) / window
+        variance = (squares[window:] - squares[:-window]) / window - mean * mean
+        mean += centre
+        # Rounding of the sums, relative to their size and to the mean
+        tiny = 64.0 * np.finfo(np.float64).eps * (squares[-1] / window + mean * mean)
+        variance[variance <= tiny] = 0.0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratios[start:stop] = np.sqrt(N) * mean / np.sqrt(variance)
+    return ratios
+
+
+def _chunk_statistics(returns, N, window, tail):
+    """
+    Every statistic of STATISTICS for a (periods x runs) chunk of returns.
+    """
+    periods = len(returns)
+    equity = np.cumprod(1.0 + returns, axis=0)
+    total_return = equity[-1] - 1.0
+    max_drawdown, duration = create_batch_drawdowns(equity.T)
+    downside = np.sqrt(np.mean(np.minimum(returns, 0.0) ** 2, axis=0))
+    rolling = rolling_sharpe(returns, window, N)
+    rolling[~np.isfinite(rolling)] = np.nan
+    wins = np.count_nonzero(returns > 0.0, axis=0)
+    trades = np.count_nonzero(returns, axis=0)
+    low, high = np.percentile(returns, [100.0 * tail, 100.0 * (1.0 - tail)], axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cagr = np.power(np.maximum(equity[-1], 0.0), N / periods) - 1.0
+        statistics = {
+            "total_return": total_return,
+            "cagr": cagr,
+            "sharpe_ratio": create_batch_sharpe_ratios(returns.T, N),
+            "sortino_ratio": np.sqrt(N) * returns.mean(axis=0) / downside,
+            "calmar_ratio": cagr / max_drawdown,
+            "max_drawdown": max_drawdown,
+            "drawdown_duration": duration,
+            "hit_rate": wins / trades,
+            "tail_ratio": np.abs(high) / np.abs(low),
+        }
+        with warnings.catch_warnings():
+            # Runs without a finite rolling ratio (flat or too short) give NaN
+            warnings.simplefilter("ignore", RuntimeWarning)
+            statistics["rolling_sharpe_min"] = np.nanmin(rolling, axis=0) if len(rolling) else np.nan
+            statistics["rolling_sharpe_median"] = np.nanmedian(rolling, axis=0) if len(rolling) else np.nan
+    return statistics
+
+
+class BatchAnalytics(object):
+    """
+    Tear-sheet statistics of many runs at once, e.g. every equity curve of a
+    parameter sweep, computed with NumPy along the time axis of a
+    (periods x runs) returns matrix:
+
+        total return, CAGR, Sharpe, Sortino and Calmar ratios, maximum
+        drawdown and its duration (as create_drawdowns defines them, on the
+        returns compounded from 1), the minimum and median rolling Sharpe
+        ratio, the hit rate (the share of the periods with a non-zero return
+        that were positive) and the tail ratio (the upper over the lower tail
+        quantile of the returns).
+
+    The runs are processed in chunks of columns, so the temporaries never
+    exceed periods x chunk_size. Leading rows missing in every run (the first
+    row of an equity curve's returns) are dropped and any other missing
+    return counts as a flat period.
+    """
+
+    def __init__(self, returns, N=252, chunk_size=256, window=63, tail=0.05, labels=None):
+        """
+        Args:
+            returns (np.ndarray or pd.DataFrame) - A (periods x runs) matrix of
+                period returns; a DataFrame's columns label the runs
+            N (float, optional) - Number of periods per year
+            chunk_size (int, optional) - Number of runs processed at once
+            window (int, optional) - Periods in the rolling Sharpe ratio's window
+            tail (float, optional) - Quantile of the tail ratio, e.g. 0.05 for
+                the 95th over the 5th percentile
+            labels (sequence, optional) - Names of the runs, by default their
+                column labels or positions
+        """
+        if isinstance(returns, pd.DataFrame):
+            labels = returns.columns if labels is None else labels
+            returns = returns.to_numpy(dtype=np.float64)
+        returns = np.asarray(returns, dtype=np.float64)
+        if returns.ndim == 1:
+            returns = returns[:, np.newaxis]
+        missing = np.isnan(returns).all(axis=1)
+        start = int(np.argmin(missing)) if not missing.all() else len(returns)
+        self.returns = returns[start:]
+        self.N = N
+        self.chunk_size = chunk_size
+        self.window = window
+        self.tail = tail
+        self.labels = pd.Index(labels if labels is not None else range(returns.shape[1]), name="run")
+        self._statistics = None
+
+    @classmethod
+    def from_equity_curves(cls, equity_curves, **kwargs):
+        """
+        Builds the analytics from a (periods x runs) matrix of equity curves
+        or portfolio totals instead of returns.
+        """
+        labels = equity_curves.columns if isinstance(equity_curves, pd.DataFrame) else None
+        equity_curves = np.asarray(equity_curves, dtype=np.float64)
+        returns = equity_curves[1:] / equity_curves[:-1] - 1.0
+        kwargs.setdefault("labels", labels)
+        return cls(returns, **kwargs)
+
+    @property
+    def statistics(self):
+        """
+        A DataFrame with a row per run and a column per statistic of
+        STATISTICS, computed on first use.
+        """
+        if self._statistics is None:
+            runs = self.returns.shape[1]
+            columns = {name: np.full(runs, np.nan) for name in STATISTICS}
+            if len(self.returns):
+                for start in range(0, runs, self.chunk_size):
+                    chunk = np.nan_to_num(self.returns[:, start:start + self.chunk_size], nan=0.0)
+                    for name, values in _chunk_statistics(chunk, self.N, self.window, self.tail).items():
+                        columns[name][start:start + chunk.shape[1]] = values
+            self._statistics = pd.DataFrame(columns, index=self.labels, columns=list(STATISTICS))
+        return self._statistics
+
+    def rank(self, by="sharpe_ratio", top=None, ascending=False):
+        """
+        Returns the statistics of the runs ordered by one statistic, with NaNs
+        last. With top, only the best `top` runs are selected, in O(runs)
+        before sorting them.
+        """
+        values = self.statistics[by].to_numpy()
+        keys = np.where(np.isnan(values), np.inf, values if ascending else -values)
+        if top is not None and top < len(keys):
+            candidates = np.argpartition(keys, top)[:top]
+            order = candidates[np.argsort(keys[candidates], kind="stable")]
+        else:
+            order = np.argsort(keys, kind="stable")
+        return self.statistics.iloc[order]
+
+    def filter(self, **bounds):
+        """
+        Returns the statistics of the runs within every bound, given per
+        statistic as a (low, high) pair where None is open, e.g.
+        filter(sharpe_ratio=(1.0, None), max_drawdown=(None, 0.2)).
+        """
+        mask = np.ones(len(self.statistics), dtype=bool)
+        for name, (low, high) in bounds.items():
+            values = self.statistics[name].to_numpy()
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+        return self.statistics[mask]
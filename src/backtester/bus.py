@@ -0,0 +1,244 @@
+import heapq
+import threading
+from abc import ABCMeta, abstractmethod
+from collections import deque
+
+from backtester.event import FillEvent, MarketEvent, OrderCancelEvent, OrderEvent, RebalanceEvent, SignalEvent
+
+
+class EventBus(object):
+    """
+    EventBus is an abstract base class for the queue events are passed through.
+
+    It keeps the put() interface of queue.Queue so data handlers, strategies
+    and portfolios can post to any bus, but get() returns None when the bus is
+    empty instead of raising queue.Empty, which is the normal way every bar ends.
+    """
+
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def put(self, event):
+        """
+        Adds an event to the back of the bus.
+        """
+        raise NotImplementedError("EventBus child must implement put()")
+
+    @abstractmethod
+    def get(self):
+        """
+        Removes and returns the event at the front of the bus, or None if it is empty.
+        """
+        raise NotImplementedError("EventBus child must implement get()")
+
+    def empty(self):
+        return len(self) == 0
+
+    def qsize(self):
+        return len(self)
+
+
+class DequeEventBus(EventBus):
+    """
+    A single-threaded bus backed by collections.deque, for backtests. There
+    is no locking and no exception at the end of every bar.
+    """
+
+    def __init__(self):
+        self._events = deque()
+        # Bound methods looked up once, these are called for every event
+        self.put = self._events.append
+
+    def __len__(self):
+        return len(self._events)
+
+    def __getstate__(self):
+        return {"_events": self._events}
+
+    def __setstate__(self, state):
+        # Rebind put to the restored deque (copy.deepcopy would keep the old one)
+        self._events = state["_events"]
+        self.put = self._events.append
+
+    def put(self, event):
+        self._events.append(event)
+
+    def get(self):
+        return self._events.popleft() if self._events else None
+
+
+class ThreadSafeEventBus(EventBus):
+    """
+    A bus that can be posted to from other threads, e.g. by a live data feed
+    or a broker callback. get() optionally blocks until an event arrives.
+    """
+
+    def __init__(self):
+        self._events = deque()
+        self._ready = threading.Condition(threading.Lock())
+
+    def __len__(self):
+        return len(self._events)
+
+    def put(self, event):
+        with self._ready:
+            self._events.append(event)
+            self._ready.notify()
+
+    def get(self, block=False, timeout=None):
+        """
+        Removes and returns the event at the front of the bus.
+
+        Args:
+            block (bool, optional) - Wait for an event if the bus is empty
+            timeout (float, optional) - Maximum seconds to wait when blocking
+
+        Returns:
+            The event, or None if there was none (within the timeout).
+        """
+        with self._ready:
+            if block and not self._events:
+                self._ready.wait_for(lambda: self._events, timeout)
+            return self._events.popleft() if self._events else None
+
+
+class TimedEventBus(EventBus):
+    """
+    A discrete-event scheduler: a priority queue of events ordered by simulated
+    timestamp (int nanoseconds), with ties kept in the order they were posted.
+
+    put() posts an event at the current simulated time, `now`, while schedule()
+    posts one in the future, e.g. a fill arriving after some latency. get()
+    jumps straight to the next event, advancing `now` to its timestamp, so quiet
+    intervals cost a single O(log n) heap pop however long they are.
+    """
+
+    def __init__(self, now=0):
+        """
+        Args:
+            now (int, optional) - The starting simulated time in nanoseconds
+        """
+        self.now = now
+        self._heap = []
+        self._sequence = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def put(self, event):
+        self.schedule(event, self.now)
+
+    def schedule(self, event, timestamp):
+        """
+        Posts an event to be delivered at a simulated time.
+
+        Args:
+            event (Event) - The event
+            timestamp (int) - Delivery time in nanoseconds, no earlier than now
+        """
+        if timestamp < self.now:
+            raise ValueError("Cannot schedule an event in the simulated past")
+        self._sequence += 1
+        heapq.heappush(self._heap, (timestamp, self._sequence, event))
+
+    def schedule_after(self, event, delay):
+        """
+        Posts an event to be delivered `delay` nanoseconds from now.
+        """
+        self.schedule(event, self.now + delay)
+
+    def peek_time(self):
+        """
+        Returns the timestamp of the next event, or None if the bus is empty.
+        """
+        return self._heap[0][0] if self._heap else None
+
+    def advance(self, timestamp):
+        """
+        Moves the simulated clock forward without delivering anything, e.g. to
+        the time of the next bar.
+        """
+        if timestamp > self.now:
+            self.now = timestamp
+
+    def get(self, until=None):
+        """
+        Removes and returns the next event, advancing `now` to its timestamp.
+
+        Args:
+            until (int, optional) - Only return an event due at or before this time
+
+        Returns:
+            The event, or None if there is none (due by `until`).
+        """
+        heap = self._heap
+        if not heap or (until is not None and heap[0][0] > until):
+            return None
+        timestamp, _, event = heapq.heappop(heap)
+        if timestamp > self.now:
+            self.now = timestamp
+        return event
+
+
+class Dispatcher(object):
+    """
+    A dispatch table from event class to the list of handlers subscribed to it,
+    replacing an if/elif chain on the event's type string. Several handlers can
+    subscribe to the same event class and are called in subscription order.
+
+    Handlers subscribed to a base class also receive its subclasses; the lookup
+    through the MRO is done once per class and then cached.
+    """
+
+    def __init__(self):
+        self.handlers = {}
+        self._table = {}
+
+    def subscribe(self, event_class, handler):
+        """
+        Registers a handler for an event class.
+
+        Args:
+            event_class (type) - e.g. MarketEvent
+            handler (callable) - Called with the event
+        """
+        self.handlers.setdefault(event_class, []).append(handler)
+        self._table = {}
+
+    def _resolve(self, event_class):
+        handlers = []
+        for base in event_class.__mro__:
+            handlers.extend(self.handlers.get(base, ()))
+        self._table[event_class] = handlers
+        return handlers
+
+    def dispatch(self, event):
+        """
+        Calls every handler subscribed to the event's class.
+        """
+        handlers = self._table.get(event.__class__)
+        if handlers is None:
+            handlers = self._resolve(event.__class__)
+        for handler in handlers:
+            handler(event)
+
+
+def default_dispatcher(strategy, portfolio, broker):
+    """
+    Returns a Dispatcher with the standard routing of the backtest loop:
+    market data to the strategy and portfolio, signals to the portfolio,
+    orders to the broker and fills back to the portfolio. A portfolio that
+    rebalances, such as RiskManagedPortfolio, also gets its RebalanceEvents
+    and the cancellations of its orders.
+    """
+    dispatcher = Dispatcher()
+    dispatcher.subscribe(MarketEvent, strategy.calculate_signals)
+    dispatcher.subscribe(MarketEvent, portfolio.update_timeindex)
+    dispatcher.subscribe(SignalEvent, portfolio.update_signal)
+    dispatcher.subscribe(OrderEvent, broker.execute_order)
+    dispatcher.subscribe(FillEvent, portfolio.update_fill)
+    if hasattr(portfolio, "update_rebalance"):
+        dispatcher.subscribe(RebalanceEvent, portfolio.update_rebalance)
+    if hasattr(portfolio, "update_cancel"):
+        dispatcher.subscribe(OrderCancelEvent, portfolio.update_cancel)
+    return dispatcher
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from backtester.store import FIELDS, ColumnarBars
+
+
+class SymbolCache(object):
+    """
+    An on-disk cache of parsed symbol files.
+
+    Each entry is a directory of .npy files (one per column) that is loaded back
+    with np.load(mmap_mode='r'), so a warm start only maps the pages it touches
+    instead of re-parsing the CSV text.
+
+    Entries are keyed by the absolute source path and fingerprinted by size,
+    mtime and a BLAKE2 content hash. When size and mtime are unchanged the entry
+    is trusted without hashing; otherwise the file is hashed and the entry is
+    only reused if the content is identical. Least recently used entries are
+    evicted once max_bytes or max_entries is exceeded.
+    """
+
+    INDEX_NAME = "index.json"
+
+    def __init__(self, cache_dir, max_bytes=None, max_entries=None, verify_content=False):
+        """
+        Initialises the cache, creating the directory if necessary.
+
+        Args:
+            cache_dir (str) - Directory the cache entries live in.
+            max_bytes (int, optional) - Evict entries once the cache is larger than this.
+            max_entries (int, optional) - Evict entries once there are more than this.
+            verify_content (bool, optional) - Always hash the source file, even
+                when its size and mtime are unchanged.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.verify_content = verify_content
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index = self._read_index()
+
+    def _index_path(self):
+        return os.path.join(self.cache_dir, self.INDEX_NAME)
+
+    def _read_index(self):
+        try:
+            with open(self._index_path()) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self):
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self._index_path())
+
+    @staticmethod
+    def _key(path):
+        return hashlib.blake2b(os.path.abspath(path).encode(), digest_size=16).hexdigest()
+
+    @staticmethod
+    def content_hash(path, chunk_size=1 << 20):
+        """
+        Returns the BLAKE2 hex digest of a file's contents.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, path, symbol):
+        """
+        Returns the cached ColumnarBars for a source file as memory-mapped
+        arrays, or None if there is no valid entry.
+
+        Args:
+            path (str) - Path to the source CSV file.
+            symbol (str) - The ticker symbol e.g. 'GOOG'
+        """
+        key = self._key(path)
+        entry = self.index.get(key)
+        if entry is None:
+            return None
+        stat = os.stat(path)
+        if self.verify_content or stat.st_size != entry["size"] or stat.st_mtime_ns != entry["mtime_ns"]:
+            if stat.st_size != entry["size"] or self.content_hash(path) != entry["hash"]:
+                self.invalidate(path)
+                return None
+            entry["mtime_ns"] = stat.st_mtime_ns
+        directory = self._entry_dir(key)
+        try:
+            datetime = np.load(os.path.join(directory, "datetime.npy"), mmap_mode="r")
+            columns = {
+                field: np.load(os.path.join(directory, field + ".npy"), mmap_mode="r")
+                for field in FIELDS
+            }
+        except (OSError, ValueError):
+            self.invalidate(path)
+            return None
+        entry["last_used"] = time.time()
+        return ColumnarBars(symbol, datetime, columns)
+
+    def store(self, path, bars):
+        """
+        Writes the parsed bars of a source file to the cache and applies the
+        eviction policy.
+
+        Args:
+            path (str) - Path to the source CSV file.
+            bars (ColumnarBars) - The parsed bars.
+        """
+        key = self._key(path)
+        stat = os.stat(path)
+        staging = tempfile.mkdtemp(dir=self.cache_dir)
+        np.save(os.path.join(staging, "datetime.npy"), np.asarray(bars.datetime))
+        for field in FIELDS:
+            np.save(os.path.join(staging, field + ".npy"), np.asarray(bars.columns[field]))
+        size = sum(os.path.getsize(os.path.join(staging, name)) for name in os.listdir(staging))
+
+        directory = self._entry_dir(key)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(staging, directory)
+        self.index[key] = {
+            "path": os.path.abspath(path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "hash": self.content_hash(path),
+            "bytes": size,
+            "last_used": time.time(),
+        }
+        self._evict(keep=key)
+        self._write_index()
+
+    def flush(self):
+        """
+        Writes the access times recorded by load() back to the index.
+        """
+        self._write_index()
+
+    def invalidate(self, path):
+        """
+        Removes the entry for a source file, if there is one.
+        """
+        key = self._key(path)
+        self.index.pop(key, None)
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+        self._write_index()
+
+    def clear(self):
+        """
+        Removes every entry from the cache.
+        """
+        for key in list(self.index):
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+        self.index = {}
+        self._write_index()
+
+    def total_bytes(self):
+        """
+        Returns the size on disk of all entries in bytes.
+        """
+        return sum(entry["bytes"] for entry in self.index.values())
+
+    def _evict(self, keep=None):
+        """
+        Drops least recently used entries until the cache is within its limits.
+        The entry just written (keep) is never evicted.
+        """
+        by_age = sorted(
+            (key for key in self.index if key != keep),
+            key=lambda key: self.index[key]["last_used"],
+        )
+        for key in by_age:
+            too_many = self.max_entries is not None and len(self.index) > self.max_entries
+            too_big = self.max_bytes is not None and self.total_bytes() > self.max_bytes
+            if not (too_many or too_big):
+                break
+            self.index.pop(key)
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
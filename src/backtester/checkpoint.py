@@ -0,0 +1,192 @@
+import io
+import os
+import pickle
+import time
+
+from backtester.data import DataHandler
+
+# Growing lists of the portfolio that are written incrementally to the journal
+JOURNALED = ("all_positions", "all_holdings")
+# Ledgers of the portfolio, whose rows are journaled the same way
+JOURNALED_LEDGERS = ("ledger",)
+
+STATE_FILE = "state.pkl"
+JOURNAL_FILE = "journal.pkl"
+
+
+class _SnapshotPickler(pickle.Pickler):
+    """
+    Pickles the engine with the data handler and the journaled lists and
+    ledgers replaced by references, so a snapshot never contains market data
+    or full history.
+    """
+
+    def __init__(self, file, data, journaled):
+        pickle.Pickler.__init__(self, file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._references = {id(data): "data"}
+        for name, rows in journaled.items():
+            self._references[id(rows)] = ("journal", name)
+
+    def persistent_id(self, obj):
+        return self._references.get(id(obj))
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+
+    def __init__(self, file, data, journaled):
+        pickle.Unpickler.__init__(self, file)
+        self._data = data
+        self._journaled = journaled
+
+    def persistent_load(self, pid):
+        if pid == "data":
+            return self._data
+        return self._journaled[pid[1]]
+
+
+class Checkpointer(object):
+    """
+    Periodically snapshots the state of a running backtest to a directory, so
+    it can be continued with resume_backtest() after a crash.
+
+    A snapshot is taken between bars, once every event of the bar has been
+    handled. It holds the event bus with any events still scheduled, the
+    portfolio, strategy and execution handler, and the data handler's
+    get_state(), pickled into `state.pkl` and atomically replaced. The market
+    data is not part of it, and the portfolio's all_positions and all_holdings,
+    or the rows of its ledger, only grow, so their new rows are appended to
+    `journal.pkl` instead: the cost of a snapshot depends on what changed since
+    the last one, not on how far the backtest has got.
+
+    The data handler must implement get_state() and set_state(), as the
+    historic and streaming CSV handlers do; a LiveDataHandler cannot be
+    checkpointed, its feed cannot be replayed from a snapshot.
+    """
+
+    def __init__(self, path, every_bars=None, every_seconds=None):
+        """
+        Args:
+            path (str) - Directory of the snapshot, created if needed
+            every_bars (int, optional) - Take a snapshot every this many bars
+            every_seconds (float, optional) - Take a snapshot when this much wall
+                time has passed since the last one; checked once per bar
+        """
+        self.path = path
+        self.every_bars = every_bars
+        self.every_seconds = every_seconds
+        self.saved = 0
+        # Set by resume_backtest() to carry on the journal of the snapshot it resumed from
+        self.resumed = None
+        self._components = None
+        self._journal = None
+        self._written = {}
+        self._bars = 0
+        self._last = time.perf_counter()
+
+    def attach(self, events, data, portfolio, strategy, broker):
+        """
+        Sets the components that are saved, called by backtest().
+        """
+        if type(data).get_state is DataHandler.get_state:
+            raise ValueError(f"{type(data).__name__} does not implement get_state(), it cannot be checkpointed")
+        os.makedirs(self.path, exist_ok=True)
+        self._components = {"events": events, "data": data, "portfolio": portfolio,
+                            "strategy": strategy, "broker": broker}
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(os.path.join(self.path, JOURNAL_FILE), "ab")
+        if self.resumed is None:
+            self._journal.truncate(0)
+            self._written = {}
+        else:
+            # Drop anything written after the snapshot that is being resumed
+            self._journal.truncate(self.resumed["offset"])
+            self._written = dict(self.resumed["rows"])
+            self.resumed = None
+        self._journal.seek(0, os.SEEK_END)
+
+    def tick(self):
+        """
+        Counts a bar and takes a snapshot when one is due.
+        """
+        self._bars += 1
+        if self.every_bars is not None and self._bars >= self.every_bars:
+            self.save()
+        elif self.every_seconds is not None and time.perf_counter() - self._last >= self.every_seconds:
+            self.save()
+
+    def save(self):
+        """
+        Takes a snapshot now.
+        """
+        components = self._components
+        portfolio = components["portfolio"]
+        journaled = {name: getattr(portfolio, name) for name in JOURNALED if hasattr(portfolio, name)}
+        ledgers = {name: getattr(portfolio, name) for name in JOURNALED_LEDGERS if hasattr(portfolio, name)}
+
+        new_rows = {name: rows[self._written.get(name, 0):] for name, rows in journaled.items()}
+        for name, ledger in ledgers.items():
+            new_rows[name] = ledger.rows(self._written.get(name, 0))
+        self._journal.write(pickle.dumps(new_rows, protocol=pickle.HIGHEST_PROTOCOL))
+        self._journal.flush()
+        self._written = {name: len(rows) for name, rows in journaled.items()}
+        self._written.update((name, len(ledger)) for name, ledger in ledgers.items())
+
+        # A small header with the journal position and the ledgers without
+        # their rows, then the state itself
+        buffer = io.BytesIO()
+        journal = {"offset": self._journal.tell(), "rows": dict(self._written),
+                   "ledgers": {name: ledger.empty_copy() for name, ledger in ledgers.items()}}
+        pickle.dump(journal, buffer, protocol=pickle.HIGHEST_PROTOCOL)
+        state = {name: component for name, component in components.items() if name != "data"}
+        state["data_state"] = components["data"].get_state()
+        journaled.update(ledgers)
+        _SnapshotPickler(buffer, components["data"], journaled).dump(state)
+
+        final = os.path.join(self.path, STATE_FILE)
+        with open(final + ".tmp", "wb") as f:
+            f.write(buffer.getbuffer())
+        os.replace(final + ".tmp", final)
+
+        self.saved += 1
+        self._bars = 0
+        self._last = time.perf_counter()
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+
+def load_checkpoint(path, data):
+    """
+    Loads the last snapshot of a Checkpointer directory.
+
+    Args:
+        path (str) - The Checkpointer directory
+        data (DataHandler) - A fresh handler over the same market data as the
+            checkpointed run; its state and event bus are restored in place
+
+    Returns:
+        A dict of the restored events, portfolio, strategy and broker, with the
+        journal position of the snapshot under 'journal'.
+    """
+    with open(os.path.join(path, STATE_FILE), "rb") as f:
+        journal = pickle.load(f)
+
+        # Rows appended after the snapshot, by a run that died before the next one, are ignored
+        ledgers = journal.get("ledgers", {})
+        journaled = dict(ledgers)
+        with open(os.path.join(path, JOURNAL_FILE), "rb") as rows:
+            while rows.tell() < journal["offset"]:
+                for name, new_rows in pickle.load(rows).items():
+                    if name in ledgers:
+                        ledgers[name].append_rows(*new_rows)
+                    else:
+                        journaled.setdefault(name, []).extend(new_rows)
+
+        state = _SnapshotUnpickler(f, data, journaled).load()
+    data.set_state(state.pop("data_state"))
+    data.events = state["events"]
+    state["journal"] = journal
+    return state
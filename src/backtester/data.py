@@ -1,5 +1,9 @@
 # %%
 import os, os.path 
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 
 # %%
@@ -7,6 +11,10 @@ from abc import ABCMeta, abstractmethod
 
 # %%
 from backtester.event import MarketEvent
+from backtester.indicators import IndicatorRegistry
+from backtester.merge import TimeMerger
+from backtester.resample import Resampler
+from backtester.store import BarBuffer, ColumnarBars
 
 # %%
 class DataHandler(object):
@@ -23,8 +31,14 @@ class DataHandler(object):
 
     __metaclass__ = ABCMeta
 
+    # Set to an EventPool(MarketEvent) to recycle MarketEvents instead of allocating one per bar
+    market_pool = None
+
+    # True for handlers that read on background threads, which do not survive os.fork()
+    background_readers = False
+
     @abstractmethod
-    def get_latest_data(self, symbol, N=1):
+    def get_latest_data(self, symbol, N=1, timeframe=None):
         '''
         Returns the N last or fewer bars from the latest_symbol list, 
         or fewer if less bars are available
@@ -32,6 +46,8 @@ class DataHandler(object):
         Args:
             symbol (string) - symbol for ticker (example 'GOOG')
             N (int, optional) - Number of bars returned, default is 1 
+            timeframe (str, optional) - A timeframe registered with add_timeframe(),
+                by default the bars are returned at the data's own resolution.
         '''
         raise NotImplementedError('DataHandler child must implement a get_latest_bar() method')
     
@@ -42,15 +58,155 @@ class DataHandler(object):
         '''
         raise NotImplementedError('DataHandler child must implement a update_bars()')
 
+    def add_timeframe(self, timeframe, max_bars=None):
+        '''
+        Attaches a Resampler that builds bars at a higher timeframe as the data
+        is updated. Any history the handler already holds is resampled in one
+        vectorised pass to warm it up.
+
+        Args:
+            timeframe (str) - A fixed-width pandas timeframe, e.g. '1h' or '1D'
+            max_bars (int, optional) - Number of resampled bars kept per symbol
+
+        Returns:
+            The Resampler, also reachable through get_latest_data(..., timeframe=timeframe)
+        '''
+        resampler = Resampler(timeframe, max_bars=max_bars)
+        for symbol in self.symbol_list:
+            history = self.get_latest_data(symbol, N=sys.maxsize)
+            if history is not None and len(history) > 0:
+                resampler.warm_up(symbol, history)
+        self.resamplers[timeframe] = resampler
+        return resampler
+
+    def _update_derived(self, symbol, timestamp, values):
+        """
+        Feeds a new bar to every attached Resampler and to the indicator registry.
+        """
+        for resampler in self.resamplers.values():
+            resampler.update(symbol, timestamp, values)
+        self.indicators.update(symbol, values)
+
+    def next_timestamp(self):
+        '''
+        Returns the timestamp in nanoseconds of the bars the next call to
+        update_latest_data will push, or None when the data is exhausted.
+        Used to interleave bars with events scheduled on a TimedEventBus.
+        '''
+        return self._merger.peek()
+
+    def get_state(self):
+        '''
+        Returns the mutable state of the handler (cursors, history buffers,
+        resamplers and indicators) for a checkpoint, without the market data.
+        Handlers that cannot be resumed, such as a live feed, leave it
+        unimplemented and are rejected by Checkpointer.attach().
+        '''
+        raise NotImplementedError('DataHandler child does not support checkpoints')
+
+    def set_state(self, state):
+        '''
+        Restores a state returned by get_state() onto a handler built over the
+        same market data, so the backtest continues from where it was taken.
+        '''
+        raise NotImplementedError('DataHandler child does not support checkpoints')
+
+    def _market_event(self, datetime=None, symbols=None):
+        """
+        Returns a new MarketEvent, taken from market_pool when one is set.
+        """
+        if self.market_pool is not None:
+            return self.market_pool.acquire(datetime, symbols)
+        return MarketEvent(datetime, symbols)
+
+    def _event_symbols(self, updates):
+        """
+        The symbols reported by a MarketEvent for the handler's alignment,
+        for handlers that merge their symbols with a TimeMerger.
+        """
+        if self.alignment == "sparse":
+            return [symbol for symbol, _ in updates]
+        latest = self._merger.latest
+        if len(latest) != len(self._active):
+            self._active = [symbol for symbol in self.symbol_list if symbol in latest]
+        return self._active
+
+# %%
+class LoadRecord(object):
+    '''
+    The outcome of loading one symbol file: where the bars came from, how long
+    it took and, if it failed, the exception that was raised.
+    '''
+
+    def __init__(self, symbol, path, source, seconds, rows=0, error=None):
+        '''
+        Args:
+            symbol (str) - The ticker symbol e.g. 'GOOG'
+            path (str) - Path to the symbol file
+            source (str) - 'csv' if the file was parsed, 'cache' if it was mapped from a SymbolCache
+            seconds (float) - Wall time spent loading the file
+            rows (int, optional) - Number of bars loaded
+            error (Exception, optional) - The exception raised if loading failed
+        '''
+        self.symbol = symbol
+        self.path = path
+        self.source = source
+        self.seconds = seconds
+        self.rows = rows
+        self.error = error
+
+    def __repr__(self):
+        status = "ok" if self.error is None else f"{type(self.error).__name__}: {self.error}"
+        return f"LoadRecord({self.symbol}, {self.source}, {self.rows} rows, {self.seconds:.3f}s, {status})"
+
+
+class DataLoadError(Exception):
+    '''
+    Raised when one or more symbol files could not be loaded. The failed
+    LoadRecords are available as `failures`.
+    '''
+
+    def __init__(self, failures):
+        self.failures = failures
+        details = ", ".join(f"{record.symbol} ({type(record.error).__name__})" for record in failures)
+        super().__init__(f"Failed to load {len(failures)} symbol file(s): {details}")
+
+
+def _read_symbol_csv(symbol, path):
+    '''
+    Parses one symbol file into ColumnarBars. Module level so it can run in a
+    process pool.
+
+    Returns:
+        A (bars, LoadRecord) pair, bars is None if the file failed to load.
+    '''
+    start = time.perf_counter()
+    try:
+        # Load the CSV file indexed by date (date is index_col 0)
+        frame = pd.read_csv(path, header = 0, index_col = 0, parse_dates=True)
+        bars = ColumnarBars.from_frame(symbol, frame)
+    except (OSError, ValueError, KeyError) as e:
+        return None, LoadRecord(symbol, path, "csv", time.perf_counter() - start, error=e)
+    return bars, LoadRecord(symbol, path, "csv", time.perf_counter() - start, len(bars))
+
 # %%
 class HistoricCSVDataHandler(DataHandler):
     '''
     The HistoricCSVDataHandler is used to read a CSV for each requested symbol
     from memory and provide an interface to obtain 'latest' bar that replicates 
     live trading interface.
+
+    Bars are held column-wise (see backtester.store) and a cursor is moved along
+    them, so 'latest' data is a set of zero-copy NumPy views rather than a list
+    that grows for the length of the backtest.
+
+    Every file is loaded in full, so there is no max_lookback: a ring buffer
+    of the history would bound nothing here, it would only copy each bar. For
+    a bounded history and memory use StreamingCSVDataHandler(max_lookback=...).
     '''
 
-    def __init__(self, events, csv_dir, symbol_list):
+    def __init__(self, events, csv_dir, symbol_list, cache=None,
+                 alignment="pad", workers=None, pool="thread", symbol_data=None):
         '''
         Initialises the historic data handler from a path to a directory containing the csv files
         and a list of symbols (assuming all files are in the form 'symbol.csv',
@@ -60,82 +216,368 @@ class HistoricCSVDataHandler(DataHandler):
             events - The event queue
             csv_dir (str) - Absolute path to the directory containing CSV files.
             symbol_list (List[str]) - A list of symbol strings
+            cache (SymbolCache, optional) - On-disk cache of parsed symbol files,
+                used to skip CSV parsing on later runs.
+            alignment (str, optional) - How symbols on different calendars are
+                merged (see TimeMerger). With 'pad' every MarketEvent lists all
+                symbols that have data so far, and a symbol without a new bar
+                keeps its last one. With 'sparse' only the updated symbols are listed.
+            workers (int, optional) - Number of symbol files parsed concurrently,
+                by default they are parsed one at a time.
+            pool (str, optional) - 'thread' or 'process' pool for parallel parsing.
+            symbol_data (dict, optional) - Already loaded ColumnarBars per symbol,
+                e.g. views onto shared memory. No files are read if this is given.
+
+        Raises:
+            DataLoadError - If any symbol file is missing or cannot be parsed.
         '''
         self.events = events
         self.csv_dir = csv_dir
         self.symbol_list = symbol_list
+        self.cache = cache
+        self.alignment = alignment
+        self.workers = workers
+        self.pool = pool
+        self.load_report = []
+        self.resamplers = {}
+        self.indicators = IndicatorRegistry(self)
 
         self.symbol_data = {}
-        self.symbol_dataframe = {}
-        self.latest_symbol_data = {}
-        self.all_data = {}
+        self.cursor = {}
         self.continue_backtest = True
 
-        self._open_convert_csv_files()
+        if symbol_data is None:
+            self._open_convert_csv_files()
+        else:
+            self.symbol_data = {symbol: symbol_data[symbol] for symbol in self.symbol_list}
+        for symbol in self.symbol_list:
+            self.cursor[symbol] = 0
+        self._merger = TimeMerger(
+            {symbol: self.symbol_data[symbol].iter_timestamps() for symbol in self.symbol_list},
+            mode=alignment,
+        )
+        self._active = []
 
     def _open_convert_csv_files(self):
         '''
         Open the CSV files from the data directory, converting
-        them into pandas DataFrames within a symbol dictionary.
+        them into columnar NumPy arrays within a symbol dictionary.
+        Each file is timed and any failures are collected into a single
+        DataLoadError once every file has been tried.
+
+        Symbols are kept on their own calendars, they are lined up
+        bar by bar as the backtest runs rather than reindexed up front.
 
         (Assumes data is from Yahoo)
         '''
-        combined_index = None
-        
-        for symbol in self.symbol_list:
-            # Load the CSV file indexed by date (date is index_col 0)
-            # construct path to each file
-            self.symbol_data[symbol] = pd.read_csv(os.path.join(self.csv_dir, symbol + ".csv"), 
-                                                   header = 0, 
-                                                   index_col = 0, 
-                                                   parse_dates=True)
-            
-            # Combine the index to pad forward values
-            if combined_index is None:
-                combined_index = self.symbol_data[symbol].index
-            else:
-                combined_index.union(self.symbol_data[symbol].index)
-                
-            self.latest_symbol_data[symbol] = []
-            
+        paths = {symbol: os.path.join(self.csv_dir, symbol + ".csv") for symbol in self.symbol_list}
+        loaded = {}
+        records = {}
+
+        # Cache hits are only memory-mapped, so they are resolved up front here
+        if self.cache is not None:
+            for symbol in self.symbol_list:
+                start = time.perf_counter()
+                bars = self.cache.load(paths[symbol], symbol) if os.path.exists(paths[symbol]) else None
+                if bars is not None:
+                    loaded[symbol] = bars
+                    records[symbol] = LoadRecord(symbol, paths[symbol], "cache",
+                                                 time.perf_counter() - start, len(bars))
+
+        misses = [symbol for symbol in self.symbol_list if symbol not in loaded]
+        if self.workers is None or self.workers <= 1 or len(misses) <= 1:
+            results = [_read_symbol_csv(symbol, paths[symbol]) for symbol in misses]
+        else:
+            pool = ProcessPoolExecutor if self.pool == "process" else ThreadPoolExecutor
+            with pool(max_workers=self.workers) as executor:
+                results = list(executor.map(_read_symbol_csv, misses, [paths[s] for s in misses]))
+
+        for symbol, (bars, record) in zip(misses, results):
+            records[symbol] = record
+            if bars is not None:
+                loaded[symbol] = bars
+                if self.cache is not None:
+                    self.cache.store(paths[symbol], bars)
+        if self.cache is not None:
+            self.cache.flush()
+
+        # Assembled in symbol_list order, whatever order the files finished in
+        self.load_report = [records[symbol] for symbol in self.symbol_list]
+        failures = [record for record in self.load_report if record.error is not None]
+        if failures:
+            raise DataLoadError(failures)
+
         for symbol in self.symbol_list:
-            self.symbol_dataframe[symbol] = self.symbol_data[symbol].reindex(index=combined_index, method="pad")
-            self.all_data[symbol] = self.symbol_dataframe[symbol].copy()
-            self.symbol_data[symbol] = self.symbol_dataframe[symbol].iterrows()
-            
+            self.symbol_data[symbol] = loaded[symbol]
             
-    def _get_new_data(self, symbol):
+    def _get_new_data(self, symbol, i):
         """
-        Returns the latest bar from the data feed as a tuple.
+        Moves the cursor of a symbol past bar i, feeding the bar to the
+        resamplers and indicators if there are any.
         """
-        for raw_bar in self.symbol_data[symbol]:
-            yield tuple([symbol, raw_bar[0], raw_bar[1][0]])
+        if self.resamplers or self.indicators:
+            timestamp, values = self.symbol_data[symbol].row(i)
+            self._update_derived(symbol, int(timestamp), values)
+        self.cursor[symbol] = i + 1
             
-    def get_latest_data(self, symbol, N=1):
+    def get_latest_data(self, symbol, N=1, timeframe=None):
         """
         Returns the last N bars from the latest_symbol list,
         or N-k if less available.
+
+        Returns:
+            A BarWindow of zero-copy NumPy views, one per field.
         """
+        if timeframe is not None:
+            return self.resamplers[timeframe].get_latest_data(symbol, N)
         try:
-            return self.latest_symbol_data[symbol][-N:]
+            stop = self.cursor[symbol]
+            return self.symbol_data[symbol].window(max(0, stop - N), stop)
         except KeyError:
             print (f"{symbol} is not available in the historical data set.")
 
         
     def update_latest_data(self):
         """
-        Pushes the latest bar to the latest_symbol_data structure
-        for all symbols in the symbol list.
+        Pushes the bars at the next timestamp across all symbols to the
+        latest_symbol_data structure.
         """
+        try:
+            timestamp, updates = next(self._merger)
+        except StopIteration:
+            self.continue_backtest = False
+            self.events.put(self._market_event())
+            return
+        for symbol, i in updates:
+            self._get_new_data(symbol, i)
+        self.events.put(self._market_event(np.datetime64(timestamp, "ns"), self._event_symbols(updates)))
+
+    def get_state(self):
+        """
+        The cursors stand in for the merger, which is rebuilt from them, so the
+        state only grows with the resamplers and indicators, never with the
+        length of the data.
+        """
+        return {
+            "symbols": [(symbol, len(self.symbol_data[symbol])) for symbol in self.symbol_list],
+            "cursor": dict(self.cursor),
+            "continue_backtest": self.continue_backtest,
+            "latest": dict(self._merger.latest),
+            "resamplers": self.resamplers,
+            "indicators": self.indicators,
+        }
+
+    def set_state(self, state):
+        symbols = [(symbol, len(self.symbol_data[symbol])) for symbol in self.symbol_list]
+        if state["symbols"] != symbols:
+            raise ValueError(f"The state was taken over different data: {state['symbols']} != {symbols}")
+        self.cursor = dict(state["cursor"])
+        self.continue_backtest = state["continue_backtest"]
+        self.resamplers = state["resamplers"]
+        self.indicators = state["indicators"]
+        self.indicators.data = self
+        self._merger = TimeMerger(
+            {symbol: self.symbol_data[symbol].iter_timestamps(self.cursor[symbol]) for symbol in self.symbol_list},
+            mode=self.alignment,
+        )
+        self._merger.latest.update(state["latest"])
+        self._active = []
+
+# %%
+class StreamingCSVDataHandler(DataHandler):
+    '''
+    The StreamingCSVDataHandler reads each symbol's CSV in bounded chunks rather
+    than loading whole files, for histories that do not fit in memory.
+
+    Each file is read through a generator of columnar chunks, and the next chunk
+    of every symbol is parsed on a background thread while the current one is
+    being consumed. History is held in a fixed-size BarBuffer, so peak memory is
+    bounded by chunksize and max_lookback rather than by the length of the file.
+
+    The handler can be checkpointed: its state is the number of rows read
+    from each file with the bounded history, and set_state() reopens the
+    files past those rows. A copy shares no readers with the original, it
+    opens its own in set_state().
+    '''
+
+    background_readers = True
+
+    def __init__(self, events, csv_dir, symbol_list, chunksize=100000, max_lookback=1000,
+                 max_workers=None, alignment="pad"):
+        '''
+        Initialises the streaming data handler, assuming all files are in the
+        form 'symbol.csv' where symbol is a string in the list.
+
+        Args:
+            events - The event queue
+            csv_dir (str) - Absolute path to the directory containing CSV files.
+            symbol_list (List[str]) - A list of symbol strings
+            chunksize (int, optional) - Number of rows parsed per chunk.
+            max_lookback (int, optional) - Number of bars kept for get_latest_data.
+            max_workers (int, optional) - Threads used to prefetch chunks, defaults
+                to one per symbol up to a maximum of 4.
+            alignment (str, optional) - 'pad' or 'sparse', as for HistoricCSVDataHandler.
+        '''
+        self.events = events
+        self.csv_dir = csv_dir
+        self.symbol_list = symbol_list
+        self.chunksize = chunksize
+        self.max_lookback = max_lookback
+        self.max_workers = max_workers
+        self.alignment = alignment
+
+        self.latest_symbol_data = {
+            symbol: BarBuffer(symbol, capacity=max_lookback) for symbol in symbol_list
+        }
+        self.resamplers = {}
+        self.indicators = IndicatorRegistry(self)
+        self.continue_backtest = True
+        # Rows of each file pushed so far, where a resumed handler starts reading
+        self.rows_read = {symbol: 0 for symbol in symbol_list}
+        self._open()
+
+    def _open(self):
+        """
+        Starts the readers and the merger from rows_read.
+        """
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers or min(4, len(self.symbol_list)) or 1)
+        self._readers = {}
+        self._pending = {}
         for symbol in self.symbol_list:
-            data = None
-            try:
-                data = next(self._get_new_data(symbol))
-            except StopIteration:
-                self.continue_backtest = False
-            if data is not None:
-                self.latest_symbol_data[symbol].append(data)
-        self.events.put(MarketEvent())
+            self._readers[symbol] = self._read_chunks(symbol, self.rows_read[symbol])
+            self._prefetch(symbol)
+        self._merger = TimeMerger(
+            {symbol: self._iter_rows(symbol) for symbol in self.symbol_list},
+            mode=self.alignment,
+        )
+        self._active = []
+
+    def __copy__(self):
+        clone = object.__new__(type(self))
+        clone.__dict__.update(self.__dict__)
+        clone._executor = None
+        clone._readers = {}
+        clone._pending = {}
+        return clone
+
+    def _path(self, symbol):
+        return os.path.join(self.csv_dir, symbol + ".csv")
+
+    def _read_chunks(self, symbol, skip=0):
+        """
+        Generator of ColumnarBars chunks for one symbol file, from row `skip` on.
+        """
+        with pd.read_csv(self._path(symbol), header=0, index_col=0, parse_dates=True,
+                         skiprows=range(1, skip + 1) if skip else None,
+                         chunksize=self.chunksize) as reader:
+            for frame in reader:
+                yield ColumnarBars.from_frame(symbol, frame)
+
+    def _prefetch(self, symbol):
+        """
+        Starts parsing the next chunk of a symbol on the background pool.
+        """
+        self._pending[symbol] = self._executor.submit(next, self._readers[symbol], None)
+
+    def _iter_rows(self, symbol):
+        """
+        Generator of (timestamp, (chunk, row)) pairs for one symbol, swapping in
+        the prefetched chunk and starting on the next one as each is used up.
+        """
+        while True:
+            chunk = self._pending[symbol].result()
+            if chunk is None:
+                # Reader exhausted, nothing more to prefetch
+                del self._pending[symbol]
+                return
+            self._prefetch(symbol)
+            for timestamp, i in chunk.iter_timestamps():
+                yield timestamp, (chunk, i)
+
+    def _get_new_data(self, symbol, item):
+        """
+        Copies one bar of a chunk into the symbol's history buffer.
+        """
+        chunk, i = item
+        timestamp, values = chunk.row(i)
+        self.rows_read[symbol] += 1
+        self.latest_symbol_data[symbol].append(timestamp, values)
+        if self.resamplers or self.indicators:
+            self._update_derived(symbol, int(timestamp), values)
+
+    def get_latest_data(self, symbol, N=1, timeframe=None):
+        """
+        Returns the last N bars from the latest_symbol list,
+        or N-k if less available (at most max_lookback).
+
+        Returns:
+            A BarWindow of zero-copy NumPy views, one per field.
+        """
+        if timeframe is not None:
+            return self.resamplers[timeframe].get_latest_data(symbol, N)
+        try:
+            return self.latest_symbol_data[symbol].latest(N)
+        except KeyError:
+            print (f"{symbol} is not available in the historical data set.")
+
+    def update_latest_data(self):
+        """
+        Pushes the bars at the next timestamp across all symbols to the
+        latest_symbol_data structure.
+        """
+        try:
+            timestamp, updates = next(self._merger)
+        except StopIteration:
+            self.continue_backtest = False
+            self.close()
+            self.events.put(self._market_event())
+            return
+        for symbol, item in updates:
+            self._get_new_data(symbol, item)
+        self.events.put(self._market_event(np.datetime64(timestamp, "ns"), self._event_symbols(updates)))
+
+    def get_state(self):
+        """
+        The rows read from each file stand in for the readers and the merger,
+        which are reopened from them, so the state only grows with
+        max_lookback and the indicators.
+        """
+        return {
+            "symbols": [(symbol, os.path.getsize(self._path(symbol))) for symbol in self.symbol_list],
+            "rows_read": dict(self.rows_read),
+            "continue_backtest": self.continue_backtest,
+            "latest": list(self._merger.latest),
+            "latest_symbol_data": self.latest_symbol_data,
+            "resamplers": self.resamplers,
+            "indicators": self.indicators,
+        }
+
+    def set_state(self, state):
+        symbols = [(symbol, os.path.getsize(self._path(symbol))) for symbol in self.symbol_list]
+        if state["symbols"] != symbols:
+            raise ValueError(f"The state was taken over different data: {state['symbols']} != {symbols}")
+        self.close()
+        self.rows_read = dict(state["rows_read"])
+        self.continue_backtest = state["continue_backtest"]
+        self.latest_symbol_data = state["latest_symbol_data"]
+        self.resamplers = state["resamplers"]
+        self.indicators = state["indicators"]
+        self.indicators.data = self
+        self._open()
+        # Only which symbols have a bar is read from `latest`, for the padded MarketEvents
+        self._merger.latest.update((symbol, None) for symbol in state["latest"])
+
+    def close(self):
+        """
+        Stops the prefetch threads and closes the open files.
+        """
+        for pending in self._pending.values():
+            pending.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        for reader in self._readers.values():
+            reader.close()
+        self._pending = {}
 
 # %%
     
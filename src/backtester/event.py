@@ -2,8 +2,14 @@ class Event:
     """
     This is the Parent class for all other subsequent (inheritted) event classes. These
     events will be used to communicate information between projects.
+
+    Events use __slots__ rather than a per-instance __dict__, and `type` is a
+    class-level constant, as one or more are allocated for every bar.
     """
 
+    __slots__ = ()
+    type = None
+
 
 
 class MarketEvent(Event):
@@ -11,11 +17,19 @@ class MarketEvent(Event):
     Handles the event of receiving a new market update with corresponding bars.
     """
 
-    def __init__(self):
+    __slots__ = ("datetime", "symbols")
+    type = "MARKET"
+
+    def __init__(self, datetime=None, symbols=None):
         """
         Initialises the MarketEvent.
+
+        Args:
+            datetime (optional) - The timestamp of the bars that were pushed
+            symbols (List[str], optional) - The symbols with data at this timestamp
         """
-        self.type = "MARKET"
+        self.datetime = datetime
+        self.symbols = symbols
 
 
 class SignalEvent(Event):
@@ -23,6 +37,9 @@ class SignalEvent(Event):
     This Event corresponds to sending a signal from a Strategy object to a Portfolio object and then acted upon.
     """
 
+    __slots__ = ("symbol", "datetime", "signal_type")
+    type = "SIGNAL"
+
     def __init__(self, symbol, datetime, signal_type):
         """
         Initialises the SignalEvent.
@@ -32,13 +49,30 @@ class SignalEvent(Event):
             datetime - The timestamp at which the signal was generated
             signal_type (str) - 'LONG' or 'SHORT'
         """
-
-        self.type = "SIGNAL"
         self.symbol = symbol
         self.datetime = datetime
         self.signal_type = signal_type
 
 
+class RebalanceEvent(Event):
+    """
+    Posted by a portfolio to itself behind the signals already on the bus, so
+    it acts on all the signals of a bar at once.
+    """
+
+    __slots__ = ("datetime",)
+    type = "REBALANCE"
+
+    def __init__(self, datetime=None):
+        """
+        Initialises the RebalanceEvent.
+
+        Args:
+            datetime (optional) - The timestamp of the bar
+        """
+        self.datetime = datetime
+
+
 class OrderEvent(Event):
     """
     This event corresponds to sending an Order to an execution system.
@@ -46,22 +80,28 @@ class OrderEvent(Event):
     quantity and a direction.
     """
 
-    def __init__(self, symbol, order_type, quantity, direction):
+    __slots__ = ("symbol", "order_type", "quantity", "direction", "price", "stop_price")
+    type = "ORDER"
+
+    def __init__(self, symbol, order_type, quantity, direction, price=None, stop_price=None):
         """
         Initialised the order type.
 
         Args:
             symbol (str) - The ticker symbol e.g. 'GOOG'.
-            order_type (str) - 'MKT' OR 'LMT' for Market or Limit.
+            order_type (str) - 'MKT' OR 'LMT' for Market or Limit, or 'STP' for Stop.
             quantity (int) - Non negative integer for quantity.
             direction (str) - 'BUY' or 'SELL' for long or short.
+            price (float, optional) - The limit price of a 'LMT' order, or of a
+                'STP' order that becomes a limit order when triggered
+            stop_price (float, optional) - The trigger price of a 'STP' order
         """
-
-        self.type = "ORDER"
         self.symbol = symbol
         self.order_type = order_type
         self.quantity = quantity
         self.direction = direction
+        self.price = price
+        self.stop_price = stop_price
 
     def print_order(self):
         """
@@ -72,12 +112,59 @@ class OrderEvent(Event):
         )
 
 
+class OrderAckEvent(Event):
+    """
+    Sent back by an execution handler when the exchange acknowledges an order,
+    which with a simulated latency happens some time after the order was sent.
+    """
+
+    __slots__ = ("timeindex", "order")
+    type = "ACK"
+
+    def __init__(self, timeindex, order):
+        """
+        Initialises the OrderAckEvent.
+
+        Args:
+            timeindex - The time the acknowledgement was received
+            order (OrderEvent) - The order that was acknowledged
+        """
+        self.timeindex = timeindex
+        self.order = order
+
+
+class OrderCancelEvent(Event):
+    """
+    Sent back by an execution handler when what is left of an order is
+    cancelled, so whoever sent it stops waiting for the rest to fill.
+    """
+
+    __slots__ = ("timeindex", "order", "quantity")
+    type = "CANCEL"
+
+    def __init__(self, timeindex, order, quantity):
+        """
+        Initialises the OrderCancelEvent.
+
+        Args:
+            timeindex - The time the order was cancelled
+            order (OrderEvent) - The order that was cancelled
+            quantity (int) - The quantity cancelled, which was never filled
+        """
+        self.timeindex = timeindex
+        self.order = order
+        self.quantity = quantity
+
+
 class FillEvent(Event):
     """
     Represents the Fill Order, which stores the quantity of an instrument
     actually filled and at what price as well as the commission of the trade from the brokerage.
     """
 
+    __slots__ = ("timeindex", "symbol", "exchange", "quantity", "direction", "fill_cost", "commision")
+    type = "FILL"
+
     def __init__(
         self, timeindex, symbol, exchange, quantity, direction, fill_cost, commission=None
     ):
@@ -97,8 +184,6 @@ class FillEvent(Event):
             fill_cost - The holdings valuer in dollars
             commission (optional) - An optional commision sent from IB.
         """
-
-        self.type = "FILL"
         self.timeindex = timeindex
         self.symbol = symbol
         self.exchange = exchange
@@ -111,6 +196,13 @@ class FillEvent(Event):
         else:
             self.commision = commission
 
+    @property
+    def commission(self):
+        """
+        The commission of the fill (the attribute itself is spelt `commision`).
+        """
+        return self.commision
+
     def calculate_ib_commission(self):
         """
         Calculates the fees of trading based on an Interactive
@@ -126,6 +218,49 @@ class FillEvent(Event):
             full_cost = max(1.3, 0.013 * self.quantity)
         else:
             full_cost = max(1.3, 0.008 * self.quantity)
-        full_cost = min(full_cost, 0.5 / 100.0 * self.quantity * self.fill_cost)
+        if self.fill_cost is not None:
+            full_cost = min(full_cost, 0.5 / 100.0 * self.quantity * self.fill_cost)
 
         return full_cost
+
+
+class EventPool(object):
+    """
+    An opt-in free list of event objects for the highest volume event types,
+    such as MarketEvent, so a long backtest re-initialises a handful of
+    objects rather than allocating one per bar.
+
+    Whoever consumes an event last (normally the backtest loop, once every
+    handler has seen it) hands it back with release(). An event must not be
+    used after it has been released.
+    """
+
+    def __init__(self, event_class, max_size=1024):
+        """
+        Initialises the pool.
+
+        Args:
+            event_class (type) - The Event subclass pooled, e.g. MarketEvent
+            max_size (int, optional) - Maximum number of idle events kept
+        """
+        self.event_class = event_class
+        self.max_size = max_size
+        self._free = []
+
+    def acquire(self, *args, **kwargs):
+        """
+        Returns an event initialised with the given arguments, recycling an
+        idle one if there is one.
+        """
+        if self._free:
+            event = self._free.pop()
+            event.__init__(*args, **kwargs)
+            return event
+        return self.event_class(*args, **kwargs)
+
+    def release(self, event):
+        """
+        Hands an event back to the pool once nothing refers to it any more.
+        """
+        if type(event) is self.event_class and len(self._free) < self.max_size:
+            self._free.append(event)
@@ -1,9 +1,11 @@
 import datetime
-import Queue
+
+import numpy as np
+import pandas as pd
 
 from abc import ABCMeta, abstractmethod
 
-from event import FillEvent, OrderEvent
+from backtester.event import FillEvent, OrderAckEvent, OrderEvent
 
 class ExecutionHandler():
     """
@@ -28,7 +30,7 @@ class ExecutionHandler():
         Args:
             event (obj) - An event object with order information. 
         """
-        raise Not ImplementedError("ExecutionHandler child must implement execute_order()")
+        raise NotImplementedError("ExecutionHandler child must implement execute_order()")
         
 class SimulatedExecutionHandler(ExecutionHandler):
     """
@@ -40,29 +42,59 @@ class SimulatedExecutionHandler(ExecutionHandler):
         - Slippage (difference between the expected price of a trade 
         and the price which the trade is executed)
         - Fill-ratio issues (How much of an order is filled, poor ratios lead to slippage)
+
+    Latency can be modelled when the events are passed through a TimedEventBus:
+    the order reaches the exchange after route_latency, is acknowledged
+    ack_latency after that, and filled fill_latency after reaching the exchange.
+    The acknowledgement and fill are scheduled as future events.
         
     This is useful for a "first go" test of any strategy before implementation using a more
     sophisticated execution handler.
     """
     
-    def __init__(self, events):
+    def __init__(self, events, route_latency=0, ack_latency=None, fill_latency=0):
         """
         Initialises the handler
+
+        Args:
+            events (obj) - The Event Queue object.
+            route_latency (optional) - Time for an order to reach the exchange
+            ack_latency (optional) - Time from the exchange receiving an order to
+                its acknowledgement arriving, None to send no acknowledgement
+            fill_latency (optional) - Time from the exchange receiving an order to the fill
+
+        Latencies are nanoseconds or anything pd.Timedelta accepts, e.g. '50ms'.
         """
-        self.events
+        self.events = events
+        self.route_latency = pd.Timedelta(route_latency).value
+        self.ack_latency = None if ack_latency is None else pd.Timedelta(ack_latency).value
+        self.fill_latency = pd.Timedelta(fill_latency).value
+        self.timed = hasattr(events, "schedule")
+        if not self.timed and (self.route_latency or self.fill_latency or self.ack_latency is not None):
+            raise ValueError("Simulated latency needs a TimedEventBus")
         
     def execute_order(self, event):
         """
         Simply converts Order objects into fill objects 
-        without latency, slippage or fill ratio problems. 
+        without slippage or fill ratio problems. 
         
         Args:
             event (obj) - Contains an event object with order information.
         """
         if isinstance(event, OrderEvent):
-            # This currently uses the ARCA exchange as a placeholder, 
-            # In a live executuion environment this becomes more important 
-            fill_event = FillEvent(datetime.datetime.utcnow(), event.symbol,
+            if not self.timed:
+                # This currently uses the ARCA exchange as a placeholder, 
+                # In a live executuion environment this becomes more important 
+                fill_event = FillEvent(datetime.datetime.utcnow(), event.symbol,
+                                       "ARCA", event.quantity, event.direction, None)
+                self.events.put(fill_event)
+                return
+
+            arrival = self.events.now + self.route_latency
+            if self.ack_latency is not None:
+                acknowledged = arrival + self.ack_latency
+                self.events.schedule(OrderAckEvent(np.datetime64(acknowledged, "ns"), event), acknowledged)
+            filled = arrival + self.fill_latency
+            fill_event = FillEvent(np.datetime64(filled, "ns"), event.symbol,
                                    "ARCA", event.quantity, event.direction, None)
-            self.events.put(fill_event)
-    
\ No newline at end of file
+            self.events.schedule(fill_event, filled)
@@ -0,0 +1,190 @@
+import copy
+import os
+import pickle
+import traceback
+
+from backtester.data import DataHandler
+from backtester.main_loop import backtest
+
+
+class Branch(object):
+    """
+    The components of a backtest continued in a forked child. A scenario gets
+    the Branch before the run carries on and may change any of them, e.g.
+    replace the broker with one that has a different latency or change the
+    strategy's parameters, or set a dispatcher.
+    """
+
+    def __init__(self, index, events, data, portfolio, strategy, broker, dispatcher=None):
+        self.index = index
+        self.events = events
+        self.data = data
+        self.portfolio = portfolio
+        self.strategy = strategy
+        self.broker = broker
+        self.dispatcher = dispatcher
+
+    def run(self):
+        stats = backtest(self.events, self.data, self.portfolio, self.strategy, self.broker,
+                         dispatcher=self.dispatcher)
+        return BranchResult(self.index, stats, self.portfolio.equity_curve)
+
+
+class BranchResult(object):
+    """
+    The outcome of one branch: its summary statistics and equity curve.
+    """
+
+    def __init__(self, index, stats, equity_curve):
+        self.index = index
+        self.stats = stats
+        self.equity_curve = equity_curve
+
+    def __repr__(self):
+        return f"BranchResult({self.index}, {dict(self.stats)})"
+
+
+class BranchError(Exception):
+    """
+    Raised once every branch has finished if any of them failed.
+    """
+
+    def __init__(self, failures):
+        """
+        Args:
+            failures (dict) - The formatted traceback of each failed branch by index
+        """
+        self.failures = failures
+        Exception.__init__(self, "\n".join(f"Branch {index} failed:\n{error}"
+                                           for index, error in sorted(failures.items())))
+
+
+def fork_backtest(events, data, portfolio, strategy, broker, at, scenarios, dispatcher=None, workers=None):
+    """
+    Runs a backtest up to a timestamp once, then continues it in one branch per
+    scenario from that same state.
+
+    Each branch is a child process made with os.fork(), so it starts from a
+    copy-on-write image of this one: the market data and everything else is
+    shared with the parent until written to, and nothing is replayed. Only the
+    results are sent back, pickled through a pipe. The caller's components are
+    left at the fork point, so the baseline can still be continued with
+    backtest(). Threads do not survive a fork, so handlers that read on
+    background threads (StreamingCSVDataHandler, LiveDataHandler) are
+    rejected.
+
+    Where os.fork() is not available the branches run one after the other in
+    this process, on deep copies of the components made through the data
+    handler's get_state(), which still share the market data arrays. This
+    works for any handler that can be checkpointed, StreamingCSVDataHandler
+    included.
+
+    Args:
+        events, data, portfolio, strategy, broker - The components, see backtest()
+        at - The timestamp of the fork: every bar up to and including it is
+            run before branching
+        scenarios (List[callable]) - scenario(branch) is called in each child
+            with its Branch before the run is continued; None leaves it unchanged
+        dispatcher (Dispatcher, optional) - The routing up to the fork point,
+            also used by the branches unless a scenario sets another
+        workers (int, optional) - Number of branches run at once, default os.cpu_count()
+
+    Returns:
+        A BranchResult per scenario, in the order of scenarios.
+
+    Raises:
+        ValueError - If the data handler cannot be branched, checked before
+            anything is run.
+        BranchError - If any scenario or branch run raised.
+    """
+    forked = hasattr(os, "fork")
+    if forked and data.background_readers:
+        raise ValueError(f"{type(data).__name__} reads on background threads, which do not survive os.fork()")
+    if not forked and type(data).get_state is DataHandler.get_state:
+        raise ValueError(f"{type(data).__name__} does not implement get_state(), it cannot be copied")
+    if backtest(events, data, portfolio, strategy, broker, dispatcher=dispatcher, until=at) is not None:
+        raise ValueError(f"The data ends before the fork point {at}")
+    branches = lambda: (Branch(index, events, data, portfolio, strategy, broker, dispatcher)
+                        for index in range(len(scenarios)))
+    if forked:
+        results, failures = _run_forked(branches(), scenarios, workers or os.cpu_count() or 1)
+    else:
+        results, failures = _run_copied(branches(), scenarios)
+    if failures:
+        raise BranchError(failures)
+    return [results[index] for index in range(len(scenarios))]
+
+
+def _run_branch(branch, scenario):
+    if scenario is not None:
+        scenario(branch)
+    return branch.run()
+
+
+def _run_forked(branches, scenarios, workers):
+    results, failures = {}, {}
+    running = []
+
+    def collect():
+        index, pid, reader = running.pop(0)
+        with os.fdopen(reader, "rb") as f:
+            payload = f.read()
+        os.waitpid(pid, 0)
+        try:
+            ok, value = pickle.loads(payload)
+        except Exception:
+            ok, value = False, "The branch exited without a result"
+        if ok:
+            results[index] = value
+        else:
+            failures[index] = value
+
+    for branch in branches:
+        if len(running) >= workers:
+            collect()
+        reader, writer = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # The child: run the branch, send back the result and leave without cleanup
+            os.close(reader)
+            status = 0
+            try:
+                try:
+                    payload = pickle.dumps((True, _run_branch(branch, scenarios[branch.index])))
+                except BaseException:
+                    payload = pickle.dumps((False, traceback.format_exc()))
+                with os.fdopen(writer, "wb") as f:
+                    f.write(payload)
+            except BaseException:
+                status = 1
+            finally:
+                os._exit(status)
+        os.close(writer)
+        running.append((branch.index, pid, reader))
+    while running:
+        collect()
+    return results, failures
+
+
+def _run_copied(branches, scenarios):
+    results, failures = {}, {}
+    for branch in branches:
+        try:
+            results[branch.index] = _run_branch(_copy_branch(branch), scenarios[branch.index])
+        except Exception:
+            failures[branch.index] = traceback.format_exc()
+    return results, failures
+
+
+def _copy_branch(branch):
+    # The handler is copied through its checkpoint state, which rebuilds what
+    # cannot be copied (the merger's generators and any readers) and leaves
+    # out the market data. The shallow copy must not share anything set_state()
+    # closes, see StreamingCSVDataHandler.__copy__
+    data = branch.data
+    clone = copy.copy(data)
+    memo = {id(data): clone}
+    clone.set_state(copy.deepcopy(data.get_state(), memo))
+    copied = copy.deepcopy(branch, memo)
+    clone.events = copied.events
+    return copied
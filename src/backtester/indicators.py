@@ -0,0 +1,483 @@
+import math
+import sys
+from abc import ABCMeta, abstractmethod
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from backtester.store import FIELDS
+
+_CLOSE = FIELDS.index("close")
+_HIGH = FIELDS.index("high")
+_LOW = FIELDS.index("low")
+
+
+def _ewm(mean, weight, x, alpha):
+    """
+    One step of pandas' ewm(alpha=alpha, adjust=False).mean(). A missing x
+    leaves the mean as it is and decays its weight, so the next value is
+    averaged in with more weight instead of the mean being lost.
+
+    Returns:
+        The new (mean, weight) pair, the weight is 1 after a value.
+    """
+    if mean != mean:
+        return x, 1.0
+    weight *= 1.0 - alpha
+    if x == x:
+        if mean != x:
+            mean = (weight * mean + alpha * x) / (weight + alpha)
+        weight = 1.0
+    return mean, weight
+
+
+def _trailing_missing(x):
+    """
+    Number of NaNs at the end of an array, the weight of its ewm is
+    (1 - alpha) to that power.
+    """
+    valid = np.flatnonzero(~np.isnan(x))
+    return len(x) - 1 - valid[-1] if len(valid) else len(x)
+
+
+class Indicator(object):
+    """
+    Indicator is an abstract base class for streaming indicators. Each one is
+    updated with one bar at a time at O(1) cost, and can also be computed over a
+    whole history in a single vectorised pass which leaves it in the same state
+    as if every bar had been streamed through update().
+
+    Until enough bars have been seen the value is NaN. Missing (NaN) inputs
+    are handled as pandas does: a window holding one is NaN until it has
+    left, and a moving average carries on past it.
+    """
+
+    __metaclass__ = ABCMeta
+
+    value = math.nan
+
+    @abstractmethod
+    def update(self, values):
+        """
+        Folds in one bar and returns the new value.
+
+        Args:
+            values (sequence) - Field values of the bar in the order of FIELDS
+        """
+        raise NotImplementedError("Indicator child must implement update()")
+
+    @abstractmethod
+    def warm_up(self, history):
+        """
+        Computes the indicator over a whole history at once, replacing the
+        current state.
+
+        Args:
+            history (BarWindow) - Bars in time order
+
+        Returns:
+            A float64 array with the indicator value at every bar.
+        """
+        raise NotImplementedError("Indicator child must implement warm_up()")
+
+
+class SMA(Indicator):
+    """
+    Simple moving average of a field over a fixed window, kept as a running sum.
+    Missing (NaN) values are counted rather than summed, so the average is NaN
+    while one is in the window and recovers once it has left, as in pandas.
+    """
+
+    def __init__(self, window, field="close"):
+        self.window = window
+        self.field = FIELDS.index(field)
+        self._values = deque()
+        self._sum = 0.0
+        self._missing = 0
+
+    def _result(self):
+        if len(self._values) < self.window or self._missing:
+            return math.nan
+        return self._sum / self.window
+
+    def update(self, values):
+        x = values[self.field]
+        self._values.append(x)
+        if x != x:
+            self._missing += 1
+        else:
+            self._sum += x
+        if len(self._values) > self.window:
+            old = self._values.popleft()
+            if old != old:
+                self._missing -= 1
+            else:
+                self._sum -= old
+        self.value = self._result()
+        return self.value
+
+    def warm_up(self, history):
+        x = np.asarray(history[FIELDS[self.field]], dtype=np.float64)
+        series = pd.Series(x).rolling(self.window).mean().to_numpy()
+        self._values = deque(x[-self.window:].tolist())
+        self._missing = sum(1 for value in self._values if value != value)
+        self._sum = math.fsum(value for value in self._values if value == value)
+        self.value = self._result()
+        return series
+
+
+class EMA(Indicator):
+    """
+    Exponential moving average, seeded with the first value:
+    ema = alpha * x + (1 - alpha) * ema, with alpha = 2 / (span + 1).
+    """
+
+    def __init__(self, span, field="close"):
+        self.span = span
+        self.alpha = 2.0 / (span + 1.0)
+        self.field = FIELDS.index(field)
+        self._count = 0
+        self._ema = math.nan
+        self._weight = 1.0
+
+    def update(self, values):
+        self._ema, self._weight = _ewm(self._ema, self._weight, values[self.field], self.alpha)
+        self._count += 1
+        self.value = self._ema if self._count >= self.span else math.nan
+        return self.value
+
+    def warm_up(self, history):
+        x = np.asarray(history[FIELDS[self.field]], dtype=np.float64)
+        ema = pd.Series(x).ewm(alpha=self.alpha, adjust=False).mean().to_numpy(copy=True)
+        self._count = len(x)
+        self._ema = ema[-1] if len(x) else math.nan
+        self._weight = (1.0 - self.alpha) ** _trailing_missing(x)
+        self.value = self._ema if self._count >= self.span else math.nan
+        ema[:self.span - 1] = np.nan
+        return ema
+
+
+class RollingVariance(Indicator):
+    """
+    Sample variance over a fixed window, using Welford's update when the window
+    is filling and the add-one/remove-one form of it once it is full. The
+    mean and sum of squares are kept over the values in the window that are
+    not missing.
+    """
+
+    def __init__(self, window, field="close", ddof=1):
+        self.window = window
+        self.field = FIELDS.index(field)
+        self.ddof = ddof
+        self._values = deque()
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def _result(self):
+        if len(self._values) < self.window or self._count < self.window:
+            return math.nan
+        return max(self._m2, 0.0) / (self.window - self.ddof)
+
+    def _add(self, x):
+        self._count += 1
+        delta = x - self._mean
+        self._mean += delta / self._count
+        self._m2 += delta * (x - self._mean)
+
+    def _remove(self, x):
+        self._count -= 1
+        if self._count == 0:
+            self._mean = self._m2 = 0.0
+            return
+        delta = x - self._mean
+        self._mean -= delta / self._count
+        self._m2 -= delta * (x - self._mean)
+
+    def update(self, values):
+        x = values[self.field]
+        self._values.append(x)
+        old = self._values.popleft() if len(self._values) > self.window else math.nan
+        if x == x and old == old:
+            mean = self._mean + (x - old) / self._count
+            self._m2 += (x - old) * (x - mean + old - self._mean)
+            self._mean = mean
+        else:
+            if old == old:
+                self._remove(old)
+            if x == x:
+                self._add(x)
+        self.value = self._result()
+        return self.value
+
+    def warm_up(self, history):
+        x = np.asarray(history[FIELDS[self.field]], dtype=np.float64)
+        series = pd.Series(x).rolling(self.window).var(ddof=self.ddof).to_numpy()
+        tail = x[-self.window:]
+        valid = tail[~np.isnan(tail)]
+        self._values = deque(tail.tolist())
+        self._count = len(valid)
+        self._mean = float(valid.mean()) if len(valid) else 0.0
+        self._m2 = float(((valid - self._mean) ** 2).sum())
+        self.value = self._result()
+        return series
+
+
+class RollingStd(RollingVariance):
+    """
+    Sample standard deviation over a fixed window (see RollingVariance).
+    """
+
+    def _result(self):
+        return math.sqrt(RollingVariance._result(self))
+
+    def warm_up(self, history):
+        return np.sqrt(RollingVariance.warm_up(self, history))
+
+
+class RollingMax(Indicator):
+    """
+    Maximum of a field over a fixed window, using a monotonic deque of
+    (bar number, value) pairs so each bar costs amortised O(1).
+    """
+
+    def __init__(self, window, field="close"):
+        self.window = window
+        self.field = FIELDS.index(field)
+        self._deque = deque()
+        self._count = 0
+        # Bar number of the last missing value, which keeps the window NaN
+        self._missing = -sys.maxsize
+
+    @staticmethod
+    def _dominates(new, old):
+        return new >= old
+
+    def _result(self):
+        if self._count < self.window or self._missing > self._count - 1 - self.window:
+            return math.nan
+        return self._deque[0][1]
+
+    def update(self, values):
+        x = values[self.field]
+        queue = self._deque
+        if x == x:
+            while queue and self._dominates(x, queue[-1][1]):
+                queue.pop()
+            queue.append((self._count, x))
+        else:
+            self._missing = self._count
+        if queue and queue[0][0] <= self._count - self.window:
+            queue.popleft()
+        self._count += 1
+        self.value = self._result()
+        return self.value
+
+    def _rolling(self, series):
+        return series.max()
+
+    def warm_up(self, history):
+        x = np.asarray(history[FIELDS[self.field]], dtype=np.float64)
+        series = self._rolling(pd.Series(x).rolling(self.window)).to_numpy()
+        tail = x[-self.window:]
+        self._deque = deque()
+        self._missing = -sys.maxsize
+        for count, value in enumerate(tail.tolist(), len(x) - len(tail)):
+            if value != value:
+                self._missing = count
+                continue
+            while self._deque and self._dominates(value, self._deque[-1][1]):
+                self._deque.pop()
+            self._deque.append((count, value))
+        self._count = len(x)
+        self.value = self._result()
+        return series
+
+
+class RollingMin(RollingMax):
+    """
+    Minimum of a field over a fixed window (see RollingMax).
+    """
+
+    @staticmethod
+    def _dominates(new, old):
+        return new <= old
+
+    def _rolling(self, series):
+        return series.min()
+
+
+class RSI(Indicator):
+    """
+    Relative Strength Index of the close, with gains and losses smoothed by
+    Wilder's moving average (an EMA with alpha = 1 / period).
+    """
+
+    def __init__(self, period=14):
+        self.period = period
+        self.alpha = 1.0 / period
+        self._previous = None
+        self._gain = math.nan
+        self._loss = math.nan
+        self._gain_weight = 1.0
+        self._loss_weight = 1.0
+        self._count = 0
+
+    def _result(self):
+        if self._count < self.period:
+            return math.nan
+        if self._loss == 0:
+            return 100.0
+        return 100.0 - 100.0 / (1.0 + self._gain / self._loss)
+
+    def update(self, values):
+        close = values[_CLOSE]
+        if self._previous is not None:
+            change = close - self._previous
+            gain, loss = (max(change, 0.0), max(-change, 0.0)) if change == change else (math.nan, math.nan)
+            self._gain, self._gain_weight = _ewm(self._gain, self._gain_weight, gain, self.alpha)
+            self._loss, self._loss_weight = _ewm(self._loss, self._loss_weight, loss, self.alpha)
+            self._count += 1
+        self._previous = close
+        self.value = self._result()
+        return self.value
+
+    def warm_up(self, history):
+        close = np.asarray(history["close"], dtype=np.float64)
+        change = np.diff(close)
+        gain = pd.Series(np.maximum(change, 0.0)).ewm(alpha=self.alpha, adjust=False).mean().to_numpy()
+        loss = pd.Series(np.maximum(-change, 0.0)).ewm(alpha=self.alpha, adjust=False).mean().to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = np.where(loss == 0, 100.0, 100.0 - 100.0 / (1.0 + gain / loss))
+        rsi[:self.period - 1] = np.nan
+        self._count = len(change)
+        self._previous = close[-1] if len(close) else None
+        self._gain = gain[-1] if len(change) else math.nan
+        self._loss = loss[-1] if len(change) else math.nan
+        self._gain_weight = self._loss_weight = (1.0 - self.alpha) ** _trailing_missing(change)
+        self.value = self._result()
+        return np.concatenate(([np.nan], rsi)) if len(close) else rsi
+
+
+class ATR(Indicator):
+    """
+    Average True Range, the true range smoothed by Wilder's moving average.
+    The first bar's true range is its high - low.
+    """
+
+    def __init__(self, period=14):
+        self.period = period
+        self.alpha = 1.0 / period
+        self._previous = math.nan
+        self._atr = math.nan
+        self._weight = 1.0
+        self._count = 0
+
+    def update(self, values):
+        high, low, close = values[_HIGH], values[_LOW], values[_CLOSE]
+        # The largest of the three that are not missing, as np.fmax
+        ranges = [value for value in (high - low, abs(high - self._previous), abs(low - self._previous))
+                  if value == value]
+        true_range = max(ranges) if ranges else math.nan
+        self._atr, self._weight = _ewm(self._atr, self._weight, true_range, self.alpha)
+        self._count += 1
+        self._previous = close
+        self.value = self._atr if self._count >= self.period else math.nan
+        return self.value
+
+    def warm_up(self, history):
+        high = np.asarray(history["high"], dtype=np.float64)
+        low = np.asarray(history["low"], dtype=np.float64)
+        close = np.asarray(history["close"], dtype=np.float64)
+        previous = np.concatenate(([np.nan], close[:-1]))
+        true_range = np.fmax(high - low, np.fmax(np.abs(high - previous), np.abs(low - previous)))
+        atr = pd.Series(true_range).ewm(alpha=self.alpha, adjust=False).mean().to_numpy(copy=True)
+        self._count = len(close)
+        self._previous = close[-1] if len(close) else math.nan
+        self._atr = atr[-1] if len(close) else math.nan
+        self._weight = (1.0 - self.alpha) ** _trailing_missing(true_range)
+        self.value = self._atr if self._count >= self.period else math.nan
+        atr[:self.period - 1] = np.nan
+        return atr
+
+
+class IndicatorRegistry(object):
+    """
+    A shared cache of streaming indicators keyed by (symbol, name, params).
+
+    The data handler feeds each new bar to the registry once, and every
+    strategy asking for the same indicator gets the same instance, so the
+    work is never repeated. An indicator registered part way through a run is
+    warmed up in one vectorised pass over the history the handler holds.
+    """
+
+    INDICATORS = {
+        "sma": SMA,
+        "ema": EMA,
+        "var": RollingVariance,
+        "std": RollingStd,
+        "max": RollingMax,
+        "min": RollingMin,
+        "rsi": RSI,
+        "atr": ATR,
+    }
+
+    def __init__(self, data=None):
+        """
+        Args:
+            data (DataHandler, optional) - The handler used to warm up new indicators.
+        """
+        self.data = data
+        self.indicators = {}
+        self._by_symbol = {}
+
+    def __len__(self):
+        return len(self.indicators)
+
+    @staticmethod
+    def key(symbol, name, **params):
+        """
+        Returns the registry key for an indicator.
+        """
+        return (symbol, name, tuple(sorted(params.items())))
+
+    def get(self, symbol, name, **params):
+        """
+        Returns the indicator for a symbol, registering it on first use.
+
+        Args:
+            symbol (str) - The ticker symbol e.g. 'GOOG'
+            name (str) - One of INDICATORS, e.g. 'sma'
+            params - Keyword parameters of the indicator, e.g. window=20
+        """
+        key = self.key(symbol, name, **params)
+        indicator = self.indicators.get(key)
+        if indicator is None:
+            if name not in self.INDICATORS:
+                raise KeyError(f"Unknown indicator {name!r}, expected one of {sorted(self.INDICATORS)}")
+            indicator = self.INDICATORS[name](**params)
+            if self.data is not None:
+                history = self.data.get_latest_data(symbol, N=sys.maxsize)
+                if history is not None and len(history) > 0:
+                    indicator.warm_up(history)
+            self.indicators[key] = indicator
+            self._by_symbol.setdefault(symbol, []).append(indicator)
+        return indicator
+
+    def value(self, symbol, name, **params):
+        """
+        Returns the current value of an indicator, registering it on first use.
+        """
+        return self.get(symbol, name, **params).value
+
+    def update(self, symbol, values):
+        """
+        Feeds one bar of a symbol to every indicator registered for it.
+
+        Args:
+            symbol (str) - The ticker symbol e.g. 'GOOG'
+            values (sequence) - Field values of the bar in the order of FIELDS
+        """
+        for indicator in self._by_symbol.get(symbol, ()):
+            indicator.update(values)
@@ -0,0 +1,216 @@
+import json
+import time
+
+import pandas as pd
+
+from backtester.bus import Dispatcher
+
+
+class LatencyHistogram(object):
+    """
+    A log-linear histogram of non-negative integer durations in the style of
+    HdrHistogram: values below 2**bits are counted exactly, larger ones in
+    buckets 2**(bits - 1) to a power of two, so every recorded value is known
+    to a relative error below 2**(1 - bits) at O(1) cost per record.
+    """
+
+    def __init__(self, bits=7):
+        """
+        Args:
+            bits (int, optional) - Significant bits kept per value
+        """
+        self.bits = bits
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def _index(self, value):
+        shift = value.bit_length() - self.bits
+        if shift <= 0:
+            return value
+        return ((shift + 1) << (self.bits - 1)) + (value >> shift)
+
+    def _value(self, index):
+        # The middle of the bucket the index stands for
+        half = 1 << (self.bits - 1)
+        if index < 2 * half:
+            return index
+        shift = (index >> (self.bits - 1)) - 2
+        return ((index - (shift + 1) * half) << shift) + (1 << shift) // 2
+
+    def record(self, value):
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if self.min is None or value < self.min:
+            self.min = value
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q):
+        """
+        Returns the value at percentile q, 0 to 100.
+        """
+        if not self.count:
+            return 0
+        target = q / 100.0 * self.count
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(max(self._value(index), self.min), self.max)
+        return self.max
+
+
+class Instrumentation(object):
+    """
+    Optional measurements of a backtest, passed to main_loop.backtest():
+
+        - the count and a LatencyHistogram of the handling time of every event
+          class, over all its handlers,
+        - the wall time of every handler and of the data handler's updates,
+        - the depth of the event bus, sampled as events are dispatched,
+        - with trace=True, a timeline of every call for chrome://tracing or
+          Perfetto.
+
+    Measuring is done by wrapping the dispatcher's handlers and the data
+    update before the loop starts, so a backtest without instrumentation runs
+    the same loop as before and pays nothing.
+    """
+
+    def __init__(self, trace=False, max_trace_events=1000000, depth_every=1):
+        """
+        Args:
+            trace (bool, optional) - Record a timeline of every call
+            max_trace_events (int, optional) - Calls recorded in the timeline at most
+            depth_every (int, optional) - Sample the bus depth every this many events
+        """
+        self.trace = trace
+        self.max_trace_events = max_trace_events
+        self.depth_every = depth_every
+        self.events = {}
+        self.handlers = {}
+        self.queue_depth = []
+        self.trace_events = []
+        self._dispatched = 0
+        self._start = time.perf_counter_ns()
+
+    def _histogram(self, table, name):
+        histogram = table.get(name)
+        if histogram is None:
+            histogram = table[name] = LatencyHistogram()
+        return histogram
+
+    def _record(self, category, name, start, end):
+        if self.trace and len(self.trace_events) < self.max_trace_events:
+            self.trace_events.append({"name": name, "cat": category, "ph": "X", "pid": 0, "tid": 0,
+                                      "ts": (start - self._start) / 1000.0, "dur": (end - start) / 1000.0})
+
+    def timed(self, name, function, category="handler"):
+        """
+        Returns function wrapped to record its wall time under name.
+        """
+        histogram = self._histogram(self.handlers, name)
+        clock = time.perf_counter_ns
+        record = self._record
+
+        def timed_function(*args):
+            start = clock()
+            result = function(*args)
+            end = clock()
+            histogram.record(end - start)
+            record(category, name, start, end)
+            return result
+        return timed_function
+
+    def instrument_dispatcher(self, dispatcher):
+        """
+        Returns a copy of a Dispatcher whose handlers are timed.
+        """
+        instrumented = Dispatcher()
+        for event_class, handlers in dispatcher.handlers.items():
+            for handler in handlers:
+                name = getattr(handler, "__qualname__", None) or repr(handler)
+                instrumented.subscribe(event_class, self.timed(name, handler))
+        return instrumented
+
+    def instrument_dispatch(self, dispatcher, events):
+        """
+        Returns the dispatch function of an instrumented copy of the dispatcher,
+        which also counts and times each event and samples the bus depth.
+        """
+        dispatch = self.instrument_dispatcher(dispatcher).dispatch
+        clock = time.perf_counter_ns
+        histograms = self.events
+        sized = hasattr(events, "__len__")
+
+        def instrumented_dispatch(event):
+            self._dispatched += 1
+            if sized and self._dispatched % self.depth_every == 0:
+                depth = len(events)
+                now = clock()
+                self.queue_depth.append(((now - self._start) / 1000.0, depth))
+                if self.trace and len(self.trace_events) < self.max_trace_events:
+                    self.trace_events.append({"name": "queue depth", "ph": "C", "pid": 0, "tid": 0,
+                                              "ts": (now - self._start) / 1000.0, "args": {"depth": depth}})
+            name = event.__class__.__name__
+            histogram = histograms.get(name)
+            if histogram is None:
+                histogram = self._histogram(histograms, name)
+            start = clock()
+            dispatch(event)
+            end = clock()
+            histogram.record(end - start)
+            self._record("event", name, start, end)
+        return instrumented_dispatch
+
+    def summary(self):
+        """
+        A DataFrame with a row per event class and per handler: the number of
+        calls, the total time in ms and the mean, median, p99 and maximum
+        times in microseconds.
+        """
+        rows = []
+        for kind, table in (("event", self.events), ("handler", self.handlers)):
+            for name, histogram in table.items():
+                rows.append({
+                    "kind": kind,
+                    "name": name,
+                    "count": histogram.count,
+                    "total_ms": histogram.total / 1e6,
+                    "mean_us": histogram.mean / 1e3,
+                    "p50_us": histogram.percentile(50) / 1e3,
+                    "p99_us": histogram.percentile(99) / 1e3,
+                    "max_us": histogram.max / 1e3,
+                })
+        columns = ["kind", "name", "count", "total_ms", "mean_us", "p50_us", "p99_us", "max_us"]
+        return pd.DataFrame(rows, columns=columns).set_index(["kind", "name"])
+
+    def to_dict(self):
+        """
+        The summary and the sampled bus depth as plain data, for JSON.
+        """
+        depths = [depth for _, depth in self.queue_depth]
+        return {
+            "summary": self.summary().reset_index().to_dict(orient="records"),
+            "queue_depth": {"samples": len(depths), "max": max(depths, default=0),
+                            "mean": sum(depths) / len(depths) if depths else 0.0},
+        }
+
+    def write_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def write_chrome_trace(self, path):
+        """
+        Writes the timeline in the Chrome trace event format (trace=True only).
+        """
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.trace_events, "displayTimeUnit": "ns"}, f)
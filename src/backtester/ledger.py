@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+
+# Columns of the holdings matrix after one column per symbol
+ACCOUNT_COLUMNS = ("cash", "commission", "total", "returns", "equity_curve")
+
+
+class Ledger(object):
+    """
+    The history of a portfolio held as NumPy matrices, one row per bar: the
+    positions (time x symbol) and the holdings (time x symbol, then cash,
+    commission, total, returns and equity_curve).
+
+    Rows are written in place into preallocated matrices that grow
+    geometrically, so recording a bar is one vectorised multiply of the
+    positions by the prices rather than two new dicts. The equity curve is a
+    DataFrame over the same memory, built without copying.
+    """
+
+    def __init__(self, symbol_list, initial_capital=100000.0, start_date=None, initial_size=1024):
+        """
+        Args:
+            symbol_list (List[str]) - The symbols, one column each
+            initial_capital (float, optional) - The starting cash
+            start_date (optional) - Timestamp of the initial row, None for NaT
+            initial_size (int, optional) - Starting number of rows allocated
+        """
+        self.symbol_list = list(symbol_list)
+        self.columns = self.symbol_list + list(ACCOUNT_COLUMNS)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbol_list)}
+        self.initial_capital = initial_capital
+
+        n = len(self.symbol_list)
+        self.positions = np.zeros(n, dtype=np.float64)
+        self.cash = initial_capital
+        self.commission = 0.0
+        self.count = 0
+        self._datetime = np.empty(max(initial_size, 1), dtype="datetime64[ns]")
+        self._positions = np.zeros((len(self._datetime), n), dtype=np.float64)
+        self._holdings = np.zeros((len(self._datetime), n + len(ACCOUNT_COLUMNS)), dtype=np.float64)
+        self.record(start_date, np.zeros(n))
+
+    def __len__(self):
+        return self.count
+
+    def __getstate__(self):
+        # Leave the unused rows out of pickles
+        state = self.__dict__.copy()
+        for name in ("_datetime", "_positions", "_holdings"):
+            state[name] = state[name][:self.count].copy()
+        return state
+
+    def _grow(self):
+        size = max(2 * len(self._datetime), 1)
+        datetime = np.empty(size, dtype=self._datetime.dtype)
+        datetime[:self.count] = self._datetime[:self.count]
+        self._datetime = datetime
+        for name in ("_positions", "_holdings"):
+            old = getattr(self, name)
+            new = np.zeros((size, old.shape[1]), dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def rows(self, start=0):
+        """
+        Returns copies of the datetimes, positions and holdings of the rows
+        from start on, e.g. the rows recorded since a Checkpointer last
+        journaled the ledger.
+        """
+        return (self._datetime[start:self.count].copy(), self._positions[start:self.count].copy(),
+                self._holdings[start:self.count].copy())
+
+    def append_rows(self, datetime, positions, holdings):
+        """
+        Appends rows taken with rows(), growing the matrices as needed.
+        """
+        end = self.count + len(datetime)
+        while end > len(self._datetime):
+            self._grow()
+        self._datetime[self.count:end] = datetime
+        self._positions[self.count:end] = positions
+        self._holdings[self.count:end] = holdings
+        self.count = end
+
+    def empty_copy(self):
+        """
+        Returns a copy of the ledger's current positions, cash and commission
+        without any rows, for append_rows() to fill back in.
+        """
+        ledger = object.__new__(Ledger)
+        ledger.__dict__.update(self.__dict__)
+        ledger.positions = self.positions.copy()
+        ledger._datetime, ledger._positions, ledger._holdings = self.rows(self.count)
+        ledger.count = 0
+        return ledger
+
+    def fill(self, symbol, quantity, cost, commission):
+        """
+        Applies a fill to the current positions and cash.
+
+        Args:
+            symbol (str) - The symbol filled
+            quantity (float) - Signed quantity, negative for sales
+            cost (float) - Signed cost of the fill, negative for sales
+            commission (float) - The commission paid
+        """
+        self.positions[self.index[symbol]] += quantity
+        self.commission += commission
+        self.cash -= cost + commission
+
+    def record(self, datestamp, prices):
+        """
+        Appends a row with the current positions marked to market.
+
+        Args:
+            datestamp - Timestamp of the row
+            prices (np.ndarray) - The latest price of every symbol
+
+        Returns:
+            The row of holdings written (a view).
+        """
+        if self.count == len(self._datetime):
+            self._grow()
+        i = self.count
+        n = len(self.symbol_list)
+        self._datetime[i] = np.datetime64("NaT") if datestamp is None or datestamp == "" else datestamp
+        self._positions[i] = self.positions
+        row = self._holdings[i]
+        np.multiply(self.positions, prices, out=row[:n])
+        row[n] = self.cash
+        row[n + 1] = self.commission
+        row[n + 2] = self.cash + row[:n].sum()
+        self.count += 1
+        return row
+
+    def total(self):
+        """
+        Returns the total value of every row recorded so far (a view).
+        """
+        return self._holdings[:self.count, len(self.symbol_list) + 2]
+
+    def positions_frame(self):
+        """
+        Returns the positions of every row as a DataFrame over the ledger's memory.
+        """
+        return pd.DataFrame(self._positions[:self.count], index=self._index(),
+                            columns=self.symbol_list, copy=False)
+
+    def equity_curve(self):
+        """
+        Fills in the returns and equity_curve columns and returns the holdings
+        of every row as a DataFrame over the ledger's memory, with the columns
+        of NaivePortfolio.create_equity_curve_dataframe.
+        """
+        n = len(self.symbol_list)
+        holdings = self._holdings[:self.count]
+        total = holdings[:, n + 2]
+        returns = holdings[:, n + 3]
+        equity = holdings[:, n + 4]
+        returns[0] = equity[0] = np.nan
+        if self.count > 1:
+            np.divide(total[1:], total[:-1], out=returns[1:])
+            returns[1:] -= 1.0
+            np.cumprod(1.0 + returns[1:], out=equity[1:])
+        return pd.DataFrame(holdings, index=self._index(), columns=self.columns, copy=False)
+
+    def _index(self):
+        return pd.DatetimeIndex(self._datetime[:self.count], name="datestamp", copy=False)
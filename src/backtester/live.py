@@ -0,0 +1,368 @@
+import argparse
+import asyncio
+import json
+import queue
+import struct
+import threading
+import time
+
+import numpy as np
+
+from backtester.data import DataHandler, HistoricCSVDataHandler
+from backtester.indicators import IndicatorRegistry
+from backtester.instrument import LatencyHistogram
+from backtester.store import FIELDS, BarBuffer
+
+# One bar on the wire: the symbol's index in the feed's symbol list, the bar
+# timestamp, the fields and the wall time (ns since the epoch) it was sent at
+RECORD = np.dtype([("symbol", "<u2"), ("datetime", "<i8")] + [(field, "<f8") for field in FIELDS]
+                  + [("sent", "<i8")])
+
+# Each frame is a little-endian record count followed by the records; a count
+# of zero ends the stream
+FRAME_HEADER = struct.Struct("<I")
+
+
+class ReplayServer(object):
+    """
+    A local feed server that replays historic CSV files over TCP, for running
+    and load-testing the live path offline.
+
+    A client first receives a JSON line with the symbol list, then frames of
+    bars in timestamp order. Every frame holds whole timestamps, so all the
+    bars of a timestamp arrive together. Each connection gets its own replay
+    from the first bar.
+
+    At speed 1.0 bars are sent as far apart in wall time as in the data, at
+    speed 60 a minute of data takes a second, and with speed None they are
+    sent as fast as the client reads them. Bars falling due together (or all
+    of them, unpaced) are coalesced into frames of up to max_batch records.
+    """
+
+    def __init__(self, csv_dir, symbol_list, speed=1.0, host="127.0.0.1", port=0,
+                 max_batch=4096, symbol_data=None):
+        """
+        Args:
+            csv_dir (str) - Directory containing the 'symbol.csv' files
+            symbol_list (List[str]) - A list of symbol strings
+            speed (float, optional) - Multiple of real time, None for unpaced
+            host (str, optional) - Address to listen on
+            port (int, optional) - Port to listen on, 0 for any free port
+            max_batch (int, optional) - Records per frame at most
+            symbol_data (dict, optional) - Already loaded ColumnarBars per symbol
+        """
+        data = HistoricCSVDataHandler(None, csv_dir, symbol_list, symbol_data=symbol_data)
+        self.symbol_list = list(symbol_list)
+        self.speed = speed
+        self.host = host
+        self.port = port
+        self.max_batch = max_batch
+
+        parts = []
+        for index, symbol in enumerate(self.symbol_list):
+            bars = data.symbol_data[symbol]
+            part = np.zeros(len(bars), dtype=RECORD)
+            part["symbol"] = index
+            part["datetime"] = bars.datetime
+            for field in FIELDS:
+                part[field] = bars.columns[field]
+            parts.append(part)
+        records = np.concatenate(parts) if parts else np.zeros(0, dtype=RECORD)
+        # Timestamp order, symbol_list order within a timestamp
+        self.records = records[np.lexsort((records["symbol"], records["datetime"]))]
+        # Start of every timestamp, and the end of the last
+        self._groups = np.append(np.flatnonzero(np.diff(self.records["datetime"], prepend=-1) != 0),
+                                 len(self.records))
+        self._server = None
+        self._loop = None
+        self._thread = None
+
+    async def start(self):
+        """
+        Starts listening; `port` is set to the port actually bound.
+        """
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    def _frame(self, start, stop):
+        frame = self.records[start:stop].copy()
+        frame["sent"] = time.time_ns()
+        return FRAME_HEADER.pack(len(frame)) + frame.tobytes()
+
+    async def _handle(self, reader, writer):
+        try:
+            writer.write((json.dumps({"symbols": self.symbol_list, "fields": list(FIELDS)}) + "\n").encode())
+            groups = self._groups
+            datetime = self.records["datetime"]
+            first = int(datetime[0]) if len(datetime) else 0
+            origin = time.perf_counter()
+            g = 0
+            while g < len(groups) - 1:
+                if self.speed is None:
+                    due = len(groups) - 1
+                else:
+                    # Every timestamp due by now is sent at once
+                    elapsed = (time.perf_counter() - origin) * self.speed * 1e9
+                    due = int(np.searchsorted(datetime[groups[:-1]], first + elapsed, side="right"))
+                    if due <= g:
+                        wait = (int(datetime[groups[g]]) - first) / self.speed / 1e9
+                        await asyncio.sleep(max(wait - (time.perf_counter() - origin), 0.0))
+                        continue
+                # Whole timestamps only, up to max_batch records unless a single one is larger
+                stop = max(g + 1, int(np.searchsorted(groups, groups[g] + self.max_batch, side="right")) - 1)
+                stop = min(stop, due)
+                writer.write(self._frame(groups[g], groups[stop]))
+                await writer.drain()
+                g = stop
+            writer.write(FRAME_HEADER.pack(0))
+            await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    def serve_in_thread(self):
+        """
+        Runs the server on an event loop in a daemon thread.
+
+        Returns:
+            The (host, port) it listens on.
+        """
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="replay-server", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self.host, self.port
+
+    def close(self):
+        """
+        Stops a server started with serve_in_thread().
+        """
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+
+
+class LiveDataHandler(DataHandler):
+    '''
+    The LiveDataHandler consumes a feed of bars over a socket, in the format
+    of the ReplayServer, and offers the same interface as the historic
+    handlers so the same strategies, portfolios and event loop run live.
+
+    An asyncio reader on a background thread receives the frames and decodes
+    each one into arrays in one step; the bars are handed to the event loop's
+    thread through a queue and applied there by update_latest_data(), which
+    waits for the next timestamp. The time from the feed sending a bar to its
+    MarketEvent being posted is recorded in `latency`.
+    '''
+
+    background_readers = True
+
+    def __init__(self, events, host, port, symbol_list=None, max_lookback=1000, alignment="pad",
+                 connect_timeout=10.0, max_pending=1024):
+        '''
+        Connects to a feed and waits for its symbol list.
+
+        Args:
+            events - The event queue
+            host (str) - Address of the feed
+            port (int) - Port of the feed
+            symbol_list (List[str], optional) - Symbols used, by default all of the feed's
+            max_lookback (int, optional) - Number of bars kept for get_latest_data
+            alignment (str, optional) - 'pad' or 'sparse', as for HistoricCSVDataHandler
+            connect_timeout (float, optional) - Seconds to wait for the feed
+            max_pending (int, optional) - Frames received ahead of the event loop
+                before the reader stops reading, pushing back on the feed
+        '''
+        self.events = events
+        self.max_lookback = max_lookback
+        self.alignment = alignment
+        self.resamplers = {}
+        self.indicators = IndicatorRegistry(self)
+        self.continue_backtest = True
+        self.latency = LatencyHistogram()
+
+        self._frames = queue.Queue(maxsize=max_pending)
+        self._header = queue.Queue()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, args=(host, port), name="live-data", daemon=True)
+        self._thread.start()
+        header = self._header.get(timeout=connect_timeout)
+        if isinstance(header, Exception):
+            raise header
+
+        self.feed_symbols = header["symbols"]
+        self.symbol_list = list(symbol_list) if symbol_list is not None else list(self.feed_symbols)
+        missing = [symbol for symbol in self.symbol_list if symbol not in self.feed_symbols]
+        if missing:
+            raise ValueError(f"The feed has no data for {missing}")
+        # Feed symbol index to symbol, None for the ones not used
+        used = set(self.symbol_list)
+        self._symbols = [symbol if symbol in used else None for symbol in self.feed_symbols]
+        self.latest_symbol_data = {
+            symbol: BarBuffer(symbol, capacity=max_lookback) for symbol in self.symbol_list
+        }
+        self._seen = set()
+        self._active = []
+        self._batch = None
+        self._position = 0
+
+    def _run(self, host, port):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._consume(host, port))
+        finally:
+            self._loop.close()
+
+    async def _consume(self, host, port):
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            self._header.put(json.loads(await reader.readline()))
+        except (OSError, ValueError) as e:
+            self._header.put(e)
+            return
+        try:
+            while True:
+                count, = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+                if count == 0:
+                    break
+                records = np.frombuffer(await reader.readexactly(count * RECORD.itemsize), dtype=RECORD)
+                # Blocks this thread (and so the socket) while the event loop is behind
+                self._frames.put(self._decode(records))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            self._frames.put(None)
+
+    @staticmethod
+    def _decode(records):
+        """
+        Turns a frame into Python lists once, as (timestamps, symbol indices,
+        values, send times, start of every timestamp).
+        """
+        datetime = records["datetime"]
+        starts = np.flatnonzero(np.diff(datetime, prepend=datetime[0] - 1) != 0)
+        values = np.column_stack([records[field] for field in FIELDS])
+        return (datetime.tolist(), records["symbol"].tolist(), values.tolist(),
+                records["sent"].tolist(), starts.tolist() + [len(records)])
+
+    def _next_batch(self):
+        # The current frame, waiting for the next one once it is used up
+        while self._batch is None or self._position >= len(self._batch[4]) - 1:
+            if not self.continue_backtest:
+                return None
+            batch = self._frames.get()
+            if batch is None:
+                self.continue_backtest = False
+                return None
+            self._batch, self._position = batch, 0
+        return self._batch
+
+    def next_timestamp(self):
+        '''
+        Returns the timestamp of the next bars, waiting for them to arrive,
+        or None once the feed has ended.
+        '''
+        batch = self._next_batch()
+        return None if batch is None else batch[0][batch[4][self._position]]
+
+    def get_latest_data(self, symbol, N=1, timeframe=None):
+        """
+        Returns the last N bars received for a symbol (at most max_lookback).
+
+        Returns:
+            A BarWindow of zero-copy NumPy views, one per field.
+        """
+        if timeframe is not None:
+            return self.resamplers[timeframe].get_latest_data(symbol, N)
+        try:
+            return self.latest_symbol_data[symbol].latest(N)
+        except KeyError:
+            print (f"{symbol} is not available in the live data set.")
+
+    def update_latest_data(self):
+        """
+        Applies the bars of the next timestamp, waiting for them to arrive,
+        and posts their MarketEvent.
+        """
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                self.events.put(self._market_event())
+                return
+            datetime, symbols, values, sent, starts = batch
+            start, stop = starts[self._position], starts[self._position + 1]
+            self._position += 1
+            timestamp = datetime[start]
+            updated = []
+            for i in range(start, stop):
+                symbol = self._symbols[symbols[i]]
+                if symbol is None:
+                    continue
+                self.latest_symbol_data[symbol].append(timestamp, values[i])
+                if self.resamplers or self.indicators:
+                    self._update_derived(symbol, timestamp, values[i])
+                updated.append(symbol)
+            # Timestamps with none of the symbols used are skipped
+            if updated:
+                break
+        if self.alignment == "sparse":
+            listed = updated
+        else:
+            if len(self._seen) != len(self.symbol_list):
+                self._seen.update(updated)
+                self._active = [symbol for symbol in self.symbol_list if symbol in self._seen]
+            listed = self._active
+        self.events.put(self._market_event(np.datetime64(timestamp, "ns"), listed))
+        self.latency.record(max(time.time_ns() - sent[start], 0))
+
+    def close(self):
+        """
+        Disconnects from the feed.
+        """
+        self.continue_backtest = False
+        if self._loop.is_running():
+            for task in asyncio.all_tasks(self._loop):
+                self._loop.call_soon_threadsafe(task.cancel)
+        # Unblock the reader if it is waiting for room in the queue
+        while self._thread.is_alive():
+            try:
+                self._frames.get_nowait()
+            except queue.Empty:
+                pass
+            self._thread.join(0.01)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replays historic CSV files as a live feed.")
+    parser.add_argument("--csv-dir", default="data/")
+    parser.add_argument("--symbols", nargs="+", default=["BTC-USD"])
+    parser.add_argument("--speed", type=float, default=None,
+                        help="Multiple of real time, unpaced if not given")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9999)
+    args = parser.parse_args()
+
+    server = ReplayServer(args.csv_dir, args.symbols, speed=args.speed, host=args.host, port=args.port)
+
+    async def serve():
+        await server.start()
+        print(f"Replaying {len(server.records):,} bars of {args.symbols} on {server.host}:{server.port}")
+        await server._server.serve_forever()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,146 @@
 import time
-import queue
 
-from datetime import datetime
-from event import MarketEvent, SignalEvent, OrderEvent, FillEvent
-from data import HistoricCSVDataHandler
-from strategy import BuyAndHoldStrategy
-from portfolio import NaivePortfolio
-from execution import SimulatedExecutionHandler
+import pandas as pd
+
+from backtester.bus import DequeEventBus, TimedEventBus, default_dispatcher
+from backtester.checkpoint import load_checkpoint
+from backtester.data import HistoricCSVDataHandler
+from backtester.strategy import BuyAndHoldStrategy
+from backtester.portfolio import NaivePortfolio
+from backtester.execution import SimulatedExecutionHandler
+
+def backtest(events, data, portfolio, strategy, broker, dispatcher=None, checkpoint=None, until=None,
+             instrumentation=None):
+    """
+    Runs the event loop: each bar is pushed by the data handler and every
+    event it causes is dispatched until the bus is empty, then the next bar.
+
+    Args:
+        events (EventBus) - The bus shared by all the components
+        data (DataHandler) - The data handler
+        portfolio (Portfolio) - The portfolio
+        strategy (Strategy) - The strategy
+        broker (ExecutionHandler) - The execution handler
+        dispatcher (Dispatcher, optional) - Routing of events to handlers, by
+            default the standard routing from default_dispatcher()
+        checkpoint (Checkpointer, optional) - Snapshots the run periodically
+            so it can be continued with resume_backtest()
+        until (optional) - Stop before the first bar after this timestamp,
+            leaving every component as it is so a later call carries on
+        instrumentation (Instrumentation, optional) - Records counts and timings
+            of the events, handlers and data updates
+
+    Returns:
+        The summary statistics of the portfolio, or None if stopped by until.
+    """
+    if dispatcher is None:
+        dispatcher = default_dispatcher(strategy, portfolio, broker)
+    dispatch = dispatcher.dispatch
+    update = data.update_latest_data
+    if instrumentation is not None:
+        dispatch = instrumentation.instrument_dispatch(dispatcher, events)
+        update = instrumentation.timed(type(data).__name__ + ".update_latest_data", update, "data")
+    get = events.get
+    pool = data.market_pool
+    if checkpoint is not None:
+        checkpoint.attach(events, data, portfolio, strategy, broker)
+    if until is not None:
+        until = pd.Timestamp(until).value
+
+    if isinstance(events, TimedEventBus):
+        finished = _run_timed(events, data, update, dispatch, pool, checkpoint, until)
+        if checkpoint is not None:
+            checkpoint.close()
+        if not finished:
+            return None
+        portfolio.create_equity_curve_dataframe()
+        return portfolio.output_summary_stats()
 
-def backtest(events, data, portfolio, strategy, broker):
     while True:
-        data.update_bars()
+        if until is not None:
+            next_bar = data.next_timestamp()
+            if next_bar is not None and next_bar > until:
+                if checkpoint is not None:
+                    checkpoint.close()
+                return None
+        update()
         if data.continue_backtest == False:
             break
-            
-        while True:
-            try:
-                event = events.get(block=False)
-            except queue.Empty:
-                break
-            
-            if event is not None:
-                if event.type == "MARKET":
-                    strategy.calculate_signals(event)
-                    portfolio.update_timeindex(event)
-                elif event.type == "SIGNAL":
-                    portfolio.update_signal(event)
-                elif event.type == "ORDER":
-                    broker.execute_order(event)
-                elif event.type == "FILL":
-                    portfolio.update_fill(event)
-                    
-    stats = portfolio.output_summary_stats()
-    
+
+        event = get()
+        while event is not None:
+            dispatch(event)
+            if pool is not None:
+                pool.release(event)
+            event = get()
+        if checkpoint is not None:
+            checkpoint.tick()
+
+    if checkpoint is not None:
+        checkpoint.close()
+    portfolio.create_equity_curve_dataframe()
+    return portfolio.output_summary_stats()
+
+def resume_backtest(path, data, checkpoint=None):
+    """
+    Continues a backtest from the last snapshot a Checkpointer wrote to path,
+    with the same results as if it had never stopped.
+
+    Args:
+        path (str) - The Checkpointer directory
+        data (DataHandler) - A fresh handler over the same market data
+        checkpoint (Checkpointer, optional) - Keeps snapshotting the resumed run,
+            usually into the same directory
+
+    Returns:
+        The summary statistics and the restored portfolio.
+    """
+    state = load_checkpoint(path, data)
+    if checkpoint is not None and checkpoint.path == path:
+        checkpoint.resumed = state["journal"]
+    stats = backtest(state["events"], data, state["portfolio"], state["strategy"], state["broker"],
+                     checkpoint=checkpoint)
+    return stats, state["portfolio"]
+
+def _run_timed(events, data, update, dispatch, pool, checkpoint=None, until=None):
+    """
+    The event loop for a TimedEventBus. Bars and scheduled events are merged in
+    simulated time order: before each bar is pushed every event due at or
+    before its timestamp is delivered, so latencies shorter than a bar land
+    between bars. Once the data is exhausted the remaining events are drained.
+
+    Returns False if it stopped at `until` (events due by then are delivered,
+    later ones stay scheduled), True once the data and events are exhausted.
+    """
+    while True:
+        next_bar = data.next_timestamp()
+        stop = until is not None and next_bar is not None and next_bar > until
+        if stop:
+            next_bar = until
+        event = events.get(until=next_bar)
+        while event is not None:
+            dispatch(event)
+            if pool is not None:
+                pool.release(event)
+            event = events.get(until=next_bar)
+        if stop:
+            return False
+        if next_bar is None:
+            return True
+        if checkpoint is not None:
+            checkpoint.tick()
+        events.advance(next_bar)
+        update()
+
+if __name__ == "__main__":
+    events = DequeEventBus()
+    data = HistoricCSVDataHandler(events, 'data/', ['BTC-USD'])
+    portfolio = NaivePortfolio(data, events, '', initial_capital=100000.0)
+    strategy = BuyAndHoldStrategy(data, events)
+    broker = SimulatedExecutionHandler(events)
+
+    start = time.perf_counter()
+    stats = backtest(events, data, portfolio, strategy, broker)
     for stat in stats:
-        print(stat[0] + ": " stat[1])
-        
-events = queue.Queue()
-data = HistoricCSVDataHandler(events, 'csv/', ['OMXS30'], DataSource.NASDAQ)
-portfolio = NaivePortfolio(data, events, '', initial_capital=2000)
-strategy = MovingAveragesLongStrategy(data, events, portfolio, 50, 100, version=1)
-portfolio.strategy_name = strategy.name
-broker = SimulateExecutionHandler(events)
-
-backtest(events, data, portfolio, strategy, broker)
-    
-            
\ No newline at end of file
+        print(stat[0] + ": " + stat[1])
+    print(f"Backtest took {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,375 @@
+import heapq
+import itertools
+from collections import deque
+
+import numpy as np
+
+from backtester.bus import Dispatcher, default_dispatcher
+from backtester.event import FillEvent, MarketEvent, OrderCancelEvent, OrderEvent
+from backtester.execution import ExecutionHandler
+
+
+class Order(object):
+    """
+    An order held by a MatchingExecutionHandler: the OrderEvent it came from
+    and the quantity still to fill. Once resting at a price it also has its
+    PriceLevel, the quantity it rested with and its place in the exchange's
+    queue there, as the volume traded at the price before it starts to fill.
+    """
+
+    __slots__ = ("event", "side", "price", "stop_price", "remaining", "sequence", "level", "rested", "mark")
+
+    def __init__(self, event, sequence):
+        self.event = event
+        self.side = 1 if event.direction == 'BUY' else -1
+        self.price = event.price
+        self.stop_price = event.stop_price
+        self.remaining = event.quantity
+        self.sequence = sequence
+        self.level = None
+        self.rested = 0
+        self.mark = 0.0
+
+
+class PriceLevel(object):
+    """
+    The orders resting at one price, first in first out, with the volume
+    estimated to have traded at the price since the level was opened and the
+    end of the queue behind our last order.
+    """
+
+    __slots__ = ("price", "orders", "quantity", "traded", "tail")
+
+    def __init__(self, price):
+        self.price = price
+        self.orders = deque()
+        self.quantity = 0
+        self.traded = 0.0
+        self.tail = 0.0
+
+
+class OrderBook(object):
+    """
+    The resting orders of one symbol with price-time priority.
+
+    Each side is a dict of PriceLevels and a heap of their prices (negated for
+    the bids) so the best price is found in O(1) and a level is removed in
+    O(log n) once filled. Stop orders wait in heaps keyed by their trigger
+    price. Cancelled orders and emptied levels are dropped lazily when they
+    reach the top, so cancelling is O(1).
+    """
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.levels = {1: {}, -1: {}}
+        self._heaps = {1: [], -1: []}
+        self._stops = {1: [], -1: []}
+
+    def add(self, order, queue=0.0):
+        """
+        Rests a limit order at the back of the queue at its price.
+
+        Args:
+            order (Order) - The order
+            queue (float, optional) - Volume queued ahead of it on the exchange,
+                besides our own orders at the price
+        """
+        levels = self.levels[order.side]
+        level = levels.get(order.price)
+        if level is None:
+            level = levels[order.price] = PriceLevel(order.price)
+            heapq.heappush(self._heaps[order.side], -order.side * order.price)
+        order.level = level
+        order.rested = order.remaining
+        order.mark = max(level.traded + queue, level.tail)
+        level.tail = order.mark + order.remaining
+        level.orders.append(order)
+        level.quantity += order.remaining
+
+    def add_stop(self, order):
+        """
+        Holds a stop order until its trigger price is traded.
+        """
+        heapq.heappush(self._stops[order.side], (order.side * order.stop_price, order.sequence, order))
+
+    def best(self, side):
+        """
+        Returns the best PriceLevel of a side, 1 for bids and -1 for offers,
+        or None if the side is empty.
+        """
+        heap = self._heaps[side]
+        levels = self.levels[side]
+        while heap:
+            price = -side * heap[0]
+            level = levels.get(price)
+            if level is not None and level.quantity > 0:
+                return level
+            heapq.heappop(heap)
+            levels.pop(price, None)
+        return None
+
+    def remove_best(self, side):
+        """
+        Removes the best level of a side once it has been filled.
+        """
+        price = -side * heapq.heappop(self._heaps[side])
+        del self.levels[side][price]
+
+    def triggered_stops(self, side, price):
+        """
+        Pops the stops of a side triggered by a traded price: buy stops at or
+        below it, sell stops at or above it.
+        """
+        heap = self._stops[side]
+        triggered = []
+        while heap and (heap[0][2].remaining <= 0 or side * price >= heap[0][0]):
+            order = heapq.heappop(heap)[2]
+            if order.remaining > 0:
+                triggered.append(order)
+        return triggered
+
+    def __len__(self):
+        return sum(level.quantity > 0 for levels in self.levels.values() for level in levels.values())
+
+
+class MatchingExecutionHandler(ExecutionHandler):
+    """
+    A simulated exchange that matches market, limit and stop orders against
+    the bars of the data handler, with partial fills, an estimate of the
+    queue ahead of each resting order and a cap on the volume filled per bar.
+
+    Orders are executed at once where they can be, at the latest close:
+    market orders, limit orders that are marketable and stops already
+    triggered. The rest waits in the symbol's OrderBook and is matched on
+    each later bar, before the strategy sees it (see matching_dispatcher):
+
+        - market orders left over fill at the open,
+        - stops are triggered by the high (buys) or the low (sells), filling
+          at the stop price or the open if it gapped through, or becoming
+          limit orders when they have a limit price,
+        - resting limits fill best price first and in time order within a
+          price. A bar trading through a price fills every order at it, at
+          the price or the open if better. A bar only touching a price
+          trades touch_fraction of its volume there, which first works off
+          the queue ahead of each order.
+
+    The fills of a symbol in one bar never exceed participation of its
+    volume, partly filled orders keep their place. Fills carry their price
+    as fill_cost. A bar costs O(1) per symbol when nothing crosses and
+    O(log n) per price level crossed.
+    """
+
+    def __init__(self, events, data, participation=0.1, queue_fraction=0.0, touch_fraction=0.05,
+                 exchange="SIM"):
+        """
+        Initialises the handler
+
+        Args:
+            events (obj) - The Event Queue object.
+            data (DataHandler) - The bars orders are matched against
+            participation (float, optional) - Largest share of a bar's volume
+                filled per symbol, None for no cap
+            queue_fraction (float, optional) - The queue ahead of a new limit
+                order, as a share of the last bar's volume, on top of any of
+                our own orders already at its price
+            touch_fraction (float, optional) - Share of a bar's volume traded at
+                its high or low
+            exchange (str, optional) - Exchange named in the fills
+        """
+        self.events = events
+        self.data = data
+        self.participation = participation
+        self.queue_fraction = queue_fraction
+        self.touch_fraction = touch_fraction
+        self.exchange = exchange
+        self.books = {}
+        self.orders = {}
+        self._market = {}
+        self._available = {}
+        self._last_bar = {}
+        self._sequence = itertools.count()
+
+    def book(self, symbol):
+        book = self.books.get(symbol)
+        if book is None:
+            book = self.books[symbol] = OrderBook(symbol)
+            self._market[symbol] = deque()
+        return book
+
+    def _bar(self, symbol):
+        bars = self.data.get_latest_data(symbol)
+        if bars is None or len(bars) == 0:
+            return None
+        return (bars.datetime[-1], bars.open[-1], bars.high[-1], bars.low[-1], bars.close[-1],
+                bars.volume[-1])
+
+    def _fill(self, order, quantity, price, timestamp):
+        quantity = min(quantity, order.remaining, self._available.get(order.event.symbol, 0.0))
+        quantity = int(quantity)
+        if quantity <= 0:
+            return 0
+        order.remaining -= quantity
+        self._available[order.event.symbol] -= quantity
+        if order.remaining == 0:
+            self.orders.pop(id(order.event), None)
+        self.events.put(FillEvent(np.datetime64(int(timestamp), "ns"), order.event.symbol, self.exchange,
+                                  quantity, order.event.direction, float(price)))
+        return quantity
+
+    def execute_order(self, event):
+        """
+        Executes what it can of an OrderEvent at the latest close and rests
+        the remainder.
+        """
+        if not isinstance(event, OrderEvent):
+            return
+        if event.order_type not in ('MKT', 'LMT', 'STP'):
+            raise ValueError(f"Unknown order type {event.order_type!r}")
+        symbol = event.symbol
+        book = self.book(symbol)
+        order = Order(event, next(self._sequence))
+        self.orders[id(event)] = order
+        bar = self._bar(symbol)
+        if symbol not in self._available and bar is not None:
+            self._available[symbol] = self._cap(bar[5])
+
+        if event.order_type == 'STP':
+            if bar is not None and order.side * (bar[4] - order.stop_price) >= 0:
+                self._trigger(book, order, bar, bar[4], immediate=True)
+            else:
+                book.add_stop(order)
+            return
+        if event.order_type == 'MKT':
+            if bar is not None:
+                self._fill(order, order.remaining, bar[4], bar[0])
+            if order.remaining > 0:
+                self._market[symbol].append(order)
+            return
+        self._place_limit(book, order, bar)
+
+    def _place_limit(self, book, order, bar):
+        # Marketable limits fill at the close first, the rest joins the queue
+        if bar is not None and order.side * (order.price - bar[4]) >= 0:
+            self._fill(order, order.remaining, bar[4], bar[0])
+        if order.remaining > 0:
+            book.add(order, self.queue_fraction * (bar[5] if bar is not None else 0.0))
+
+    def _trigger(self, book, order, bar, price, immediate=False):
+        if order.price is None:
+            # A stop market order fills at the stop, or past it if the price gapped
+            fill_price = price if immediate else order.side * max(order.side * order.stop_price,
+                                                                  order.side * bar[1])
+            self._fill(order, order.remaining, fill_price, bar[0])
+            if order.remaining > 0:
+                self._market[order.event.symbol].append(order)
+        else:
+            self._place_limit(book, order, bar if immediate else None)
+
+    def cancel(self, event):
+        """
+        Cancels what is left of an order and puts an OrderCancelEvent for it.
+
+        Returns:
+            The quantity cancelled.
+        """
+        order = self.orders.pop(id(event), None)
+        if order is None:
+            return 0
+        remaining = order.remaining
+        if order.level is not None:
+            # Left in its queue, it is skipped once it reaches the front
+            order.level.quantity -= remaining
+        order.remaining = 0
+        bar = self._bar(event.symbol)
+        self.events.put(OrderCancelEvent(np.datetime64(int(bar[0]), "ns") if bar is not None else None,
+                                         event, remaining))
+        return remaining
+
+    def queue_position(self, event):
+        """
+        Returns the estimated volume ahead of a resting limit order, or None if
+        it is not resting.
+        """
+        order = self.orders.get(id(event))
+        if order is None or order.level is None:
+            return None
+        return max(order.mark - order.level.traded, 0.0)
+
+    def _cap(self, volume):
+        return float("inf") if self.participation is None else self.participation * volume
+
+    def on_market(self, event):
+        """
+        Matches the resting orders of every symbol with a new bar.
+        """
+        if not isinstance(event, MarketEvent):
+            return
+        for symbol in event.symbols if event.symbols is not None else self.data.symbol_list:
+            bar = self._bar(symbol)
+            if bar is None or self._last_bar.get(symbol) == bar[0]:
+                # Padded symbols repeat their last bar
+                continue
+            self._last_bar[symbol] = bar[0]
+            self._available[symbol] = self._cap(bar[5])
+            if symbol in self.books:
+                self._match(self.books[symbol], bar)
+
+    def _match(self, book, bar):
+        timestamp, open_, high, low, close, volume = bar
+        symbol = book.symbol
+        market = self._market[symbol]
+        while market and self._available[symbol] >= 1:
+            order = market[0]
+            if order.remaining > 0:
+                self._fill(order, order.remaining, open_, timestamp)
+            if order.remaining > 0:
+                break
+            market.popleft()
+
+        for side, extreme in ((1, high), (-1, low)):
+            for order in book.triggered_stops(side, extreme):
+                self._trigger(book, order, bar, extreme)
+
+        for side, extreme in ((1, low), (-1, high)):
+            while self._available[symbol] >= 1:
+                level = book.best(side)
+                if level is None or side * (level.price - extreme) < 0:
+                    break
+                through = level.price != extreme
+                price = level.price if side * (level.price - open_) <= 0 else open_
+                self._match_level(level, through, price, volume, timestamp)
+                if level.quantity > 0:
+                    break
+                book.remove_best(side)
+
+    def _match_level(self, level, through, price, volume, timestamp):
+        # Trading through the price clears the whole queue, a touch trades
+        # part of the bar's volume there. Orders fill front to back while the
+        # volume traded reaches them; their marks only grow towards the back.
+        level.traded = max(level.traded, level.tail) if through else level.traded + self.touch_fraction * volume
+        orders = level.orders
+        while orders:
+            order = orders[0]
+            if order.remaining > 0:
+                reached = level.traded - order.mark - (order.rested - order.remaining)
+                if reached < 1:
+                    break
+                level.quantity -= self._fill(order, reached, price, timestamp)
+                if order.remaining > 0:
+                    break
+            order.level = None
+            orders.popleft()
+
+
+def matching_dispatcher(strategy, portfolio, broker):
+    """
+    Returns the standard routing of default_dispatcher with each MarketEvent
+    first sent to a MatchingExecutionHandler, so resting orders are matched
+    with a bar before the strategy and portfolio see it.
+    """
+    dispatcher = Dispatcher()
+    dispatcher.subscribe(MarketEvent, broker.on_market)
+    for event_class, handlers in default_dispatcher(strategy, portfolio, broker).handlers.items():
+        for handler in handlers:
+            dispatcher.subscribe(event_class, handler)
+    return dispatcher
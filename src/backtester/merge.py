@@ -0,0 +1,70 @@
+import heapq
+
+
+class TimeMerger(object):
+    """
+    Incremental k-way merge of per-symbol streams into global timestamp order.
+
+    A heap holds one cursor per symbol keyed by the timestamp of its next item,
+    so each step costs O(log k) for k symbols and no union index is ever built.
+    Iterating yields (timestamp, updates) where updates is the list of
+    (symbol, item) pairs that share that timestamp, in symbol_list order.
+
+    Two semantics are available:
+        - 'sparse' only reports the symbols that have a new item.
+        - 'pad' additionally keeps `latest`, a snapshot of the most recent item
+          of every symbol seen so far, padded forward lazily (only the updated
+          entries are touched at each step).
+    """
+
+    MODES = ("sparse", "pad")
+
+    def __init__(self, streams, mode="pad"):
+        """
+        Initialises the merger.
+
+        Args:
+            streams (dict) - Mapping of symbol to an iterable of (timestamp, item)
+                pairs in non-decreasing timestamp order. Insertion order breaks ties.
+            mode (str, optional) - 'sparse' or 'pad'.
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"mode must be one of {self.MODES}, not {mode!r}")
+        self.mode = mode
+        self.latest = {}
+        self._heap = []
+        for order, (symbol, stream) in enumerate(streams.items()):
+            iterator = iter(stream)
+            self._push(order, symbol, iterator)
+
+    def _push(self, order, symbol, iterator):
+        for timestamp, item in iterator:
+            heapq.heappush(self._heap, (timestamp, order, symbol, item, iterator))
+            return
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        heap = self._heap
+        if not heap:
+            raise StopIteration
+        timestamp = heap[0][0]
+        updates = []
+        while heap and heap[0][0] == timestamp:
+            _, order, symbol, item, iterator = heap[0]
+            updates.append((symbol, item))
+            for next_timestamp, next_item in iterator:
+                heapq.heapreplace(heap, (next_timestamp, order, symbol, next_item, iterator))
+                break
+            else:
+                heapq.heappop(heap)
+        if self.mode == "pad":
+            self.latest.update(updates)
+        return timestamp, updates
+
+    def peek(self):
+        """
+        Returns the timestamp of the next step, or None when all streams are exhausted.
+        """
+        return self._heap[0][0] if self._heap else None
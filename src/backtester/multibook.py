@@ -0,0 +1,148 @@
+from backtester.bus import DequeEventBus, default_dispatcher
+from backtester.execution import SimulatedExecutionHandler
+from backtester.portfolio import NaivePortfolio
+
+
+class Book(object):
+    """
+    One strategy, portfolio and execution handler with their own event bus
+    and routing, run side by side with other books on a shared data feed.
+    Signals, orders and fills never leave the book's bus.
+    """
+
+    def __init__(self, name, events, portfolio, strategy, broker, dispatcher=None):
+        """
+        Args:
+            name - The key of the book's results
+            events (EventBus) - The book's own bus, the one its components put to
+            portfolio, strategy, broker - The components, see backtest()
+            dispatcher (Dispatcher, optional) - Routing within the book, by
+                default the standard routing from default_dispatcher()
+        """
+        if hasattr(events, "schedule"):
+            raise ValueError("Books are run on plain event buses, not a TimedEventBus")
+        self.name = name
+        self.events = events
+        self.portfolio = portfolio
+        self.strategy = strategy
+        self.broker = broker
+        self.dispatcher = dispatcher or default_dispatcher(strategy, portfolio, broker)
+
+    def handle(self, event):
+        """
+        Dispatches an event from the feed and then every event it causes in
+        the book, as the backtest loop does for a bar.
+        """
+        dispatch = self.dispatcher.dispatch
+        get = self.events.get
+        dispatch(event)
+        event = get()
+        while event is not None:
+            dispatch(event)
+            event = get()
+
+
+class MultiBookBacktest(object):
+    """
+    Runs many books over one data handler in a single pass. The handler
+    advances once per bar and each MarketEvent is handed to every book in
+    turn, so reading and merging the data, and updating the indicators of its
+    shared IndicatorRegistry, is paid once however many books are attached.
+    Each book sees the same bars and events as in a backtest() of its own and
+    ends with the same results.
+
+    The books share the handler's bar views, and the handler's columns are
+    made read-only for the run, so a book cannot change the data the others
+    see.
+    """
+
+    def __init__(self, data):
+        """
+        Args:
+            data (DataHandler) - The shared handler; its own bus carries only
+                MarketEvents, a DequeEventBus is set if it has none
+        """
+        self.data = data
+        if data.events is None:
+            data.events = DequeEventBus()
+        self.books = {}
+
+    def add(self, book):
+        """
+        Attaches a Book built by the caller.
+        """
+        if book.name in self.books:
+            raise ValueError(f"A book named {book.name!r} is already attached")
+        self.books[book.name] = book
+        return book
+
+    def add_book(self, name, strategy_class, strategy_params=None, portfolio_class=NaivePortfolio,
+                 portfolio_params=None, broker_class=SimulatedExecutionHandler, broker_params=None):
+        """
+        Builds a Book on a new DequeEventBus and attaches it.
+
+        Args:
+            name - The key of the book's results
+            strategy_class (type) - Strategy class taking (data, events, **strategy_params)
+            portfolio_class (type, optional) - Portfolio class taking
+                (data, events, start_date, **portfolio_params)
+            broker_class (type, optional) - ExecutionHandler class taking (events, **broker_params)
+
+        Returns:
+            The Book.
+        """
+        events = DequeEventBus()
+        portfolio = portfolio_class(self.data, events, None, **(portfolio_params or {}))
+        strategy = strategy_class(self.data, events, **(strategy_params or {}))
+        broker = broker_class(events, **(broker_params or {}))
+        return self.add(Book(name, events, portfolio, strategy, broker))
+
+    def run(self):
+        """
+        Runs every book to the end of the data.
+
+        Returns:
+            The summary statistics of each book's portfolio, by name.
+        """
+        data = self.data
+        books = list(self.books.values())
+        get = data.events.get
+        pool = data.market_pool
+        frozen = _freeze(data)
+        try:
+            while True:
+                data.update_latest_data()
+                if data.continue_backtest == False:
+                    break
+                event = get()
+                while event is not None:
+                    for book in books:
+                        book.handle(event)
+                    if pool is not None:
+                        pool.release(event)
+                    event = get()
+        finally:
+            for array in frozen:
+                array.flags.writeable = True
+
+        stats = {}
+        for book in books:
+            book.portfolio.create_equity_curve_dataframe()
+            stats[book.name] = book.portfolio.output_summary_stats()
+        return stats
+
+
+def _freeze(data):
+    """
+    Makes the writable columns of a handler's loaded bars read-only.
+
+    Returns:
+        The arrays changed, to be made writable again.
+    """
+    frozen = []
+    for bars in getattr(data, "symbol_data", {}).values():
+        for array in [bars.datetime] + list(bars.columns.values()):
+            if array.flags.writeable:
+                array.flags.writeable = False
+                frozen.append(array)
+    return frozen
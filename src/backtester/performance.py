@@ -13,10 +13,10 @@ def create_sharpe_ratio(returns, N=252):
     Args:
         return (pd.series) - A pandas Series that represents the 
             period percentage returns.
-        periods (float) -  Daily (252), Hourly (252*6.5), 
+        N (float) -  Daily (252), Hourly (252*6.5), 
             Minutely (252*6.5*60) etc.
     """
-    return np.sqrt(periods) * (np.mean(returns)) / np.std(returns)
+    return np.sqrt(N) * (np.mean(returns)) / np.std(returns)
     
 def create_drawdowns(equity_curve):
     """
@@ -30,15 +30,214 @@ def create_drawdowns(equity_curve):
         drawdown (float) - Maximum peak-to-trough drawdown
         duration (float) - Duration of the drawdown
     """
-    high_water_mark = [0]
-    eq_idx = equity_curve.index
-    drawdown = pd.series(index = eq_idx, dtype=float)
-    duration = pd.series(index = eq_idx, dtype=float)
-    
-    for t in range(1, len(eq_idx)):
-        current_high_water_mark = max(high_water_mark[t-1], equity_curve[t])
-        high_water_mark.append(current_high_water_mark)
-        drawdown[t] = high_water_mark[t] - equity_curve[t]
-        duration[t] = 0 if drawdown[t] == 0 else duration[t-1] + 1
-    return drawndown.max(), duration.max()
-    
\ No newline at end of file
+    values = np.array(equity_curve, dtype=np.float64)
+    if len(values) == 0:
+        return np.nan, np.nan
+    # The first bar has no return and is left out, missing values are skipped
+    values[0] = 0.0
+    _, drawdown, duration = _drawdown_paths(values[np.newaxis])
+    return np.fmax.reduce(drawdown[0]), duration[0].max()
+    
+def create_summary_metrics(equity_curve, N=252):
+    """
+    Calculate the summary statistics of an equity curve DataFrame (as built by
+    NaivePortfolio.create_equity_curve_dataframe) as plain floats, e.g. to
+    compare or store the results of many backtests.
+    
+    Args:
+        equity_curve (pd.DataFrame) - With 'returns' and 'equity_curve' columns.
+        N (float) - Number of periods per year, see create_sharpe_ratio.
+    Returns:
+        A dict of total_return, sharpe_ratio, max_drawdown and drawdown_duration.
+    """
+    max_dd, dd_duration = create_drawdowns(equity_curve["equity_curve"])
+    return {
+        "total_return": float(equity_curve["equity_curve"].iloc[-1] - 1.0),
+        "sharpe_ratio": float(create_sharpe_ratio(equity_curve["returns"], N)),
+        "max_drawdown": float(max_dd),
+        "drawdown_duration": float(dd_duration),
+    }
+
+def create_batch_sharpe_ratios(returns, N=252):
+    """
+    Calculate the annualised Sharpe ratio of many returns streams at once,
+    as create_sharpe_ratio does for one.
+    
+    Args:
+        returns (np.ndarray) - A (runs x periods) array of period returns.
+        N (float) - Number of periods per year, see create_sharpe_ratio.
+    Returns:
+        A float array with the Sharpe ratio of every run.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.sqrt(N) * returns.mean(axis=1) / returns.std(axis=1)
+    
+def create_batch_drawdowns(equity_curves):
+    """
+    Calculate the maximum drawdown and its duration of many equity curves at
+    once, with the same definition as create_drawdowns: the high water mark
+    starts at zero and the duration is the longest run of bars under it.
+    
+    Args:
+        equity_curves (np.ndarray) - A (runs x periods) array of equity curves.
+    Returns:
+        drawdown (np.ndarray) - Maximum peak-to-trough drawdown of every run
+        duration (np.ndarray) - Duration of the drawdown of every run
+    """
+    equity_curves = np.asarray(equity_curves, dtype=np.float64)
+    if equity_curves.shape[1] == 0:
+        zeros = np.zeros(len(equity_curves))
+        return zeros, zeros
+    _, drawdown, duration = _drawdown_paths(equity_curves)
+    return np.fmax.reduce(drawdown, axis=1), duration.max(axis=1)
+
+def _drawdown_paths(equity_curves):
+    """
+    The high water mark, drawdown and drawdown duration at every bar of a
+    (runs x periods) array of equity curves, with the high water mark starting
+    at zero. Missing values leave the high water mark unchanged and count as
+    bars under it.
+    """
+    high_water_mark = np.fmax.accumulate(np.fmax(equity_curves, 0.0), axis=1)
+    drawdown = high_water_mark - equity_curves
+    # Bars since the last bar at the high water mark
+    index = np.arange(equity_curves.shape[1])
+    last_high = np.maximum.accumulate(np.where(drawdown == 0, index, -1), axis=1)
+    return high_water_mark, drawdown, (index - last_high).astype(np.float64)
+
+# Metrics of OnlineMetrics and create_metrics
+ONLINE_METRICS = ("total_return", "sharpe_ratio", "sortino_ratio", "high_water_mark", "drawdown",
+                  "max_drawdown", "drawdown_duration", "max_drawdown_duration", "exposure", "turnover")
+
+class OnlineMetrics(object):
+    """
+    Performance metrics of a running backtest or live portfolio, updated in
+    O(1) per bar so they can be read at any time:
+
+        - the total return and the equity curve, compounded from the period
+          returns exactly as NaivePortfolio.create_equity_curve_dataframe does,
+        - the annualised Sharpe and Sortino ratios, from Welford's running
+          mean and variance of the returns and their running downside moment,
+        - the high water mark, the current and maximum drawdown and their
+          durations in bars, as create_drawdowns defines them,
+        - the mean gross exposure and the annualised turnover, both relative
+          to the equity of each bar.
+
+    create_metrics computes the same from the whole history at once.
+    """
+
+    def __init__(self, N=252):
+        """
+        Args:
+            N (float, optional) - Number of periods per year, see create_sharpe_ratio
+        """
+        self.N = N
+        self.count = 0
+        self.equity = None
+        self.equity_curve = np.nan
+        self.mean = 0.0
+        self._m2 = 0.0
+        self._downside = 0.0
+        self.high_water_mark = 0.0
+        self.drawdown = 0.0
+        self.max_drawdown = 0.0
+        self.drawdown_duration = 0
+        self.max_drawdown_duration = 0
+        self._exposure = 0.0
+        self._turnover = 0.0
+
+    def update(self, equity, gross=0.0, traded=0.0):
+        """
+        Adds a bar. The first call only sets the starting equity.
+
+        Args:
+            equity (float) - The total value of the portfolio
+            gross (float, optional) - The gross market value of its positions
+            traded (float, optional) - The notional traded since the last bar
+        """
+        previous = self.equity
+        self.equity = equity
+        if previous is None:
+            return
+        r = equity / previous - 1.0
+        self.count += 1
+        delta = r - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (r - self.mean)
+        if r < 0.0:
+            self._downside += r * r
+        self.equity_curve = 1.0 + r if self.count == 1 else self.equity_curve * (1.0 + r)
+
+        self.high_water_mark = max(self.high_water_mark, self.equity_curve)
+        self.drawdown = self.high_water_mark - self.equity_curve
+        self.max_drawdown = max(self.max_drawdown, self.drawdown)
+        self.drawdown_duration = 0 if self.drawdown == 0 else self.drawdown_duration + 1
+        self.max_drawdown_duration = max(self.max_drawdown_duration, self.drawdown_duration)
+        self._exposure += gross / equity
+        self._turnover += traded / equity
+
+    @property
+    def total_return(self):
+        return self.equity_curve - 1.0 if self.count else 0.0
+
+    @property
+    def sharpe_ratio(self):
+        std = np.sqrt(self._m2 / self.count) if self.count else 0.0
+        return np.sqrt(self.N) * self.mean / std if std > 0.0 else np.nan
+
+    @property
+    def sortino_ratio(self):
+        downside = np.sqrt(self._downside / self.count) if self.count else 0.0
+        return np.sqrt(self.N) * self.mean / downside if downside > 0.0 else np.nan
+
+    @property
+    def exposure(self):
+        return self._exposure / self.count if self.count else 0.0
+
+    @property
+    def turnover(self):
+        return self._turnover / self.count * self.N if self.count else 0.0
+
+    def to_dict(self):
+        """
+        Returns the current value of every metric in ONLINE_METRICS as a float.
+        """
+        return {name: float(getattr(self, name)) for name in ONLINE_METRICS}
+
+def create_metrics(equity, gross=None, traded=None, N=252):
+    """
+    Calculate the metrics of OnlineMetrics from a whole history at once.
+
+    Args:
+        equity (np.ndarray) - The total value of the portfolio at every bar,
+            starting with the initial capital
+        gross (np.ndarray, optional) - The gross market value at every bar
+        traded (np.ndarray, optional) - The notional traded before every bar
+        N (float) - Number of periods per year, see create_sharpe_ratio.
+    Returns:
+        A dict of floats keyed by ONLINE_METRICS.
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    if len(equity) < 2:
+        return OnlineMetrics(N).to_dict()
+    returns = equity[1:] / equity[:-1] - 1.0
+    equity_curve = np.cumprod(1.0 + returns)
+    high_water_mark, drawdown, duration = _drawdown_paths(equity_curve[np.newaxis])
+    mean = returns.mean()
+    std = returns.std()
+    downside = np.sqrt(np.mean(np.minimum(returns, 0.0) ** 2))
+    ratio = lambda x: np.sqrt(N) * mean / x if x > 0.0 else np.nan
+    share = lambda x: 0.0 if x is None else np.mean(np.asarray(x, dtype=np.float64)[1:] / equity[1:])
+    return {
+        "total_return": float(equity_curve[-1] - 1.0),
+        "sharpe_ratio": float(ratio(std)),
+        "sortino_ratio": float(ratio(downside)),
+        "high_water_mark": float(high_water_mark[0, -1]),
+        "drawdown": float(drawdown[0, -1]),
+        "max_drawdown": float(np.fmax.reduce(drawdown[0])),
+        "drawdown_duration": float(duration[0, -1]),
+        "max_drawdown_duration": float(duration[0].max()),
+        "exposure": float(share(gross)),
+        "turnover": float(share(traded) * N),
+    }
@@ -1,14 +1,15 @@
 import datetime
 import numpy as np
 import pandas as pd
-import Queue
 
 from abc import ABCMeta, abstractmethod
 from math import floor
 
-from event import FillEvent, OrderEvent
+from backtester.event import FillEvent, OrderCancelEvent, OrderEvent, RebalanceEvent, SignalEvent
+from backtester.ledger import Ledger
+from backtester.risk import RiskEngine
 
-from performance import create_sharpe_ratio, create_drawdowns
+from backtester.performance import create_sharpe_ratio, create_drawdowns
 
 class Portfolio():
     """
@@ -43,7 +44,7 @@ class NaivePortfolio(Portfolio):
     or position sizing. 
     """
     
-    def __init__(self, bars, events, start_date, initial_capital=100000.0):
+    def __init__(self, bars, events, start_date, initial_capital=100000.0, metrics=None):
         """
         Initialises the portfolio.
         
@@ -52,12 +53,15 @@ class NaivePortfolio(Portfolio):
             events (obj) - The Event Queue object.
             start_date - The start date (bar) of the portfolio.
             initial_capital (float) - The starting capital in USD
+            metrics (OnlineMetrics, optional) - Updated on every bar, so the
+                performance can be read while the backtest runs
         """
         self.bars = bars
         self.events = events
         self.symbol_list = self.bars.symbol_list
         self.start_date = start_date
         self.initial_capital = initial_capital
+        self.init_metrics(metrics)
         
         self.all_positions = self.construct_all_positions()
         self.current_positions = {symbol: 0 for symbol in self.symbol_list}
@@ -72,7 +76,7 @@ class NaivePortfolio(Portfolio):
         """
         positions = {symbol: 0 for symbol in self.symbol_list}
         positions["datestamp"] = self.start_date
-        return positions
+        return [positions]
     
     def construct_all_holdings(self):
         """
@@ -84,7 +88,7 @@ class NaivePortfolio(Portfolio):
         holdings["cash"] = self.initial_capital
         holdings["commission"] = 0.0
         holdings["total"] = self.initial_capital
-        return holdings
+        return [holdings]
     
     def construct_current_holdings(self):
         """
@@ -96,6 +100,24 @@ class NaivePortfolio(Portfolio):
         holdings["commission"] = 0
         holdings["total"] = self.initial_capital
         return holdings
+
+    def init_metrics(self, metrics):
+        """
+        Starts the OnlineMetrics, if any, from the initial capital.
+        """
+        self.metrics = metrics
+        # Notional traded since the last bar, for the turnover
+        self.traded = 0.0
+        if metrics is not None:
+            metrics.update(self.initial_capital)
+
+    def update_metrics(self, total, gross):
+        """
+        Adds the bar just recorded to the OnlineMetrics, if any.
+        """
+        if self.metrics is not None:
+            self.metrics.update(total, gross, self.traded)
+            self.traded = 0.0
     
     def update_timeindex(self, event):
         """
@@ -106,7 +128,7 @@ class NaivePortfolio(Portfolio):
         Makes use of a MarketEvent from the events queue.
         """
         bars = {
-            symbol: self.bars.get_latest(data, symbol)
+            symbol: self.bars.get_latest_data(symbol)
             for symbol in self.symbol_list
         }
         
@@ -117,7 +139,7 @@ class NaivePortfolio(Portfolio):
         }
         
         # Append the current positions
-        datestamp = bars[self.symbol_list[0]][0][1]
+        datestamp = event.datetime
         positions["datestamp"] = datestamp
         self.all_positions.append(positions)
         
@@ -127,16 +149,22 @@ class NaivePortfolio(Portfolio):
         holdings['cash'] = self.current_holdings['cash']
         holdings['commission'] = self.current_holdings['commission']
         holdings['total'] = self.current_holdings['cash']
+        gross = 0.0
         
         for symbol in self.symbol_list:
             # Approximation to real value, this is sufficient for Intraday
             # trading but not for daily strategies as opening prices can
             # differ substantially from the closing price
-            market_value = self.current_positions[symbol] * bar[symbol][0][5]
+            if len(bars[symbol]) == 0:
+                # No bars for this symbol yet
+                continue
+            market_value = self.current_positions[symbol] * bars[symbol].close[-1]
             holdings[symbol] = market_value
             holdings["total"] += market_value
+            gross += abs(market_value)
             
         self.all_holdings.append(holdings)
+        self.update_metrics(holdings["total"], gross)
         
     def update_positions_from_fill(self, fill):
         """
@@ -148,8 +176,8 @@ class NaivePortfolio(Portfolio):
             fill(obj) - The FillEvent object to update the posiitons with.
         """
         # kinda safe, would fail if not "BUY" or "SELL"
-        direction = 1 if event.direction == 'BUY' else -1
-        self.current_positions[event.symbol] += copysign(event.quantity, direction)
+        direction = 1 if fill.direction == 'BUY' else -1
+        self.current_positions[fill.symbol] += direction * fill.quantity
          
     def update_holdings_from_fill(self, fill):
         """
@@ -160,15 +188,18 @@ class NaivePortfolio(Portfolio):
             fill (obj) - The FillEvent object to update the posiitons with.
         """
         # kinda safe, would fail if not "BUY" or "SELL"
-        direction = 1 if event.direction == 'BUY' else -1
+        direction = 1 if fill.direction == 'BUY' else -1
         
         # Update holdings list with new quantities.
-        fill_cost = self.bars.get_latest_bars(fill.symbol)[0][5] # Close price
-        cost = fill_dir * fill_cost * fill.quantity
+        fill_cost = fill.fill_cost
+        if fill_cost is None:
+            fill_cost = self.bars.get_latest_data(fill.symbol).close[-1] # Close price
+        cost = direction * fill_cost * fill.quantity
         self.current_holdings[fill.symbol] += cost
         self.current_holdings["commission"] += fill.commission
         self.current_holdings["cash"] -= cost + fill.commission 
         self.current_holdings["total"] -= cost + fill.commission
+        self.traded += abs(cost)
         
     def update_fill(self, event):
         """
@@ -188,29 +219,30 @@ class NaivePortfolio(Portfolio):
         Args:
             signal (obj) - The SignalEvent signal information
         """
-        if isinstance(event, SignalEvent)
-                    direction = 'BUY' if event.signal_type == 'LONG' else 'SELL'
-                    return OrderEvent(
-                        event.symbol,
-                        'MARKET',
-                        100,
-                        direction
-                    )
+        if isinstance(signal, SignalEvent):
+            direction = 'BUY' if signal.signal_type == 'LONG' else 'SELL'
+            return OrderEvent(
+                signal.symbol,
+                'MKT',
+                100,
+                direction
+            )
+
     def update_signal(self, event):
         """
         Acts on a SignalEvent to generate new orders based on the portfolio
         logic.
         """
         if isinstance(event, SignalEvent):
-            self.event_queue.put(self.create_order_event(event))
+            self.events.put(self.generate_naive_order(event))
             
     def create_equity_curve_dataframe(self):
         """
         Creates an equity curve from the all_holdings 
         list of dictionaries.
         """
-        curve = pd.dataFrame(self.all_holdings)
-        curve.set_index('datetime', inplace=True)
+        curve = pd.DataFrame(self.all_holdings)
+        curve.set_index('datestamp', inplace=True)
         curve['returns'] = curve['total'].pct_change()
         curve['equity_curve'] = (1.0 + curve['returns']).cumprod()
         self.equity_curve = curve
@@ -220,16 +252,219 @@ class NaivePortfolio(Portfolio):
         Creates a list of summary statistics for the portfolio such as 
         Sharpe Ratio and drawdown information.
         """
-        total_return = self.equity_curve["equity_curve"][-1]
+        total_return = self.equity_curve["equity_curve"].iloc[-1]
         returns = self.equity_curve['returns']
         pnl = self.equity_curve["equity_curve"]
         
         sharpe_ratio = create_sharpe_ratio(returns)
         max_dd, dd_duration = create_drawdowns(pnl)
         
-        stats = [("Total Return", "%0.2f%%" % ((total_return - 1.0) * 100.0))
+        stats = [("Total Return", "%0.2f%%" % ((total_return - 1.0) * 100.0)),
                  ("Sharpe Ratio", "%0.2f" % sharpe_ratio),
                  ("Max Drawdown", "%0.2f%%" % (max_dd * 100.0)),
                  ("Drawdown Duration", "%d" % dd_duration)]
         
-        return stats
\ No newline at end of file
+        return stats
+
+class LedgerPortfolio(NaivePortfolio):
+    """
+    A NaivePortfolio that records its history in a Ledger of NumPy matrices
+    instead of a list of dicts per bar, for many symbols or long runs. Orders,
+    fills and the equity curve are the same as NaivePortfolio's, but the
+    history is read from `ledger` rather than all_positions and all_holdings.
+    """
+
+    def __init__(self, bars, events, start_date, initial_capital=100000.0, metrics=None, initial_size=1024):
+        """
+        Initialises the portfolio.
+
+        Args:
+            bars (obj) - The DataHandler object with current market data.
+            events (obj) - The Event Queue object.
+            start_date - The start date (bar) of the portfolio.
+            initial_capital (float) - The starting capital in USD
+            metrics (OnlineMetrics, optional) - Updated on every bar, see NaivePortfolio
+            initial_size (int, optional) - Number of bars the ledger is allocated for at first
+        """
+        self.bars = bars
+        self.events = events
+        self.symbol_list = self.bars.symbol_list
+        self.start_date = start_date
+        self.initial_capital = initial_capital
+        self.init_metrics(metrics)
+
+        self.ledger = Ledger(self.symbol_list, initial_capital, start_date, initial_size=initial_size)
+        # Latest close of every symbol, in ledger column order
+        self.prices = np.zeros(len(self.symbol_list))
+
+    @property
+    def current_positions(self):
+        return dict(zip(self.symbol_list, self.ledger.positions.tolist()))
+
+    @property
+    def current_holdings(self):
+        ledger = self.ledger
+        holdings = dict(zip(self.symbol_list, (ledger.positions * self.prices).tolist()))
+        holdings["cash"] = ledger.cash
+        holdings["commission"] = ledger.commission
+        holdings["total"] = ledger.cash + sum(holdings[symbol] for symbol in self.symbol_list)
+        return holdings
+
+    def update_timeindex(self, event):
+        """
+        Records the positions and their market value at the latest closes in
+        the ledger. Only the symbols of the MarketEvent have their prices read.
+        """
+        index = self.ledger.index
+        for symbol in event.symbols if event.symbols is not None else self.symbol_list:
+            bars = self.bars.get_latest_data(symbol)
+            if len(bars) > 0:
+                self.prices[index[symbol]] = bars.close[-1]
+        row = self.ledger.record(event.datetime, self.prices)
+        if self.metrics is not None:
+            n = len(self.symbol_list)
+            self.update_metrics(row[n + 2], np.abs(row[:n]).sum())
+
+    def update_fill(self, event):
+        """
+        Updates the ledger's positions and cash from a FillEvent.
+        """
+        if event.type == "FILL":
+            direction = 1 if event.direction == 'BUY' else -1
+            fill_cost = event.fill_cost
+            if fill_cost is None:
+                fill_cost = self.bars.get_latest_data(event.symbol).close[-1]
+            cost = direction * fill_cost * event.quantity
+            self.ledger.fill(event.symbol, direction * event.quantity, cost, event.commission)
+            self.traded += abs(cost)
+
+    def create_equity_curve_dataframe(self):
+        """
+        Creates the equity curve as a DataFrame over the ledger's memory.
+        """
+        self.equity_curve = self.ledger.equity_curve()
+
+
+class RiskManagedPortfolio(NaivePortfolio):
+    """
+    A NaivePortfolio that sizes its positions with a RiskEngine instead of
+    ordering a constant 100 shares.
+
+    Signals choose the symbols held: LONG adds a symbol and SHORT closes it.
+    After the signals of a bar, and every rebalance_every bars if given, the
+    engine's target weights of the symbols held are turned into orders for
+    the difference from the current positions plus the orders not yet
+    filled, all in one vectorised pass. The portfolio rebalances at most once
+    per bar: the first signal posts a RebalanceEvent behind the others.
+
+    An order counts as pending until it is filled or an OrderCancelEvent
+    comes back for it. With a broker that can leave orders unfilled, such as
+    a MatchingExecutionHandler, cancel the ones not wanted any more, or every
+    later target is offset by them.
+    """
+
+    def __init__(self, bars, events, start_date, initial_capital=100000.0, metrics=None, risk=None,
+                 rebalance_every=None):
+        """
+        Initialises the portfolio.
+
+        Args:
+            bars (obj) - The DataHandler object with current market data.
+            events (obj) - The Event Queue object.
+            start_date - The start date (bar) of the portfolio.
+            initial_capital (float) - The starting capital in USD
+            metrics (OnlineMetrics, optional) - Updated on every bar, see NaivePortfolio
+            risk (RiskEngine, optional) - Default RiskEngine(symbol_list)
+            rebalance_every (int, optional) - Also rebalance every this many bars
+        """
+        NaivePortfolio.__init__(self, bars, events, start_date, initial_capital, metrics)
+        self.risk = risk or RiskEngine(self.symbol_list)
+        self.rebalance_every = rebalance_every
+        self.held = np.zeros(len(self.symbol_list), dtype=bool)
+        # Signed quantity ordered and not filled yet, per symbol
+        self.pending = np.zeros(len(self.symbol_list))
+        self._bars = 0
+        self._rebalance_posted = False
+        self._last_bar = [None] * len(self.symbol_list)
+
+    def update_timeindex(self, event):
+        """
+        Records the bar as NaivePortfolio does and folds the new closes into
+        the risk engine. Symbols without a new bar are left out, rather than
+        given a return of zero.
+        """
+        NaivePortfolio.update_timeindex(self, event)
+        prices = np.full(len(self.symbol_list), np.nan)
+        for i, symbol in enumerate(self.symbol_list):
+            bars = self.bars.get_latest_data(symbol)
+            if bars is not None and len(bars) > 0:
+                # Padded symbols repeat their last bar
+                timestamp = bars.datetime[-1]
+                if timestamp != self._last_bar[i]:
+                    self._last_bar[i] = timestamp
+                    prices[i] = bars.close[-1]
+        self.risk.update(prices)
+        self._bars += 1
+        if self.rebalance_every is not None and self._bars % self.rebalance_every == 0:
+            self.post_rebalance(event.datetime)
+
+    def post_rebalance(self, datetime=None):
+        """
+        Posts a RebalanceEvent unless one is already on the bus, so every
+        signal posted before it is acted on first.
+        """
+        if not self._rebalance_posted:
+            self._rebalance_posted = True
+            self.events.put(RebalanceEvent(datetime))
+
+    def rebalance(self):
+        """
+        Puts orders moving every position, with the orders still pending, to
+        the engine's target.
+        """
+        weights = self.risk.target_weights(self.held)
+        positions = np.array([self.current_positions[symbol] for symbol in self.symbol_list], dtype=np.float64)
+        equity = self.all_holdings[-1]["total"]
+        quantities = self.risk.order_quantities(weights, equity, positions + self.pending)
+        for i in np.flatnonzero(quantities):
+            quantity = int(quantities[i])
+            if quantity == 0:
+                continue
+            self.pending[i] += quantity
+            self.events.put(OrderEvent(self.symbol_list[i], 'MKT', abs(quantity),
+                                       'BUY' if quantity > 0 else 'SELL'))
+
+    def update_signal(self, event):
+        """
+        Adds or removes the signal's symbol from the ones held, and
+        rebalances once the bar's signals are all in.
+        """
+        if isinstance(event, SignalEvent):
+            self.held[self.risk.index[event.symbol]] = event.signal_type == 'LONG'
+            self.post_rebalance(event.datetime)
+
+    def update_rebalance(self, event):
+        """
+        Rebalances on the RebalanceEvent the portfolio posted.
+        """
+        if isinstance(event, RebalanceEvent):
+            self._rebalance_posted = False
+            self.rebalance()
+
+    def update_fill(self, event):
+        """
+        Updates the positions and holdings from a FillEvent and what is
+        still pending.
+        """
+        if event.type == "FILL":
+            NaivePortfolio.update_fill(self, event)
+            direction = 1 if event.direction == 'BUY' else -1
+            self.pending[self.risk.index[event.symbol]] -= direction * event.quantity
+
+    def update_cancel(self, event):
+        """
+        Takes the quantity of a cancelled order off what is still pending.
+        """
+        if isinstance(event, OrderCancelEvent):
+            direction = 1 if event.order.direction == 'BUY' else -1
+            self.pending[self.risk.index[event.order.symbol]] -= direction * event.quantity
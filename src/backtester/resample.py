@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+
+from backtester.store import FIELDS, BarBuffer, BarWindow, ColumnarBars
+
+
+def timeframe_to_ns(timeframe):
+    """
+    Converts a fixed-width timeframe such as '1h', '15min' or '1D' into
+    nanoseconds. Calendar frequencies ('W', 'M') have no fixed width and
+    are rejected.
+    """
+    try:
+        width = pd.to_timedelta(timeframe).value
+    except ValueError:
+        raise ValueError(f"{timeframe!r} is not a fixed-width timeframe")
+    if width <= 0:
+        raise ValueError(f"{timeframe!r} is not a positive timeframe")
+    return width
+
+
+def resample_bars(bars, timeframe):
+    """
+    Resamples a whole columnar history in one vectorised pass.
+
+    Bars are bucketed on multiples of the timeframe since the epoch and each
+    bucket is labelled by its start, as pandas does by default.
+
+    Args:
+        bars (ColumnarBars or BarWindow) - The history to resample.
+        timeframe (str) - A fixed-width pandas timeframe, e.g. '1h'.
+
+    Returns:
+        ColumnarBars at the higher timeframe.
+    """
+    width = timeframe_to_ns(timeframe)
+    datetime = np.asarray(bars.datetime)
+    columns = bars.columns if isinstance(bars, ColumnarBars) else {field: bars[field] for field in FIELDS}
+    if len(datetime) == 0:
+        empty = {field: np.empty(0, dtype=np.float64) for field in FIELDS}
+        return ColumnarBars(bars.symbol, np.empty(0, dtype=np.int64), empty)
+
+    buckets = datetime - datetime % width
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+    ends = np.append(starts[1:], len(datetime)) - 1
+    resampled = {
+        "open": columns["open"][starts],
+        "high": np.maximum.reduceat(columns["high"], starts),
+        "low": np.minimum.reduceat(columns["low"], starts),
+        "close": columns["close"][ends],
+        "adj_close": columns["adj_close"][ends],
+        "volume": np.add.reduceat(columns["volume"], starts),
+    }
+    return ColumnarBars(bars.symbol, buckets[starts], resampled)
+
+
+class Resampler(object):
+    """
+    Builds higher-timeframe OHLCV bars incrementally as lower-timeframe bars
+    arrive, at O(1) per bar.
+
+    The bar currently being built is kept separately. It is moved into the
+    completed history (a BarBuffer) when the first bar of the next bucket
+    arrives, so get_latest_data only returns finished bars unless asked for
+    the partial one.
+    """
+
+    def __init__(self, timeframe, max_bars=None):
+        """
+        Args:
+            timeframe (str) - A fixed-width pandas timeframe, e.g. '1h' or '1D'.
+            max_bars (int, optional) - Number of completed bars kept per symbol,
+                None to keep them all.
+        """
+        self.timeframe = timeframe
+        self.width = timeframe_to_ns(timeframe)
+        self.max_bars = max_bars
+        self.bars = {}
+        self._bucket = {}
+        self._partial = {}
+
+    def _buffer(self, symbol):
+        if symbol not in self.bars:
+            self.bars[symbol] = BarBuffer(symbol, capacity=self.max_bars)
+        return self.bars[symbol]
+
+    def update(self, symbol, timestamp, values):
+        """
+        Folds one lower-timeframe bar into the current bucket.
+
+        Args:
+            symbol (str) - The ticker symbol e.g. 'GOOG'
+            timestamp (int) - Timestamp of the bar in nanoseconds
+            values (sequence) - Field values in the order of FIELDS
+        """
+        bucket = timestamp - timestamp % self.width
+        partial = self._partial.get(symbol)
+        if partial is not None and bucket == self._bucket[symbol]:
+            _, high, low, close, adj_close, volume = values
+            if high > partial[1]:
+                partial[1] = high
+            if low < partial[2]:
+                partial[2] = low
+            partial[3] = close
+            partial[4] = adj_close
+            partial[5] += volume
+            return
+        if partial is not None:
+            self._buffer(symbol).append(self._bucket[symbol], partial)
+        self._bucket[symbol] = bucket
+        self._partial[symbol] = list(values)
+
+    def warm_up(self, symbol, history):
+        """
+        Resamples an existing history in one vectorised pass. The last bucket
+        of the history becomes the partial bar that update() continues from.
+
+        Args:
+            symbol (str) - The ticker symbol e.g. 'GOOG'
+            history (ColumnarBars or BarWindow) - Bars in time order.
+        """
+        resampled = resample_bars(history, self.timeframe)
+        n = len(resampled)
+        if n == 0:
+            return
+        buffer = self._buffer(symbol)
+        buffer.extend(resampled.datetime[:-1], {field: resampled.columns[field][:-1] for field in FIELDS})
+        self._bucket[symbol] = int(resampled.datetime[-1])
+        self._partial[symbol] = [float(resampled.columns[field][-1]) for field in FIELDS]
+
+    def get_latest_data(self, symbol, N=1, include_partial=False):
+        """
+        Returns the last N higher-timeframe bars of a symbol.
+
+        Args:
+            symbol (str) - The ticker symbol e.g. 'GOOG'
+            N (int, optional) - Number of bars returned, default is 1
+            include_partial (bool, optional) - Whether the bar still being built
+                is returned as the last row. Completed bars are views, with the
+                partial bar the window is a copy.
+        """
+        window = self._buffer(symbol).latest(N)
+        partial = self._partial.get(symbol)
+        if not include_partial or partial is None or N < 1:
+            return window
+        keep = min(len(window), N - 1)
+        return BarWindow(
+            symbol,
+            np.append(window.datetime[len(window) - keep:], self._bucket[symbol]),
+            *[np.append(window[field][len(window) - keep:], value) for field, value in zip(FIELDS, partial)]
+        )
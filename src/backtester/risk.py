@@ -0,0 +1,411 @@
+from abc import ABCMeta, abstractmethod
+
+import numpy as np
+
+
+class CovarianceEstimator(object):
+    """
+    CovarianceEstimator is an abstract base class for covariance matrices of
+    the returns of a universe that are updated one bar at a time.
+
+    Sizing only needs the products of the covariance with weight vectors, so
+    estimators answer dot(weights) and variance() directly and the full n x n
+    matrix is only built on request. With a shrinkage intensity d the
+    covariance used is (1 - d) * S + d * diag(S), pulling the correlations
+    towards zero, which steadies the estimate of a large universe from
+    few bars.
+
+    Assets without a new bar are masked out of an update rather than given a
+    return of zero, which would understate their variance: each pair of
+    assets is only updated by the bars that have both.
+    """
+
+    __metaclass__ = ABCMeta
+
+    def __init__(self, n, shrinkage=0.0, min_periods=2):
+        """
+        Args:
+            n (int) - Number of assets
+            shrinkage (float, optional) - Shrinkage intensity, 0 to 1
+            min_periods (int, optional) - Bars needed before the estimate is used
+        """
+        self.n = n
+        self.shrinkage = shrinkage
+        self.min_periods = min_periods
+        self.count = 0
+
+    @property
+    def ready(self):
+        return self.count >= self.min_periods
+
+    @abstractmethod
+    def update(self, returns, observed=None):
+        """
+        Folds in the returns of one bar.
+
+        Args:
+            returns (np.ndarray) - The return of every asset
+            observed (np.ndarray, optional) - Boolean mask of the assets with a
+                return this bar, by default all of them
+        """
+        raise NotImplementedError("CovarianceEstimator child must implement update()")
+
+    @abstractmethod
+    def _dot(self, weights):
+        raise NotImplementedError("CovarianceEstimator child must implement _dot()")
+
+    @abstractmethod
+    def variance(self):
+        """
+        Returns the variance of every asset.
+        """
+        raise NotImplementedError("CovarianceEstimator child must implement variance()")
+
+    def dot(self, weights):
+        """
+        Returns the covariance times a weight vector, or an n x m matrix of them.
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        product = self._dot(weights)
+        if self.shrinkage:
+            variance = self.variance().reshape((-1,) + (1,) * (weights.ndim - 1))
+            product = (1.0 - self.shrinkage) * product + self.shrinkage * variance * weights
+        return product
+
+    def covariance(self):
+        """
+        Returns the n x n covariance matrix, in O(n^2) memory.
+        """
+        return self.dot(np.eye(self.n))
+
+
+class EWMACovariance(CovarianceEstimator):
+    """
+    Exponentially weighted covariance of zero-mean returns, as in RiskMetrics:
+    S = lam * S + (1 - lam) * r r', a rank-1 update per bar. The weights are
+    normalised by their running sum, kept per pair of assets, so early
+    estimates and assets that missed bars are not biased towards zero.
+    """
+
+    def __init__(self, n, halflife=30, shrinkage=0.0, min_periods=2):
+        """
+        Args:
+            n (int) - Number of assets
+            halflife (float, optional) - Bars for the weight of a return to halve
+            shrinkage, min_periods - See CovarianceEstimator
+        """
+        CovarianceEstimator.__init__(self, n, shrinkage, min_periods)
+        self.decay = 0.5 ** (1.0 / halflife)
+        self._sum = np.zeros((n, n))
+        self._weight = np.zeros((n, n))
+        self._matrix = None
+
+    def update(self, returns, observed=None):
+        returns = np.asarray(returns, dtype=np.float64)
+        if observed is None:
+            decay = self.decay
+            self._weight *= decay
+            self._weight += 1.0 - decay
+        else:
+            returns = np.where(observed, returns, 0.0)
+            pairs = np.multiply.outer(observed, observed)
+            decay = np.where(pairs, self.decay, 1.0)
+            self._weight *= decay
+            self._weight[pairs] += 1.0 - self.decay
+        self._sum *= decay
+        # In-place rank-1 update of the whole matrix, zero outside the observed pairs
+        self._sum += (1.0 - self.decay) * np.multiply.outer(returns, returns)
+        self._matrix = None
+        self.count += 1
+
+    def _covariance(self):
+        if self._matrix is None:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                self._matrix = np.where(self._weight > 0.0, self._sum / self._weight, 0.0)
+        return self._matrix
+
+    def _dot(self, weights):
+        return self._covariance() @ weights
+
+    def variance(self):
+        return np.diag(self._covariance()).copy()
+
+
+class RollingCovariance(CovarianceEstimator):
+    """
+    Sample covariance over a rolling window of bars, kept as running sums of
+    the returns and of their outer products: each bar adds one rank-1 term
+    and removes the one leaving the window. The sums and the number of bars
+    are kept per pair of assets, over the bars in the window that have both.
+    """
+
+    def __init__(self, n, window=60, shrinkage=0.0, min_periods=None):
+        """
+        Args:
+            n (int) - Number of assets
+            window (int, optional) - Number of bars in the window
+            shrinkage, min_periods - See CovarianceEstimator, min_periods
+                defaults to the window
+        """
+        CovarianceEstimator.__init__(self, n, shrinkage, window if min_periods is None else min_periods)
+        self.window = window
+        self._returns = np.zeros((window, n))
+        self._observed = np.zeros((window, n))
+        # Sums of r_i over the bars with both i and j, of r_i r_j and the bar counts
+        self._sum = np.zeros((n, n))
+        self._products = np.zeros((n, n))
+        self._counts = np.zeros((n, n))
+        self._matrix = None
+
+    def update(self, returns, observed=None):
+        returns = np.asarray(returns, dtype=np.float64)
+        observed = np.ones(self.n) if observed is None else np.asarray(observed, dtype=np.float64)
+        returns = np.where(observed > 0.0, returns, 0.0)
+        slot = self.count % self.window
+        if self.count >= self.window:
+            old, seen = self._returns[slot], self._observed[slot]
+            self._sum -= np.multiply.outer(old, seen)
+            self._products -= np.multiply.outer(old, old)
+            self._counts -= np.multiply.outer(seen, seen)
+        self._returns[slot] = returns
+        self._observed[slot] = observed
+        self._sum += np.multiply.outer(returns, observed)
+        self._products += np.multiply.outer(returns, returns)
+        self._counts += np.multiply.outer(observed, observed)
+        self._matrix = None
+        self.count += 1
+
+    def _covariance(self):
+        if self._matrix is None:
+            counts = self._counts
+            with np.errstate(divide="ignore", invalid="ignore"):
+                matrix = (self._products - self._sum * self._sum.T / counts) / (counts - 1.0)
+            matrix[counts < 2.0] = 0.0
+            diagonal = np.einsum("ii->i", matrix)
+            np.maximum(diagonal, 0.0, out=diagonal)
+            self._matrix = matrix
+        return self._matrix
+
+    def _dot(self, weights):
+        return self._covariance() @ weights
+
+    def variance(self):
+        return np.diag(self._covariance()).copy()
+
+
+class FactorCovariance(CovarianceEstimator):
+    """
+    A factor model of the covariance, B F B' + D, for universes too large for
+    an n x n matrix. The returns of each bar are projected onto k factors
+    with fixed loadings B (by default one market factor), and the factor
+    covariance F and the specific variances D are exponentially weighted.
+    A bar costs O(n k + k^2) and a product with a weight vector O(n k), with
+    no n x n matrix ever formed. When some assets have no return the factor
+    returns are fitted to the others, at O(n k^2).
+    """
+
+    def __init__(self, n, loadings=None, halflife=30, shrinkage=0.0, min_periods=2):
+        """
+        Args:
+            n (int) - Number of assets
+            loadings (np.ndarray, optional) - n x k factor loadings, e.g. sector
+                memberships, default a single column of ones
+            halflife, shrinkage, min_periods - See EWMACovariance
+        """
+        CovarianceEstimator.__init__(self, n, shrinkage, min_periods)
+        self.loadings = np.ones((n, 1)) if loadings is None else np.asarray(loadings, dtype=np.float64)
+        # Least squares factor returns of a bar are projection @ returns
+        self._projection = np.linalg.pinv(self.loadings)
+        self.factors = EWMACovariance(self.loadings.shape[1], halflife)
+        self.decay = self.factors.decay
+        self._specific = np.zeros(n)
+        self._specific_weight = np.zeros(n)
+
+    def update(self, returns, observed=None):
+        returns = np.asarray(returns, dtype=np.float64)
+        if observed is None or observed.all():
+            factor_returns = self._projection @ returns
+            decay = self.decay
+        else:
+            returns = np.where(observed, returns, 0.0)
+            factor_returns = np.linalg.pinv(self.loadings[observed]) @ returns[observed]
+            decay = np.where(observed, self.decay, 1.0)
+        residuals = returns - self.loadings @ factor_returns
+        if observed is not None:
+            residuals[~observed] = 0.0
+        self.factors.update(factor_returns)
+        self._specific *= decay
+        self._specific += (1.0 - decay) * residuals * residuals
+        self._specific_weight *= decay
+        self._specific_weight += 1.0 - decay
+        self.count += 1
+
+    def specific_variance(self):
+        weight = self._specific_weight
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(weight > 0.0, self._specific / weight, 0.0)
+
+    def _dot(self, weights):
+        exposures = self.loadings.T @ weights
+        specific = self.specific_variance().reshape((-1,) + (1,) * (weights.ndim - 1))
+        return self.loadings @ self.factors.dot(exposures) + specific * weights
+
+    def variance(self):
+        systematic = np.einsum("ij,jk,ik->i", self.loadings, self.factors.covariance(), self.loadings)
+        return systematic + self.specific_variance()
+
+
+def inverse_volatility_weights(variance, active=None):
+    """
+    Weights proportional to the inverse volatility of each active asset,
+    summing to one.
+    """
+    variance = np.asarray(variance, dtype=np.float64)
+    active = np.ones(len(variance), dtype=bool) if active is None else active
+    usable = active & (variance > 0.0)
+    weights = np.zeros(len(variance))
+    weights[usable] = 1.0 / np.sqrt(variance[usable])
+    total = weights.sum()
+    return weights / total if total > 0.0 else weights
+
+
+def risk_parity_weights(estimator, active=None, iterations=200, tolerance=1e-8):
+    """
+    Weights summing to one at which every active asset contributes the same
+    share of the portfolio variance, w_i (S w)_i, found by the damped fixed
+    point w_i <- sqrt(w_i / (S w)_i) from the inverse volatility weights.
+    Each iteration is one product with the covariance.
+
+    Args:
+        estimator (CovarianceEstimator) - The covariance
+        active (np.ndarray, optional) - Boolean mask of the assets held
+        iterations (int, optional) - Iterations at most
+        tolerance (float, optional) - Largest relative spread of the risk
+            contributions accepted
+
+    Returns:
+        The weights, zero for inactive assets.
+    """
+    weights = inverse_volatility_weights(estimator.variance(), active)
+    held = weights > 0.0
+    if held.sum() < 2:
+        return weights
+    for _ in range(iterations):
+        marginal = estimator.dot(weights)
+        contributions = weights[held] * marginal[held]
+        if np.any(marginal[held] <= 0.0):
+            break
+        mean = contributions.mean()
+        if np.max(np.abs(contributions - mean)) <= tolerance * mean:
+            break
+        weights[held] = np.sqrt(weights[held] / marginal[held])
+        weights /= weights.sum()
+    return weights
+
+
+def volatility_target(weights, estimator, target, N=252, max_leverage=1.0):
+    """
+    Scales weights so the annualised volatility of the portfolio is the
+    target, without the gross exposure exceeding max_leverage.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    variance = float(weights @ estimator.dot(weights)) * N
+    if variance <= 0.0:
+        return np.zeros_like(weights)
+    scaled = weights * (target / np.sqrt(variance))
+    gross = np.abs(scaled).sum()
+    if max_leverage is not None and gross > max_leverage:
+        scaled *= max_leverage / gross
+    return scaled
+
+
+def order_quantities(weights, equity, prices, positions, lot=1):
+    """
+    Returns the signed quantity to trade in every asset to move from the
+    current positions to the target weights of the equity, in whole lots.
+    Assets without a price are not traded.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    priced = np.isfinite(prices) & (prices > 0.0)
+    target = np.zeros(len(prices))
+    target[priced] = np.trunc(weights[priced] * equity / prices[priced] / lot) * lot
+    return np.where(priced, target - positions, 0.0)
+
+
+class RiskEngine(object):
+    """
+    Turns the prices of a universe into target weights and order quantities.
+
+    Every bar the returns from the last prices are folded into a
+    CovarianceEstimator. Target weights are computed for the assets held,
+    'risk_parity' or 'inverse_volatility' (or 'equal'), then scaled to a
+    target volatility.
+    """
+
+    METHODS = ("risk_parity", "inverse_volatility", "equal")
+
+    def __init__(self, symbol_list, estimator=None, method="risk_parity", target_volatility=0.1, N=252,
+                 max_leverage=1.0, lot=1):
+        """
+        Args:
+            symbol_list (List[str]) - The universe
+            estimator (CovarianceEstimator, optional) - Default EWMACovariance with a
+                30 bar half-life
+            method (str, optional) - One of METHODS
+            target_volatility (float, optional) - Annualised volatility aimed for,
+                None to leave the weights summing to one
+            N (float, optional) - Number of bars per year
+            max_leverage (float, optional) - Largest gross exposure
+            lot (int, optional) - Quantities are rounded down to whole lots
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown sizing method {method!r}, expected one of {self.METHODS}")
+        self.symbol_list = list(symbol_list)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbol_list)}
+        self.estimator = estimator or EWMACovariance(len(self.symbol_list))
+        self.method = method
+        self.target_volatility = target_volatility
+        self.N = N
+        self.max_leverage = max_leverage
+        self.lot = lot
+        self.prices = np.full(len(self.symbol_list), np.nan)
+
+    def update(self, prices):
+        """
+        Folds in the prices of a bar, NaN for the assets without a new bar.
+        Their return is left out of the estimate, and taken from their last
+        price once they have a bar again.
+        """
+        prices = np.asarray(prices, dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = prices / self.prices - 1.0
+        observed = np.isfinite(returns)
+        if observed.any():
+            self.estimator.update(np.where(observed, returns, 0.0), None if observed.all() else observed)
+        self.prices = np.where(np.isnan(prices), self.prices, prices)
+
+    def target_weights(self, active=None):
+        """
+        Returns the target weight of every asset, zero until the estimator is
+        ready and for assets not active.
+        """
+        n = len(self.symbol_list)
+        active = np.ones(n, dtype=bool) if active is None else np.asarray(active, dtype=bool)
+        active = active & np.isfinite(self.prices)
+        if not self.estimator.ready or not active.any():
+            return np.zeros(n)
+        if self.method == "risk_parity":
+            weights = risk_parity_weights(self.estimator, active)
+        elif self.method == "inverse_volatility":
+            weights = inverse_volatility_weights(self.estimator.variance(), active)
+        else:
+            weights = active / active.sum()
+        if self.target_volatility is None:
+            return weights
+        return volatility_target(weights, self.estimator, self.target_volatility, self.N, self.max_leverage)
+
+    def order_quantities(self, weights, equity, positions):
+        """
+        Returns the signed quantity of every asset to trade to reach the weights.
+        """
+        return order_quantities(weights, equity, self.prices, np.asarray(positions, dtype=np.float64), self.lot)
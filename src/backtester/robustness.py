@@ -0,0 +1,302 @@
+import math
+from abc import ABCMeta, abstractmethod
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from backtester.performance import create_batch_drawdowns, create_batch_sharpe_ratios
+
+METRICS = ("total_return", "sharpe_ratio", "max_drawdown", "drawdown_duration")
+
+
+def batch_metrics(returns, N=252):
+    """
+    The summary metrics of create_summary_metrics for a batch of returns
+    streams, each compounded from an equity of 1.
+
+    Args:
+        returns (np.ndarray) - A (runs x periods) array of period returns
+        N (float, optional) - Number of periods per year for the Sharpe ratio
+
+    Returns:
+        A dict of float arrays keyed by METRICS.
+    """
+    equity_curves = np.cumprod(1.0 + returns, axis=1)
+    max_drawdown, duration = create_batch_drawdowns(equity_curves)
+    return {
+        "total_return": equity_curves[:, -1] - 1.0,
+        "sharpe_ratio": create_batch_sharpe_ratios(returns, N),
+        "max_drawdown": max_drawdown,
+        "drawdown_duration": duration,
+    }
+
+
+class ResamplingMethod(object):
+    """
+    ResamplingMethod is an abstract base class for the ways of generating
+    alternative histories from one returns stream. Each one draws a whole
+    batch as a (size x periods) array in a few vectorised operations.
+    """
+
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def sample(self, returns, size, rng):
+        """
+        Args:
+            returns (np.ndarray) - The observed returns, one dimensional
+            size (int) - Number of resamples
+            rng (np.random.Generator) - The random stream to draw from
+
+        Returns:
+            A (size x len(returns)) float64 array.
+        """
+        raise NotImplementedError("ResamplingMethod child must implement sample()")
+
+
+class BlockBootstrap(ResamplingMethod):
+    """
+    Circular block bootstrap: the returns are rebuilt from blocks of
+    consecutive returns starting at random bars, wrapping around the end, which
+    keeps the autocorrelation within a block.
+    """
+
+    def __init__(self, block=20):
+        """
+        Args:
+            block (int, optional) - Number of bars in a block
+        """
+        self.block = block
+
+    def sample(self, returns, size, rng):
+        n = len(returns)
+        blocks = -(-n // self.block)
+        starts = rng.integers(0, n, size=(size, blocks, 1))
+        rows = ((starts + np.arange(self.block)) % n).reshape(size, blocks * self.block)[:, :n]
+        return returns[rows]
+
+
+class TradeShuffle(ResamplingMethod):
+    """
+    Random reorderings of the returns, e.g. of each trade's return. The total
+    return and the Sharpe ratio do not change, only the path and so the
+    drawdowns.
+    """
+
+    def sample(self, returns, size, rng):
+        return rng.permuted(np.broadcast_to(returns, (size, len(returns))), axis=1)
+
+
+class NoiseInjection(ResamplingMethod):
+    """
+    The returns with Gaussian noise added to every bar, scaled to a fraction of
+    the standard deviation of the returns.
+    """
+
+    def __init__(self, scale=0.5):
+        """
+        Args:
+            scale (float, optional) - Standard deviation of the noise relative
+                to that of the returns
+        """
+        self.scale = scale
+
+    def sample(self, returns, size, rng):
+        sigma = self.scale * returns.std()
+        return returns + rng.normal(0.0, sigma, size=(size, len(returns)))
+
+
+class StreamingQuantiles(object):
+    """
+    Approximate quantiles of a stream of values in bounded memory, with a
+    compactor sketch: values are kept in levels where an item on level h
+    stands for 2**h values. When a level holds more than `capacity` items it
+    is sorted and every other item is promoted to the next level, so memory is
+    O(capacity * log(n)) and the rank error is about 1/capacity per level.
+    """
+
+    def __init__(self, capacity=2048):
+        """
+        Args:
+            capacity (int, optional) - Items kept per level before compacting
+        """
+        self.capacity = capacity
+        self.levels = [np.empty(0)]
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._sum = 0.0
+        self._compactions = 0
+
+    def update(self, values):
+        """
+        Adds a batch of values; NaNs are ignored.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self._sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.levels[0] = np.concatenate((self.levels[0], values))
+        self._compact()
+
+    def _compact(self):
+        h = 0
+        while h < len(self.levels):
+            level = self.levels[h]
+            if len(level) > self.capacity:
+                level = np.sort(level)
+                even = len(level) - len(level) % 2
+                # Alternate which half survives so the errors cancel on average
+                promoted = level[self._compactions % 2:even:2]
+                self._compactions += 1
+                self.levels[h] = level[even:]
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[h + 1] = np.concatenate((self.levels[h + 1], promoted))
+            h += 1
+
+    @property
+    def mean(self):
+        return self._sum / self.count if self.count else math.nan
+
+    def quantile(self, q):
+        """
+        Returns the approximate q-quantile(s), q in [0, 1].
+        """
+        q = np.asarray(q, dtype=np.float64)
+        if self.count == 0:
+            return np.full(q.shape, np.nan)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        ranks = np.searchsorted(cumulative, q * cumulative[-1], side="left")
+        return np.clip(items[order][np.minimum(ranks, len(items) - 1)], self.min, self.max)
+
+
+# State of a Monte Carlo worker process, set once by _init_worker
+_worker = {}
+
+
+def _init_worker(returns, method, N):
+    _worker["returns"] = returns
+    _worker["method"] = method
+    _worker["N"] = N
+
+
+def _run_batch(size, seed):
+    rng = np.random.default_rng(seed)
+    return batch_metrics(_worker["method"].sample(_worker["returns"], size, rng), _worker["N"])
+
+
+class MonteCarloResult(object):
+    """
+    The streamed distributions of the metrics over every resample, with the
+    point estimates of the observed returns for comparison.
+    """
+
+    def __init__(self, sketches, observed, quantiles):
+        self.sketches = sketches
+        self.observed = observed
+        self.quantiles = tuple(quantiles)
+
+    def summary(self):
+        """
+        A DataFrame with one row per metric: the observed value, the mean of
+        the resamples, their quantiles and the number of finite resamples.
+        """
+        rows = {}
+        for metric in METRICS:
+            sketch = self.sketches[metric]
+            row = {"observed": self.observed[metric], "mean": sketch.mean}
+            row.update(zip((f"q{q:g}" for q in self.quantiles), sketch.quantile(self.quantiles)))
+            row["count"] = sketch.count
+            rows[metric] = row
+        return pd.DataFrame.from_dict(rows, orient="index")
+
+
+class MonteCarlo(object):
+    """
+    Runs many resamples of a returns stream in batches and streams their
+    Sharpe ratio, total return, maximum drawdown and drawdown duration into
+    StreamingQuantiles, so memory does not grow with the number of resamples.
+
+    Every batch draws from its own stream spawned from one SeedSequence, so a
+    run is reproducible from its seed whatever the number of workers.
+    Batches are spread over a process pool, with a bounded number in flight,
+    and folded into the sketches in batch order.
+    """
+
+    def __init__(self, returns, method=None, resamples=10000, batch_size=1000, seed=None,
+                 workers=1, N=252, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95), capacity=2048):
+        """
+        Args:
+            returns (array-like) - The observed period returns, e.g. an equity
+                curve's 'returns' column; NaNs are dropped
+            method (ResamplingMethod, optional) - Default BlockBootstrap()
+            resamples (int, optional) - Total number of resamples
+            batch_size (int, optional) - Resamples drawn as one 2D array
+            seed (int, optional) - Entropy of the SeedSequence, None for a fresh one
+            workers (int, optional) - Number of worker processes, 1 runs in this process
+            N (float, optional) - Number of periods per year for the Sharpe ratio
+            quantiles (tuple, optional) - Quantiles reported by summary()
+            capacity (int, optional) - Size of the StreamingQuantiles sketches
+        """
+        returns = np.asarray(returns, dtype=np.float64)
+        self.returns = returns[~np.isnan(returns)]
+        self.method = method or BlockBootstrap()
+        self.resamples = resamples
+        self.batch_size = batch_size
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.workers = workers
+        self.N = N
+        self.quantiles = quantiles
+        self.capacity = capacity
+
+    def batches(self):
+        """
+        Returns the (size, SeedSequence) of every batch.
+        """
+        sizes = [self.batch_size] * (self.resamples // self.batch_size)
+        if self.resamples % self.batch_size:
+            sizes.append(self.resamples % self.batch_size)
+        return list(zip(sizes, self.seed_sequence.spawn(len(sizes))))
+
+    def run(self):
+        """
+        Returns:
+            A MonteCarloResult.
+        """
+        sketches = {metric: StreamingQuantiles(self.capacity) for metric in METRICS}
+        observed = {metric: float(values[0])
+                    for metric, values in batch_metrics(self.returns[np.newaxis], self.N).items()}
+
+        def fold(metrics):
+            for metric, values in metrics.items():
+                sketches[metric].update(values)
+
+        batches = self.batches()
+        if self.workers <= 1:
+            _init_worker(self.returns, self.method, self.N)
+            try:
+                for size, seed in batches:
+                    fold(_run_batch(size, seed))
+            finally:
+                _worker.clear()
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                     initargs=(self.returns, self.method, self.N)) as pool:
+                pending = deque()
+                for size, seed in batches:
+                    pending.append(pool.submit(_run_batch, size, seed))
+                    if len(pending) >= 2 * self.workers:
+                        fold(pending.popleft().result())
+                while pending:
+                    fold(pending.popleft().result())
+        return MonteCarloResult(sketches, observed, self.quantiles)
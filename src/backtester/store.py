@@ -0,0 +1,219 @@
+import numpy as np
+
+# Fields held for every bar, each in its own contiguous float64 column.
+FIELDS = ("open", "high", "low", "close", "adj_close", "volume")
+
+
+class BarWindow(object):
+    """
+    A read-only window onto the last N bars of a single symbol.
+
+    Each field is a NumPy array (a view onto the underlying store wherever
+    possible) so strategies can run vectorised calculations without copying.
+    The timestamps are held as int64 nanoseconds since the epoch.
+    """
+
+    __slots__ = ("symbol", "datetime") + FIELDS
+
+    def __init__(self, symbol, datetime, open, high, low, close, adj_close, volume):
+        """
+        Initialises the window.
+
+        Args:
+            symbol (str) - The ticker symbol e.g. 'GOOG'
+            datetime (np.ndarray) - int64 timestamps in nanoseconds
+            open, high, low, close, adj_close, volume (np.ndarray) - float64 columns
+        """
+        self.symbol = symbol
+        self.datetime = datetime
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.adj_close = adj_close
+        self.volume = volume
+
+    def __len__(self):
+        return len(self.datetime)
+
+    def __getitem__(self, field):
+        """
+        Returns a column by name, e.g. window['close'].
+        """
+        if field not in self.__slots__:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def timestamps(self):
+        """
+        Returns the timestamps of the window as numpy datetime64[ns] (zero-copy).
+        """
+        return self.datetime.view("datetime64[ns]")
+
+
+class ColumnarBars(object):
+    """
+    The full history of one symbol held column-wise: an int64 timestamp array
+    and one float64 array per field in FIELDS.
+    """
+
+    def __init__(self, symbol, datetime, columns):
+        """
+        Args:
+            symbol (str) - The ticker symbol e.g. 'GOOG'
+            datetime (np.ndarray) - int64 timestamps in nanoseconds
+            columns (dict) - Mapping of field name to a float64 array
+        """
+        self.symbol = symbol
+        self.datetime = datetime
+        self.columns = columns
+
+    @classmethod
+    def from_frame(cls, symbol, frame):
+        """
+        Builds the columnar store from a DataFrame indexed by date with
+        Yahoo style columns (Open, High, Low, Close, Adj Close, Volume).
+
+        Columns are matched case-insensitively with spaces read as underscores.
+        A missing 'Adj Close' falls back to 'Close'.
+        """
+        names = {str(col).strip().lower().replace(" ", "_"): col for col in frame.columns}
+        columns = {}
+        for field in FIELDS:
+            source = names.get(field)
+            if source is None and field == "adj_close":
+                source = names.get("close")
+            if source is None:
+                raise KeyError(f"{symbol} data has no '{field}' column")
+            columns[field] = np.ascontiguousarray(frame[source].to_numpy(dtype=np.float64))
+        index = frame.index.values.astype("datetime64[ns]").view(np.int64)
+        return cls(symbol, np.ascontiguousarray(index), columns)
+
+    def __len__(self):
+        return len(self.datetime)
+
+    def window(self, start, stop):
+        """
+        Returns a BarWindow of zero-copy views for rows [start, stop).
+        """
+        return BarWindow(
+            self.symbol,
+            self.datetime[start:stop],
+            *[self.columns[field][start:stop] for field in FIELDS]
+        )
+
+    def iter_timestamps(self, start=0, block=4096):
+        """
+        Generator of (timestamp, row) pairs from row `start`, converting the
+        timestamps to Python ints a block at a time.
+        """
+        for offset in range(start, len(self.datetime), block):
+            stamps = self.datetime[offset:offset + block].tolist()
+            yield from zip(stamps, range(offset, offset + len(stamps)))
+
+    def row(self, i):
+        """
+        Returns row i as a (timestamp, values) pair where values follows FIELDS.
+        """
+        return self.datetime[i], [self.columns[field][i] for field in FIELDS]
+
+
+class BarBuffer(object):
+    """
+    Columnar history buffer that bars are appended to one at a time.
+
+    With a capacity it is a fixed-size ring buffer: each row is written twice,
+    at i and i + capacity, so the most recent N rows are always contiguous and
+    can be returned as views without copying. Without a capacity the buffer
+    grows geometrically, giving amortised O(1) appends.
+    """
+
+    def __init__(self, symbol, capacity=None, initial_size=1024):
+        """
+        Args:
+            symbol (str) - The ticker symbol e.g. 'GOOG'
+            capacity (int, optional) - Maximum number of rows kept, None for unbounded
+            initial_size (int, optional) - Starting allocation for an unbounded buffer
+        """
+        if capacity is not None and capacity < 1:
+            raise ValueError("capacity must be a positive integer")
+        self.symbol = symbol
+        self.capacity = capacity
+        self.count = 0
+        size = 2 * capacity if capacity is not None else initial_size
+        self._datetime = np.zeros(size, dtype=np.int64)
+        self._columns = {field: np.zeros(size, dtype=np.float64) for field in FIELDS}
+
+    def __len__(self):
+        if self.capacity is None:
+            return self.count
+        return min(self.count, self.capacity)
+
+    def _grow(self):
+        size = 2 * len(self._datetime)
+        self._datetime = np.resize(self._datetime, size)
+        for field in FIELDS:
+            self._columns[field] = np.resize(self._columns[field], size)
+
+    def append(self, timestamp, values):
+        """
+        Appends a single bar.
+
+        Args:
+            timestamp (int) - Timestamp in nanoseconds
+            values (sequence) - Field values in the order of FIELDS
+        """
+        if self.capacity is None:
+            if self.count == len(self._datetime):
+                self._grow()
+            positions = (self.count,)
+        else:
+            i = self.count % self.capacity
+            positions = (i, i + self.capacity)
+        for pos in positions:
+            self._datetime[pos] = timestamp
+            for field, value in zip(FIELDS, values):
+                self._columns[field][pos] = value
+        self.count += 1
+
+    def extend(self, datetime, columns):
+        """
+        Appends a block of bars at once.
+
+        Args:
+            datetime (np.ndarray) - int64 timestamps in nanoseconds
+            columns (dict) - Mapping of field name to an array of the same length
+        """
+        n = len(datetime)
+        if n == 0:
+            return
+        if self.capacity is None:
+            while self.count + n > len(self._datetime):
+                self._grow()
+            self._datetime[self.count:self.count + n] = datetime
+            for field in FIELDS:
+                self._columns[field][self.count:self.count + n] = columns[field]
+            self.count += n
+            return
+        # Only the last `capacity` rows can survive, skip the rest.
+        skip = max(0, n - self.capacity)
+        self.count += skip
+        for j in range(skip, n):
+            self.append(datetime[j], [columns[field][j] for field in FIELDS])
+
+    def latest(self, N=1):
+        """
+        Returns a BarWindow of zero-copy views of the last N (or fewer) rows.
+        """
+        n = min(N, len(self))
+        if self.capacity is None:
+            stop = self.count
+        else:
+            # One past the mirrored copy of the newest row
+            stop = (self.count - 1) % self.capacity + 1 + self.capacity
+        start = stop - n
+        return BarWindow(
+            self.symbol,
+            self._datetime[start:stop],
+            *[self._columns[field][start:stop] for field in FIELDS]
+        )
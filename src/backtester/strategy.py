@@ -1,6 +1,8 @@
 
 from abc import ABCMeta, abstractmethod
 
+import numpy as np
+
 from backtester.event import SignalEvent, MarketEvent
 
 class Strategy():
@@ -13,6 +15,14 @@ class Strategy():
         Abstract method that calculates the list of signals
         '''
         raise NotImplementedError('Strategy child must implement calculate_signals() method')
+
+    def generate_signals(self, history):
+        '''
+        Optional vectorised form of calculate_signals for the VectorizedBacktest:
+        returns a (time x symbol) array of +1 (LONG), -1 (SHORT) or 0 for every
+        bar of an AlignedHistory at once.
+        '''
+        raise NotImplementedError('Strategy child does not support vectorised backtests')
     
 
 class BuyAndHoldStrategy(Strategy):
@@ -50,10 +60,95 @@ class BuyAndHoldStrategy(Strategy):
         '''
         if isinstance(event, MarketEvent):
             for symbol in self.symbol_list:
-                data = self.data.get_latest_data(symbol)[0]
-                if data is not None and len(data) > 0:
-                    signal = SignalEvent(symbol, data[1], 'LONG')
+                if self.bought[symbol]:
+                    continue
+                bars = self.data.get_latest_data(symbol)
+                if bars is not None and len(bars) > 0:
+                    signal = SignalEvent(symbol, bars.timestamps()[-1], 'LONG')
                     self.events.put(signal)
                     self.bought[symbol] = True
 
+    def generate_signals(self, history):
+        '''
+        A single LONG signal for each symbol at its first bar.
+
+        Args:
+            history (AlignedHistory) - The whole history of the data handler
+        '''
+        signals = np.zeros(history.rows.shape, dtype=np.int64)
+        for j in range(len(history.symbol_list)):
+            first = np.flatnonzero(history.rows[:, j] >= 0)
+            if len(first) > 0:
+                signals[first[0], j] = 1
+        return signals
+
         
+
+class MovingAverageCrossStrategy(Strategy):
+    '''
+    Goes LONG when the short simple moving average of the close crosses above the
+    long one, and sends a SHORT signal to close the position when it crosses back
+    below.
+
+    The moving averages come from the data handler's shared indicator registry,
+    so they are updated once per bar however many strategies use them.
+    '''
+
+    def __init__(self, data, events, short_window=50, long_window=100):
+        '''
+        Initialises the moving average cross strategy
+
+        Args:
+            data (obj) - The DataHandler object that provides data information
+            events (obj) - The Event Queue object
+            short_window (int, optional) - Number of bars in the short moving average
+            long_window (int, optional) - Number of bars in the long moving average
+        '''
+        self.data = data
+        self.symbol_list = self.data.symbol_list
+        self.events = events
+        self.short_window = short_window
+        self.long_window = long_window
+
+        self.bought = {symbol: False for symbol in self.symbol_list}
+
+    def calculate_signals(self, event):
+        '''
+        Compares the two moving averages of every symbol and signals on a cross.
+
+        Args:
+            event(obj) - a MarketEvent object.
+        '''
+        if isinstance(event, MarketEvent):
+            for symbol in event.symbols or self.symbol_list:
+                short = self.data.indicators.value(symbol, 'sma', window=self.short_window)
+                long = self.data.indicators.value(symbol, 'sma', window=self.long_window)
+                if not (short > long or short < long):
+                    # Not enough bars yet (NaN) or no cross
+                    continue
+                if short > long and not self.bought[symbol]:
+                    self.events.put(SignalEvent(symbol, event.datetime, 'LONG'))
+                    self.bought[symbol] = True
+                elif short < long and self.bought[symbol]:
+                    self.events.put(SignalEvent(symbol, event.datetime, 'SHORT'))
+                    self.bought[symbol] = False
+
+    def generate_signals(self, history):
+        '''
+        The crosses of the two moving averages, computed on each symbol's own
+        bars and padded onto the shared timeline. The averages come from the
+        history's indicator cache, so on a slice they are already warmed up.
+
+        Args:
+            history (AlignedHistory) - The history of the data handler, or a slice of it
+        '''
+        signals = np.zeros(history.rows.shape, dtype=np.int64)
+        for j, symbol in enumerate(history.symbol_list):
+            short = history.indicator(symbol, 'sma', window=self.short_window)
+            long = history.indicator(symbol, 'sma', window=self.long_window)
+            state = np.where(short > long, 1, np.where(short < long, -1, 0))
+            # Carry the last cross forward through ties and bars before both averages exist
+            last = np.maximum.accumulate(np.where(state != 0, np.arange(len(state)), 0))
+            bought = (state[last] == 1).astype(np.int64)
+            signals[:, j] = np.diff(bought, prepend=0)
+        return signals
@@ -0,0 +1,269 @@
+import itertools
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from backtester.bus import DequeEventBus
+from backtester.data import HistoricCSVDataHandler
+from backtester.execution import SimulatedExecutionHandler
+from backtester.main_loop import backtest
+from backtester.performance import create_summary_metrics
+from backtester.portfolio import NaivePortfolio
+from backtester.store import FIELDS, ColumnarBars
+from backtester.vectorized import VectorizedBacktest
+
+
+class SharedMarketData(object):
+    """
+    The columnar bars of every symbol copied once into a single
+    multiprocessing.shared_memory block, so worker processes can attach to
+    them without copying or re-reading any CSV.
+
+    The owner creates the block with SharedMarketData(symbol_data) and must
+    close() it (or use it as a context manager), which also unlinks it.
+    Workers call attach(descriptor) with the picklable `descriptor`.
+    """
+
+    def __init__(self, symbol_data):
+        """
+        Args:
+            symbol_data (dict) - ColumnarBars per symbol, e.g. a data handler's symbol_data
+        """
+        layout = []
+        offset = 0
+        for symbol, bars in symbol_data.items():
+            layout.append((symbol, offset, len(bars)))
+            offset += 8 * len(bars) * (1 + len(FIELDS))
+        self._shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        self.descriptor = {"name": self._shm.name, "layout": layout}
+        self.symbol_data = self._views(self._shm, layout)
+        for symbol, bars in symbol_data.items():
+            self.symbol_data[symbol].datetime[:] = bars.datetime
+            for field in FIELDS:
+                self.symbol_data[symbol].columns[field][:] = bars.columns[field]
+        self._owner = True
+
+    @staticmethod
+    def _views(shm, layout):
+        symbol_data = {}
+        for symbol, offset, n in layout:
+            datetime = np.ndarray((n,), dtype=np.int64, buffer=shm.buf, offset=offset)
+            columns = {}
+            for i, field in enumerate(FIELDS, 1):
+                columns[field] = np.ndarray((n,), dtype=np.float64, buffer=shm.buf, offset=offset + 8 * n * i)
+            symbol_data[symbol] = ColumnarBars(symbol, datetime, columns)
+        return symbol_data
+
+    @classmethod
+    def attach(cls, descriptor):
+        """
+        Attaches to a block created in another process. The returned object's
+        symbol_data holds zero-copy views onto it.
+        """
+        shared = cls.__new__(cls)
+        shared._shm = shared_memory.SharedMemory(name=descriptor["name"])
+        shared.descriptor = descriptor
+        shared.symbol_data = cls._views(shared._shm, descriptor["layout"])
+        shared._owner = False
+        return shared
+
+    def close(self):
+        """
+        Releases the views and detaches; the owner also unlinks the block.
+        """
+        self.symbol_data = {}
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class BacktestJob(object):
+    """
+    A picklable sweep job running one backtest of a strategy with the given
+    parameters through the event loop, or the vectorised engine.
+
+    Returns the numeric summary metrics of the run (see create_summary_metrics).
+    """
+
+    def __init__(self, strategy_class, initial_capital=100000.0, vectorized=False, periods=252):
+        """
+        Args:
+            strategy_class (type) - Strategy class taking (data, events, **params)
+            initial_capital (float, optional) - The starting capital in USD
+            vectorized (bool, optional) - Use the VectorizedBacktest engine
+            periods (float, optional) - Periods per year for the Sharpe ratio
+        """
+        self.strategy_class = strategy_class
+        self.initial_capital = initial_capital
+        self.vectorized = vectorized
+        self.periods = periods
+
+    def __call__(self, data, params):
+        """
+        Args:
+            data (HistoricCSVDataHandler) - A fresh handler over the shared data
+            params (dict) - Keyword parameters of the strategy
+        """
+        events = data.events
+        strategy = self.strategy_class(data, events, **params)
+        if self.vectorized:
+            curve = VectorizedBacktest(data, strategy, initial_capital=self.initial_capital).run()
+        else:
+            portfolio = NaivePortfolio(data, events, None, initial_capital=self.initial_capital)
+            backtest(events, data, portfolio, strategy, SimulatedExecutionHandler(events))
+            curve = portfolio.equity_curve
+        return create_summary_metrics(curve, self.periods)
+
+
+def parameter_grid(**axes):
+    """
+    Returns the list of parameter dicts for every combination of the given
+    values, e.g. parameter_grid(short_window=[5, 10], long_window=[50, 100]).
+    """
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*axes.values())]
+
+
+# State of a worker process, set once by init_worker
+_worker = {}
+
+
+def init_worker(descriptor, symbol_list, job):
+    """
+    Initialiser of the worker processes of a pool sharing the market data
+    through SharedMarketData: attaches to the shared memory and keeps the job.
+
+    Args:
+        descriptor - The SharedMarketData's descriptor
+        symbol_list (List[str]) - The symbols of the handlers built by worker_data()
+        job (callable) - The job run by the worker, returned by worker_job()
+    """
+    _worker["shared"] = SharedMarketData.attach(descriptor)
+    _worker["symbol_list"] = symbol_list
+    _worker["job"] = job
+
+
+def worker_data():
+    """
+    Returns a fresh HistoricCSVDataHandler over the shared market data, in a
+    worker process started with init_worker.
+    """
+    return HistoricCSVDataHandler(DequeEventBus(), None, _worker["symbol_list"],
+                                  symbol_data=_worker["shared"].symbol_data)
+
+
+def worker_job():
+    """
+    Returns the job of a worker process started with init_worker.
+    """
+    return _worker["job"]
+
+
+def _run_job(params):
+    return worker_job()(worker_data(), params)
+
+
+class SweepRunner(object):
+    """
+    Runs a job for many parameter sets on a process pool. The market data is
+    loaded once and shared with the workers through SharedMarketData, so each
+    job only costs its own computation.
+
+    Results are yielded as each job finishes. With a results_path every
+    finished job is appended to a JSON lines file, and a later run with the
+    same path skips the parameter sets already in it, so a cancelled or
+    crashed sweep can be resumed.
+    """
+
+    def __init__(self, data, job, workers=None, results_path=None, max_pending=None):
+        """
+        Args:
+            data (HistoricCSVDataHandler) - A handler with the market data loaded
+            job (callable) - Picklable job(data, params) returning a JSON-serialisable
+                result, e.g. a BacktestJob; data is a fresh handler for every call
+            workers (int, optional) - Number of worker processes, default os.cpu_count()
+            results_path (str, optional) - JSON lines file used to persist and resume results
+            max_pending (int, optional) - Jobs submitted ahead of the results, default 2 per worker
+        """
+        self.data = data
+        self.job = job
+        self.workers = workers or os.cpu_count() or 1
+        self.results_path = results_path
+        self.max_pending = max_pending or 2 * self.workers
+        self.cancelled = False
+
+    @staticmethod
+    def key(params):
+        return json.dumps(params, sort_keys=True)
+
+    def completed(self):
+        """
+        Returns the results already stored in results_path, keyed by parameters.
+        """
+        results = {}
+        if self.results_path is None or not os.path.exists(self.results_path):
+            return results
+        with open(self.results_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A line cut short when a previous run was killed
+                    continue
+                results[self.key(record["params"])] = record["result"]
+        return results
+
+    def cancel(self):
+        """
+        Stops submitting jobs; the running ones are finished and yielded.
+        """
+        self.cancelled = True
+
+    def run(self, param_sets):
+        """
+        Runs the job for every parameter set not already completed.
+
+        Args:
+            param_sets (iterable) - Parameter dicts, e.g. from parameter_grid()
+
+        Yields:
+            (params, result) pairs in completion order.
+        """
+        self.cancelled = False
+        done = self.completed()
+        todo = iter([params for params in param_sets if self.key(params) not in done])
+        out = open(self.results_path, "a") if self.results_path is not None else None
+        shared = SharedMarketData(self.data.symbol_data)
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                     initargs=(shared.descriptor, list(self.data.symbol_list), self.job)) as pool:
+                pending = {}
+                while True:
+                    while not self.cancelled and len(pending) < self.max_pending:
+                        params = next(todo, None)
+                        if params is None:
+                            break
+                        pending[pool.submit(_run_job, params)] = params
+                    if not pending:
+                        break
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        params = pending.pop(future)
+                        result = future.result()
+                        if out is not None:
+                            out.write(json.dumps({"params": params, "result": result}) + "\n")
+                            out.flush()
+                        yield params, result
+        finally:
+            if out is not None:
+                out.close()
+            shared.close()
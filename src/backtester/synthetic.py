@@ -0,0 +1,115 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from backtester.store import ColumnarBars
+
+
+def generate_bars(symbol, bars, start="2015-01-01", freq="1D", seed=None, price=100.0,
+                  volatility=0.01, drift=0.0, gaps=0.0, shift=None):
+    """
+    Generates a random walk of OHLCV bars on a regular calendar.
+
+    The close follows a geometric random walk, each bar opens at the previous
+    close and its high and low extend past the open and close by a random
+    fraction of the volatility.
+
+    Args:
+        symbol (str) - The ticker symbol of the bars
+        bars (int) - Number of bars
+        start (optional) - Timestamp of the first slot of the calendar
+        freq (str, optional) - A fixed-width pandas timeframe, e.g. '1min' or '1D'
+        seed (int or SeedSequence, optional) - Seed of the random stream
+        price (float, optional) - The first open
+        volatility (float, optional) - Standard deviation of the log returns
+        drift (float, optional) - Mean of the log returns
+        gaps (float, optional) - Probability of each slot of the calendar being
+            skipped, e.g. for missing bars or closed sessions
+        shift (optional) - A timedelta added to every timestamp, to put symbols
+            on calendars that do not line up
+
+    Returns:
+        ColumnarBars.
+    """
+    rng = np.random.default_rng(seed)
+    width = pd.Timedelta(freq).value
+    origin = pd.Timestamp(start).value + (pd.Timedelta(shift).value if shift is not None else 0)
+    if gaps > 0.0:
+        # Enough slots that dropping a fraction `gaps` of them leaves `bars`
+        slots = int(bars / (1.0 - gaps) * 1.05) + 16
+        kept = np.flatnonzero(rng.random(slots) >= gaps)
+        while len(kept) < bars:
+            kept = np.concatenate((kept, kept[-1] + 1 + np.flatnonzero(rng.random(slots) >= gaps)))
+        slots = kept[:bars]
+    else:
+        slots = np.arange(bars)
+    datetime = origin + slots.astype(np.int64) * width
+
+    close = price * np.exp(np.cumsum(rng.normal(drift, volatility, bars)))
+    open_ = np.concatenate(([price], close[:-1]))
+    spread = np.abs(rng.normal(0.0, volatility / 2.0, (2, bars)))
+    columns = {
+        "open": open_,
+        "high": np.maximum(open_, close) * (1.0 + spread[0]),
+        "low": np.minimum(open_, close) * (1.0 - spread[1]),
+        "close": close,
+        "adj_close": close.copy(),
+        "volume": np.floor(rng.lognormal(13.0, 1.0, bars)),
+    }
+    return ColumnarBars(symbol, datetime, columns)
+
+
+def generate_universe(symbols, bars, freq="1D", start="2015-01-01", seed=None, gaps=0.0,
+                      misaligned=False, **kwargs):
+    """
+    Generates independent random walks for many symbols.
+
+    Args:
+        symbols (int or List[str]) - Symbol names, or a number of symbols named
+            SYM00000, SYM00001, ...
+        bars (int) - Number of bars per symbol
+        freq, start, gaps - See generate_bars
+        seed (int, optional) - Seed of the whole universe, every symbol draws
+            from its own stream spawned from it
+        misaligned (bool, optional) - Start every symbol up to a tenth of the
+            bars late and shift its calendar by 0, 1/4, 1/2 or 3/4 of a bar, so
+            the calendars only partly overlap
+        kwargs - Passed on to generate_bars, e.g. volatility
+
+    Returns:
+        A dict of ColumnarBars per symbol, in order.
+    """
+    if isinstance(symbols, int):
+        symbols = [f"SYM{i:05d}" for i in range(symbols)]
+    seeds = np.random.SeedSequence(seed).spawn(len(symbols))
+    width = pd.Timedelta(freq)
+    universe = {}
+    for symbol, symbol_seed in zip(symbols, seeds):
+        shift = None
+        if misaligned:
+            rng = np.random.default_rng(symbol_seed.spawn(1)[0])
+            shift = width * int(rng.integers(0, bars // 10 + 1)) + width * int(rng.integers(0, 4)) / 4
+        universe[symbol] = generate_bars(symbol, bars, start=start, freq=freq, seed=symbol_seed,
+                                         gaps=gaps, shift=shift, **kwargs)
+    return universe
+
+
+def write_csv(bars, csv_dir):
+    """
+    Writes bars as 'symbol.csv' in the Yahoo format read by HistoricCSVDataHandler.
+
+    Returns:
+        The path of the file.
+    """
+    frame = pd.DataFrame({
+        "Open": bars.columns["open"],
+        "High": bars.columns["high"],
+        "Low": bars.columns["low"],
+        "Close": bars.columns["close"],
+        "Adj Close": bars.columns["adj_close"],
+        "Volume": bars.columns["volume"].astype(np.int64),
+    }, index=pd.DatetimeIndex(bars.datetime.view("datetime64[ns]"), name="Date"))
+    path = os.path.join(csv_dir, bars.symbol + ".csv")
+    frame.to_csv(path)
+    return path
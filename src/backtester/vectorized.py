@@ -0,0 +1,247 @@
+import numpy as np
+import pandas as pd
+
+from backtester.bus import DequeEventBus
+from backtester.data import HistoricCSVDataHandler
+from backtester.execution import SimulatedExecutionHandler
+from backtester.indicators import IndicatorRegistry
+from backtester.main_loop import backtest
+from backtester.portfolio import NaivePortfolio
+from backtester.store import FIELDS
+
+
+def ib_commission(quantity, fill_cost=None):
+    """
+    Vectorised form of FillEvent.calculate_ib_commission: the Interactive
+    Brokers fee for each traded quantity, zero where nothing was traded.
+
+    Args:
+        quantity (np.ndarray) - Absolute traded quantities
+        fill_cost (np.ndarray, optional) - Fill prices, the fee is capped at 0.5%
+            of the trade value where given (as FillEvent does when it has a price)
+    """
+    quantity = np.asarray(quantity, dtype=np.float64)
+    cost = np.where(quantity <= 500, np.maximum(1.3, 0.013 * quantity), np.maximum(1.3, 0.008 * quantity))
+    if fill_cost is not None:
+        cost = np.minimum(cost, 0.5 / 100.0 * quantity * fill_cost)
+    return np.where(quantity > 0, cost, 0.0)
+
+
+class AlignedHistory(object):
+    """
+    The whole history of a data handler lined up on the union of the symbols'
+    timestamps, as the event loop sees it with 'pad' alignment: every field is a
+    (time x symbol) matrix padded forward, NaN before a symbol's first bar.
+
+    The per-symbol bars on their own calendars are kept in `bars`, and `rows`
+    maps each union timestamp to the row of a symbol's own bars (-1 before the
+    first), so strategies can compute on a symbol's own bars and then pad().
+    """
+
+    def __init__(self, data):
+        """
+        Args:
+            data (HistoricCSVDataHandler) - A handler whose symbol_data is loaded
+        """
+        self.symbol_list = list(data.symbol_list)
+        self.bars = {symbol: data.symbol_data[symbol] for symbol in self.symbol_list}
+        self.datetime = np.unique(np.concatenate([self.bars[s].datetime for s in self.symbol_list]))
+        self.rows = np.column_stack([
+            np.searchsorted(self.bars[symbol].datetime, self.datetime, side="right") - 1
+            for symbol in self.symbol_list
+        ])
+        self.columns = {field: self.pad_all(field) for field in FIELDS}
+        self._indicators = {}
+
+    def slice(self, start, stop):
+        """
+        Returns the history of bars [start, stop) of the timeline as views.
+
+        The slice shares the per-symbol bars and the indicator cache with this
+        history, so indicators used on overlapping slices are computed once,
+        over the full history, and are already warmed up at the slice start.
+        """
+        sliced = AlignedHistory.__new__(AlignedHistory)
+        sliced.symbol_list = self.symbol_list
+        sliced.bars = self.bars
+        sliced.datetime = self.datetime[start:stop]
+        sliced.rows = self.rows[start:stop]
+        sliced.columns = {field: column[start:stop] for field, column in self.columns.items()}
+        sliced._indicators = self._indicators
+        return sliced
+
+    def indicator(self, symbol, name, **params):
+        """
+        Returns an indicator (see IndicatorRegistry.INDICATORS) computed on a
+        symbol's own bars and padded onto this history's timeline. The series
+        is computed over the symbol's full history once and cached.
+        """
+        key = IndicatorRegistry.key(symbol, name, **params)
+        series = self._indicators.get(key)
+        if series is None:
+            bars = self.bars[symbol]
+            series = IndicatorRegistry.INDICATORS[name](**params).warm_up(bars.window(0, len(bars)))
+            self._indicators[key] = series
+        return self.pad(symbol, series)
+
+    def pad(self, symbol, values):
+        """
+        Pads an array computed on a symbol's own bars onto the union timeline.
+        """
+        rows = self.rows[:, self.symbol_list.index(symbol)]
+        padded = np.asarray(values, dtype=np.float64)[np.maximum(rows, 0)]
+        padded[rows < 0] = np.nan
+        return padded
+
+    def pad_all(self, field):
+        """
+        Returns a field as a padded (time x symbol) matrix.
+        """
+        return np.column_stack([self.pad(symbol, self.bars[symbol].columns[field])
+                                for symbol in self.symbol_list])
+
+    def __len__(self):
+        return len(self.datetime)
+
+
+class VectorizedBacktest(object):
+    """
+    Runs a strategy over the whole history at once in NumPy, with the same
+    rules as the event loop with a NaivePortfolio and SimulatedExecutionHandler:
+
+        - a LONG (+1) signal buys and a SHORT (-1) signal sells `quantity` shares,
+          filled at the close of the signal bar with IB commission,
+        - each bar's holdings are the positions held before that bar's fills
+          marked to its close.
+
+    The strategy supplies generate_signals(history) returning a (time x symbol)
+    array of +1/-1/0 for an AlignedHistory.
+    """
+
+    def __init__(self, data, strategy, start_date=None, initial_capital=100000.0, quantity=100):
+        """
+        Args:
+            data (HistoricCSVDataHandler or AlignedHistory) - The data handler with
+                loaded history, or its (sliced) AlignedHistory
+            strategy (Strategy) - A strategy implementing generate_signals()
+            start_date (optional) - The datestamp of the initial holdings row
+            initial_capital (float, optional) - The starting capital in USD
+            quantity (int, optional) - Shares traded per signal
+        """
+        self.history = data if isinstance(data, AlignedHistory) else AlignedHistory(data)
+        self.strategy = strategy
+        self.start_date = start_date
+        self.initial_capital = initial_capital
+        self.quantity = quantity
+
+    def run(self):
+        """
+        Computes positions, fills, commission, holdings and the equity curve.
+
+        Returns:
+            The equity curve DataFrame, with the columns of NaivePortfolio's.
+        """
+        history = self.history
+        close = history.columns["close"]
+        signals = np.asarray(self.strategy.generate_signals(history), dtype=np.int64)
+
+        trades = signals * self.quantity
+        positions = np.cumsum(trades, axis=0)
+        commission = ib_commission(np.abs(trades)).sum(axis=1)
+        cash_flow = np.where(trades != 0, trades * close, 0.0).sum(axis=1) + commission
+
+        # Row t holds the positions and cash from before the fills at t
+        held = np.vstack([np.zeros((1, len(history.symbol_list)), dtype=np.int64), positions[:-1]])
+        market_value = np.where(held != 0, held * close, 0.0)
+        cash = self.initial_capital - np.concatenate(([0.0], np.cumsum(cash_flow)[:-1]))
+        paid = np.concatenate(([0.0], np.cumsum(commission)[:-1]))
+
+        curve = pd.DataFrame(market_value, columns=history.symbol_list)
+        curve["datestamp"] = history.datetime.view("datetime64[ns]")
+        curve["cash"] = cash
+        curve["commission"] = paid
+        curve["total"] = cash + market_value.sum(axis=1)
+
+        initial = {symbol: 0 for symbol in history.symbol_list}
+        initial.update(datestamp=self.start_date, cash=self.initial_capital,
+                       commission=0.0, total=self.initial_capital)
+        curve = pd.concat([pd.DataFrame([initial]), curve], ignore_index=True)
+        curve.set_index("datestamp", inplace=True)
+        curve["returns"] = curve["total"].pct_change()
+        curve["equity_curve"] = (1.0 + curve["returns"]).cumprod()
+
+        self.signals = signals
+        self.positions = positions
+        self.equity_curve = curve
+        return curve
+
+    def output_summary_stats(self):
+        """
+        The same summary statistics as NaivePortfolio.output_summary_stats().
+        """
+        return NaivePortfolio.output_summary_stats(self)
+
+
+class ParityReport(object):
+    """
+    The differences between the equity curves of the event-driven and the
+    vectorised engines for the same strategy and data.
+    """
+
+    def __init__(self, event_curve, vector_curve, rtol, atol):
+        self.event_curve = event_curve
+        self.vector_curve = vector_curve
+        columns = [c for c in event_curve.columns if c not in ("returns", "equity_curve")]
+        expected = event_curve[columns].to_numpy(dtype=np.float64)
+        actual = vector_curve[columns].to_numpy(dtype=np.float64)
+        if expected.shape != actual.shape:
+            raise ValueError(f"Equity curves have different shapes {expected.shape} and {actual.shape}")
+        close = np.isclose(actual, expected, rtol=rtol, atol=atol, equal_nan=True)
+        rows = ~close.all(axis=1)
+        # Divergent rows, with the difference of each column (vector - event)
+        self.divergences = pd.DataFrame(actual[rows] - expected[rows],
+                                        index=event_curve.index[rows], columns=columns)
+        self.max_abs_difference = pd.Series(np.nanmax(np.abs(actual - expected), axis=0), index=columns)
+
+    @property
+    def ok(self):
+        return self.divergences.empty
+
+    def __repr__(self):
+        if self.ok:
+            return "ParityReport(ok)"
+        return (f"ParityReport({len(self.divergences)} divergent bars, first at "
+                f"{self.divergences.index[0]}, max abs differences:\n{self.max_abs_difference})")
+
+
+def check_parity(csv_dir, symbol_list, strategy_class, strategy_kwargs=None,
+                 initial_capital=100000.0, rtol=1e-9, atol=1e-6):
+    """
+    Runs a strategy through both the event loop and the vectorised engine on the
+    same data and reports any divergence in the equity curve.
+
+    Args:
+        csv_dir (str) - Directory containing the 'symbol.csv' files
+        symbol_list (List[str]) - A list of symbol strings
+        strategy_class (type) - Strategy class taking (data, events, **strategy_kwargs)
+            and implementing both calculate_signals() and generate_signals()
+        strategy_kwargs (dict, optional) - Parameters of the strategy
+        initial_capital (float, optional) - The starting capital in USD
+        rtol, atol (float, optional) - Tolerances for the comparison
+
+    Returns:
+        A ParityReport.
+    """
+    strategy_kwargs = strategy_kwargs or {}
+
+    events = DequeEventBus()
+    data = HistoricCSVDataHandler(events, csv_dir, symbol_list)
+    portfolio = NaivePortfolio(data, events, None, initial_capital=initial_capital)
+    strategy = strategy_class(data, events, **strategy_kwargs)
+    backtest(events, data, portfolio, strategy, SimulatedExecutionHandler(events))
+
+    vector_data = HistoricCSVDataHandler(DequeEventBus(), csv_dir, symbol_list)
+    engine = VectorizedBacktest(vector_data, strategy_class(vector_data, DequeEventBus(), **strategy_kwargs),
+                                initial_capital=initial_capital)
+    engine.run()
+    return ParityReport(portfolio.equity_curve, engine.equity_curve, rtol, atol)
@@ -0,0 +1,247 @@
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from backtester.performance import create_summary_metrics
+from backtester.sweep import SharedMarketData, init_worker, worker_data, worker_job
+from backtester.vectorized import AlignedHistory, VectorizedBacktest
+
+
+class Window(object):
+    """
+    One walk-forward window: the rows [train_start, train_stop) of the timeline
+    are in-sample and [train_stop, test_stop) out-of-sample.
+    """
+
+    __slots__ = ("index", "train_start", "train_stop", "test_stop")
+
+    def __init__(self, index, train_start, train_stop, test_stop):
+        self.index = index
+        self.train_start = train_start
+        self.train_stop = train_stop
+        self.test_stop = test_stop
+
+    def __eq__(self, other):
+        return isinstance(other, Window) and self.bounds() == other.bounds()
+
+    def __repr__(self):
+        return f"Window({self.index}, train=[{self.train_start}, {self.train_stop}), test=[{self.train_stop}, {self.test_stop}))"
+
+    def bounds(self):
+        return (self.index, self.train_start, self.train_stop, self.test_stop)
+
+
+def walk_forward_windows(datetime, train, test, step=None, anchored=False):
+    """
+    Slices a timeline into consecutive walk-forward windows. Every window is
+    followed by its out-of-sample slice, and the next window starts `step`
+    later; the last out-of-sample slice is cut short at the end of the data.
+
+    Args:
+        datetime (np.ndarray) - The timeline, int64 nanoseconds in time order
+        train (int or str) - Length of the in-sample slice, in bars or as a
+            pandas timedelta such as '365D'
+        test (int or str) - Length of the out-of-sample slice, as train
+        step (int or str, optional) - Offset between windows, default test so
+            the out-of-sample slices follow each other without overlapping
+        anchored (bool, optional) - Start every in-sample slice at the first bar
+            (an expanding window) instead of rolling it forward
+
+    Returns:
+        A list of Window with row bounds into the timeline.
+    """
+    step = test if step is None else step
+    if isinstance(train, (int, np.integer)):
+        end = len(datetime)
+        position = lambda offset: min(offset, end)
+    else:
+        train, test, step = (pd.Timedelta(length).value for length in (train, test, step))
+        start = int(datetime[0]) if len(datetime) else 0
+        end = int(datetime[-1]) - start + 1 if len(datetime) else 0
+        position = lambda offset: int(np.searchsorted(datetime, start + offset, side="left"))
+    if train <= 0 or test <= 0 or step <= 0:
+        raise ValueError("train, test and step must be positive")
+
+    windows = []
+    offset = 0
+    while offset + train < end:
+        train_start = 0 if anchored else position(offset)
+        train_stop = position(offset + train)
+        test_stop = position(offset + train + test)
+        if test_stop > train_stop:
+            windows.append(Window(len(windows), train_start, train_stop, test_stop))
+        offset += step
+    return windows
+
+
+class WindowOptimizer(object):
+    """
+    A picklable job optimising one walk-forward window: every parameter set is
+    backtested on the in-sample slice with the vectorised engine, and the best
+    one by the objective is then evaluated on the out-of-sample slice.
+    """
+
+    def __init__(self, strategy_class, param_sets, objective="sharpe_ratio",
+                 initial_capital=100000.0, periods=252):
+        """
+        Args:
+            strategy_class (type) - Strategy class taking (data, events, **params)
+                and implementing generate_signals()
+            param_sets (List[dict]) - Candidate parameters, e.g. from parameter_grid()
+            objective (str or callable, optional) - The metric of create_summary_metrics
+                to maximise, or a function of the metrics dict returning the score
+            initial_capital (float, optional) - The starting capital in USD
+            periods (float, optional) - Periods per year for the Sharpe ratio
+        """
+        self.strategy_class = strategy_class
+        self.param_sets = list(param_sets)
+        self.objective = objective
+        self.initial_capital = initial_capital
+        self.periods = periods
+
+    def score(self, metrics):
+        score = self.objective(metrics) if callable(self.objective) else metrics[self.objective]
+        # A run without trades has a NaN Sharpe ratio and must never win
+        return -math.inf if score is None or math.isnan(score) else score
+
+    def backtest(self, data, history, params):
+        strategy = self.strategy_class(data, data.events, **params)
+        return VectorizedBacktest(history, strategy, initial_capital=self.initial_capital).run()
+
+    def __call__(self, data, history, window):
+        """
+        Args:
+            data (HistoricCSVDataHandler) - The handler the strategies are built with
+            history (AlignedHistory) - The full history, sliced for the window
+            window (Window) - The window to optimise
+
+        Returns:
+            A dict with the window bounds as timestamps, the chosen params, the
+            in-sample and out-of-sample metrics and the out-of-sample returns.
+        """
+        in_sample = history.slice(window.train_start, window.train_stop)
+        best, best_metrics, best_score = None, None, -math.inf
+        for params in self.param_sets:
+            metrics = create_summary_metrics(self.backtest(data, in_sample, params), self.periods)
+            score = self.score(metrics)
+            if best is None or score > best_score:
+                best, best_metrics, best_score = params, metrics, score
+
+        curve = self.backtest(data, history.slice(window.train_stop, window.test_stop), best)
+        timeline = history.datetime.view("datetime64[ns]")
+        return {
+            "window": window.index,
+            "train_start": timeline[window.train_start],
+            "test_start": timeline[window.train_stop],
+            "test_stop": timeline[window.test_stop - 1],
+            "params": best,
+            "in_sample": best_metrics,
+            "out_of_sample": create_summary_metrics(curve, self.periods),
+            "returns": curve["returns"].iloc[1:],
+        }
+
+
+# Handler and aligned history of a walk-forward worker process, built for its first windows
+_history = {}
+
+
+def _run_windows(windows):
+    # One aligned history per worker, so the windows it runs share its indicator cache
+    if "history" not in _history:
+        _history["data"] = worker_data()
+        _history["history"] = AlignedHistory(_history["data"])
+    optimizer = worker_job()
+    return [optimizer(_history["data"], _history["history"], window) for window in windows]
+
+
+class WalkForwardResult(object):
+    """
+    The records of every window of a walk-forward run, in time order, and the
+    out-of-sample returns of all the windows stitched into one equity curve.
+    """
+
+    def __init__(self, records):
+        self.records = sorted(records, key=lambda record: record["window"])
+        returns = [record["returns"] for record in self.records]
+        self.returns = pd.concat(returns) if returns else pd.Series(dtype=np.float64)
+        self.equity_curve = pd.DataFrame({"returns": self.returns,
+                                          "equity_curve": (1.0 + self.returns).cumprod()})
+
+    def __len__(self):
+        return len(self.records)
+
+    def summary(self, N=252):
+        """
+        The summary metrics of the stitched out-of-sample equity curve.
+        """
+        return create_summary_metrics(self.equity_curve, N)
+
+    def to_frame(self):
+        """
+        One row per window with its parameters and out-of-sample metrics.
+        """
+        rows = []
+        for record in self.records:
+            row = {key: record[key] for key in ("window", "train_start", "test_start", "test_stop")}
+            row.update(record["params"])
+            row.update({f"is_{key}": value for key, value in record["in_sample"].items()})
+            row.update({f"oos_{key}": value for key, value in record["out_of_sample"].items()})
+            rows.append(row)
+        return pd.DataFrame(rows).set_index("window")
+
+
+class WalkForward(object):
+    """
+    Rolling in-sample optimisation and out-of-sample evaluation of a strategy.
+
+    The history is aligned once and every window is a zero-copy slice of it.
+    Indicators are computed once per symbol and parameters over the whole
+    history and shared by all the windows run in the same process, which also
+    means they are already warmed up at the start of every slice.
+
+    Windows are independent, so with several workers they are split into
+    contiguous chunks run on a process pool over SharedMarketData; each worker
+    keeps its aligned history and indicator cache across its chunks.
+    """
+
+    def __init__(self, data, strategy_class, param_sets, train, test, step=None, anchored=False,
+                 objective="sharpe_ratio", initial_capital=100000.0, periods=252, workers=1):
+        """
+        Args:
+            data (HistoricCSVDataHandler) - A handler with the market data loaded
+            strategy_class (type) - Strategy class taking (data, events, **params)
+                and implementing generate_signals()
+            param_sets (List[dict]) - Candidate parameters, e.g. from parameter_grid()
+            train, test, step, anchored - The windows, see walk_forward_windows()
+            objective (str or callable, optional) - See WindowOptimizer
+            initial_capital (float, optional) - The starting capital in USD
+            periods (float, optional) - Periods per year for the Sharpe ratio
+            workers (int, optional) - Number of worker processes, 1 runs in this process
+        """
+        self.data = data
+        self.history = AlignedHistory(data)
+        self.windows = walk_forward_windows(self.history.datetime, train, test, step, anchored)
+        self.optimizer = WindowOptimizer(strategy_class, param_sets, objective, initial_capital, periods)
+        self.workers = workers
+
+    def run(self):
+        """
+        Optimises and evaluates every window.
+
+        Returns:
+            A WalkForwardResult.
+        """
+        if self.workers <= 1 or len(self.windows) <= 1:
+            return WalkForwardResult([self.optimizer(self.data, self.history, window) for window in self.windows])
+
+        size = -(-len(self.windows) // self.workers)
+        chunks = [self.windows[i:i + size] for i in range(0, len(self.windows), size)]
+        records = []
+        with SharedMarketData(self.data.symbol_data) as shared:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                     initargs=(shared.descriptor, list(self.data.symbol_list), self.optimizer)) as pool:
+                for chunk in pool.map(_run_windows, chunks):
+                    records.extend(chunk)
+        return WalkForwardResult(records)
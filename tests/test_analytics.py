@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtester.analytics import STATISTICS, BatchAnalytics, rolling_sharpe
+from backtester.performance import create_drawdowns, create_sharpe_ratio
+
+
+def returns_matrix(periods=500, runs=37, seed=0):
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(rng.normal(0.0005, 0.0005, runs), 0.01, (periods, runs))
+    returns[rng.random((periods, runs)) < 0.2] = 0.0
+    return returns
+
+def test_statistics_match_the_single_series_functions():
+    returns = returns_matrix()
+    statistics = BatchAnalytics(returns, chunk_size=8).statistics
+    assert list(statistics.columns) == list(STATISTICS)
+    assert len(statistics) == returns.shape[1]
+    for run in (0, 9, 36):
+        r = pd.Series(returns[:, run])
+        equity = (1.0 + r).cumprod()
+        row = statistics.loc[run]
+        assert row["total_return"] == pytest.approx(equity.iloc[-1] - 1.0)
+        assert row["cagr"] == pytest.approx(equity.iloc[-1] ** (252 / len(r)) - 1.0)
+        assert row["sharpe_ratio"] == pytest.approx(create_sharpe_ratio(r))
+        max_dd, duration = create_drawdowns(pd.concat([pd.Series([np.nan]), equity], ignore_index=True))
+        assert (row["max_drawdown"], row["drawdown_duration"]) == pytest.approx((max_dd, duration))
+        assert row["calmar_ratio"] == pytest.approx(row["cagr"] / max_dd)
+        assert row["hit_rate"] == pytest.approx((r > 0).sum() / (r != 0).sum())
+        rolling = r.rolling(63).mean() / r.rolling(63).std(ddof=0) * np.sqrt(252)
+        assert row["rolling_sharpe_min"] == pytest.approx(rolling.min())
+        assert row["rolling_sharpe_median"] == pytest.approx(rolling.median())
+
+def test_chunking_does_not_change_the_result():
+    returns = returns_matrix(runs=50)
+    pd.testing.assert_frame_equal(BatchAnalytics(returns, chunk_size=7).statistics,
+                                  BatchAnalytics(returns, chunk_size=1000).statistics)
+
+def test_equity_curves_rank_and_filter():
+    returns = returns_matrix(runs=20)
+    labels = [f"run{i}" for i in range(20)]
+    curves = pd.DataFrame(100000.0 * np.cumprod(np.vstack([np.ones(20), 1.0 + returns]), axis=0),
+                          columns=labels)
+    curves.iloc[:, 3] = 100000.0
+    analytics = BatchAnalytics.from_equity_curves(curves)
+    statistics = analytics.statistics
+    assert np.isnan(statistics.loc["run3", "sharpe_ratio"])
+
+    ranked = analytics.rank()
+    assert ranked.index[-1] == "run3"
+    assert (np.diff(ranked["sharpe_ratio"].to_numpy()[:-1]) <= 0).all()
+    pd.testing.assert_frame_equal(analytics.rank(top=5), ranked.iloc[:5])
+    pd.testing.assert_frame_equal(analytics.rank("max_drawdown", top=3, ascending=True),
+                                  statistics.sort_values("max_drawdown", kind="stable").iloc[:3])
+
+    kept = analytics.filter(sharpe_ratio=(0.5, None), max_drawdown=(None, 0.1))
+    assert ((kept["sharpe_ratio"] >= 0.5) & (kept["max_drawdown"] <= 0.1)).all()
+    assert len(kept) == ((statistics["sharpe_ratio"] >= 0.5) & (statistics["max_drawdown"] <= 0.1)).sum()
+
+def test_rolling_sharpe_is_empty_when_shorter_than_the_window():
+    assert rolling_sharpe(np.zeros((10, 3)), window=20).shape == (0, 3)
+
+def test_rolling_sharpe_stays_accurate_over_long_runs():
+    rng = np.random.default_rng(7)
+    returns = rng.normal(0.0005, 0.01, (90000, 2))
+    returns[-5000:, 1] = 0.0003
+    ratios = rolling_sharpe(returns, window=200, block=1000)
+    expected = pd.DataFrame(returns).rolling(200)
+    expected = (expected.mean() / expected.std(ddof=0) * np.sqrt(252)).to_numpy()[199:]
+    np.testing.assert_allclose(ratios[:, 0], expected[:, 0], rtol=1e-9)
+    # A flat stretch has no variance, not a huge finite ratio
+    assert not np.isfinite(ratios[-4800:, 1]).any()
@@ -0,0 +1,87 @@
+import os
+
+from backtester.bus import DequeEventBus, Dispatcher, ThreadSafeEventBus, TimedEventBus, default_dispatcher
+from backtester.data import HistoricCSVDataHandler
+from backtester.event import Event, EventPool, FillEvent, MarketEvent, SignalEvent
+from backtester.execution import SimulatedExecutionHandler
+from backtester.main_loop import backtest
+from backtester.portfolio import NaivePortfolio
+from backtester.strategy import BuyAndHoldStrategy
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+
+
+def test_buses_are_fifo_and_return_none_when_empty():
+    for bus in (DequeEventBus(), ThreadSafeEventBus()):
+        first, second = MarketEvent(), MarketEvent()
+        bus.put(first)
+        bus.put(second)
+
+        assert bus.qsize() == 2
+        assert bus.get() is first
+        assert bus.get() is second
+        assert bus.get() is None
+        assert bus.empty()
+
+def test_dispatcher_fans_out_to_every_subscriber():
+    received = []
+    dispatcher = Dispatcher()
+    dispatcher.subscribe(MarketEvent, lambda event: received.append(("first", event.type)))
+    dispatcher.subscribe(MarketEvent, lambda event: received.append(("second", event.type)))
+    dispatcher.subscribe(Event, lambda event: received.append(("any", event.type)))
+
+    dispatcher.dispatch(MarketEvent())
+    dispatcher.dispatch(SignalEvent("AAPL", None, "LONG"))
+
+    assert received == [("first", "MARKET"), ("second", "MARKET"), ("any", "MARKET"), ("any", "SIGNAL")]
+
+def test_backtest_runs_buy_and_hold_end_to_end():
+    events = DequeEventBus()
+    data = HistoricCSVDataHandler(events, DATA_DIR, ["BTC-USD"])
+    data.market_pool = EventPool(MarketEvent)
+    portfolio = NaivePortfolio(data, events, None, initial_capital=100000.0)
+    strategy = BuyAndHoldStrategy(data, events)
+    broker = SimulatedExecutionHandler(events)
+
+    stats = backtest(events, data, portfolio, strategy, broker)
+
+    assert [name for name, _ in stats] == ["Total Return", "Sharpe Ratio", "Max Drawdown", "Drawdown Duration"]
+    assert portfolio.current_positions["BTC-USD"] == 100
+    assert len(portfolio.all_holdings) == len(data.symbol_data["BTC-USD"]) + 1
+
+def test_timed_bus_delivers_in_timestamp_order():
+    bus = TimedEventBus(now=100)
+    late, early, now = MarketEvent(), MarketEvent(), MarketEvent()
+    bus.schedule(late, 10**12)
+    bus.schedule(early, 200)
+    bus.put(now)
+
+    assert bus.get() is now
+    assert bus.get(until=150) is None
+    assert bus.get() is early and bus.now == 200
+    # A long quiet interval is a single jump
+    assert bus.get() is late and bus.now == 10**12
+
+def run_with_latency(fill_latency):
+    events = TimedEventBus()
+    data = HistoricCSVDataHandler(events, DATA_DIR, ["BTC-USD"])
+    portfolio = NaivePortfolio(data, events, None)
+    strategy = BuyAndHoldStrategy(data, events)
+    broker = SimulatedExecutionHandler(events, route_latency="10ms", ack_latency="5ms",
+                                       fill_latency=fill_latency)
+    fills = []
+    dispatcher = default_dispatcher(strategy, portfolio, broker)
+    dispatcher.subscribe(FillEvent, fills.append)
+    backtest(events, data, portfolio, strategy, broker, dispatcher)
+    return portfolio, fills
+
+def test_fill_latency_is_simulated_between_bars():
+    portfolio, fills = run_with_latency("1h")
+    assert str(fills[0].timeindex) == "2015-01-01T01:00:00.010000000"
+    # Filled before the second bar, so it is marked to market at the second bar
+    assert portfolio.all_positions[2]["BTC-USD"] == 100
+
+    portfolio, fills = run_with_latency("36h")
+    assert str(fills[0].timeindex) == "2015-01-02T12:00:00.010000000"
+    assert portfolio.all_positions[2]["BTC-USD"] == 0
+    assert portfolio.all_positions[3]["BTC-USD"] == 100
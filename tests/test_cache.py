@@ -0,0 +1,59 @@
+import os
+import queue
+import shutil
+
+import numpy as np
+
+from backtester.cache import SymbolCache
+from backtester.data import HistoricCSVDataHandler
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+
+
+def copy_symbol(tmp_path, symbol="BTC-USD", target=None):
+    csv_dir = tmp_path / "csv"
+    csv_dir.mkdir(exist_ok=True)
+    target = target or symbol
+    shutil.copy(os.path.join(DATA_DIR, symbol + ".csv"), csv_dir / (target + ".csv"))
+    return csv_dir
+
+def test_cached_load_is_memory_mapped_and_identical(tmp_path):
+    csv_dir = copy_symbol(tmp_path)
+    cache = SymbolCache(str(tmp_path / "cache"))
+
+    cold = HistoricCSVDataHandler(queue.Queue(), str(csv_dir), ["BTC-USD"], cache=cache)
+    warm = HistoricCSVDataHandler(queue.Queue(), str(csv_dir), ["BTC-USD"],
+                                  cache=SymbolCache(str(tmp_path / "cache")))
+
+    close = warm.symbol_data["BTC-USD"].columns["close"]
+    assert isinstance(close, np.memmap)
+    np.testing.assert_array_equal(close, cold.symbol_data["BTC-USD"].columns["close"])
+    np.testing.assert_array_equal(warm.symbol_data["BTC-USD"].datetime,
+                                  cold.symbol_data["BTC-USD"].datetime)
+
+def test_changed_source_invalidates_entry(tmp_path):
+    csv_dir = copy_symbol(tmp_path)
+    path = str(csv_dir / "BTC-USD.csv")
+    cache = SymbolCache(str(tmp_path / "cache"))
+    HistoricCSVDataHandler(queue.Queue(), str(csv_dir), ["BTC-USD"], cache=cache)
+    assert cache.load(path, "BTC-USD") is not None
+
+    with open(path) as f:
+        lines = f.readlines()
+    with open(path, "w") as f:
+        f.writelines(lines[:-1])
+
+    assert cache.load(path, "BTC-USD") is None
+    assert cache.index == {}
+
+def test_eviction_keeps_cache_within_limits(tmp_path):
+    for target in ("A", "B", "C"):
+        csv_dir = copy_symbol(tmp_path, target=target)
+    cache = SymbolCache(str(tmp_path / "cache"), max_entries=2)
+
+    HistoricCSVDataHandler(queue.Queue(), str(csv_dir), ["A", "B", "C"], cache=cache)
+
+    assert len(cache.index) == 2
+    assert cache.load(str(csv_dir / "A.csv"), "A") is None
+    entries = [name for name in os.listdir(cache.cache_dir) if name != SymbolCache.INDEX_NAME]
+    assert len(entries) == 2
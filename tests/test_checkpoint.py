@@ -0,0 +1,109 @@
+import os
+
+import pandas as pd
+import pytest
+
+from backtester.bus import DequeEventBus, TimedEventBus
+from backtester.checkpoint import Checkpointer
+from backtester.data import DataHandler, HistoricCSVDataHandler, StreamingCSVDataHandler
+from backtester.execution import SimulatedExecutionHandler
+from backtester.main_loop import backtest, resume_backtest
+from backtester.portfolio import LedgerPortfolio, NaivePortfolio
+from backtester.strategy import MovingAverageCrossStrategy
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+
+# Bar at which CrashingStrategy raises, None to let it run
+CRASH_AT = {"bar": None}
+
+
+class Crash(Exception):
+    pass
+
+
+class CrashingStrategy(MovingAverageCrossStrategy):
+
+    def calculate_signals(self, event):
+        self.bars = getattr(self, "bars", 0) + 1
+        if self.bars == CRASH_AT["bar"]:
+            raise Crash()
+        MovingAverageCrossStrategy.calculate_signals(self, event)
+
+
+def run(events, checkpoint=None, portfolio_class=NaivePortfolio, data=None):
+    if data is None:
+        data = HistoricCSVDataHandler(events, DATA_DIR, ["BTC-USD"])
+    portfolio = portfolio_class(data, events, None)
+    strategy = CrashingStrategy(data, events, short_window=10, long_window=40)
+    broker = SimulatedExecutionHandler(events, fill_latency="36h" if isinstance(events, TimedEventBus) else 0)
+    backtest(events, data, portfolio, strategy, broker, checkpoint=checkpoint)
+    return portfolio.equity_curve
+
+@pytest.mark.parametrize("bus", [DequeEventBus, TimedEventBus])
+def test_resume_after_crash_is_identical(tmp_path, bus):
+    expected = run(bus())
+
+    path = str(tmp_path / "run")
+    CRASH_AT["bar"] = 2000
+    try:
+        with pytest.raises(Crash):
+            run(bus(), Checkpointer(path, every_bars=300))
+    finally:
+        CRASH_AT["bar"] = None
+
+    data = HistoricCSVDataHandler(None, DATA_DIR, ["BTC-USD"])
+    checkpoint = Checkpointer(path, every_bars=300)
+    stats, portfolio = resume_backtest(path, data, checkpoint)
+    assert checkpoint.saved > 0
+    pd.testing.assert_frame_equal(portfolio.equity_curve, expected, check_exact=True)
+
+    # Resuming again from the snapshots of the resumed run gives the same result
+    _, again = resume_backtest(path, HistoricCSVDataHandler(None, DATA_DIR, ["BTC-USD"]))
+    pd.testing.assert_frame_equal(again.equity_curve, expected, check_exact=True)
+
+def test_state_is_checked_against_the_data(tmp_path):
+    path = str(tmp_path / "run")
+    run(DequeEventBus(), Checkpointer(path, every_bars=1000))
+    data = HistoricCSVDataHandler(None, DATA_DIR, ["BTC-USD"])
+    data.symbol_data["BTC-USD"] = data.symbol_data["BTC-USD"].window(0, 10)
+    with pytest.raises(ValueError):
+        resume_backtest(path, data)
+
+def test_ledger_rows_are_journaled(tmp_path):
+    expected = run(DequeEventBus(), portfolio_class=LedgerPortfolio)
+
+    path = str(tmp_path / "run")
+    CRASH_AT["bar"] = 2000
+    try:
+        with pytest.raises(Crash):
+            run(DequeEventBus(), Checkpointer(path, every_bars=300), portfolio_class=LedgerPortfolio)
+    finally:
+        CRASH_AT["bar"] = None
+    # The snapshot holds none of the 1800 rows of the ledger
+    assert os.path.getsize(os.path.join(path, "state.pkl")) < 1800 * 8
+
+    stats, portfolio = resume_backtest(path, HistoricCSVDataHandler(None, DATA_DIR, ["BTC-USD"]),
+                                       Checkpointer(path, every_bars=300))
+    pd.testing.assert_frame_equal(portfolio.equity_curve, expected, check_exact=True)
+
+def test_streaming_handler_resumes_mid_chunk(tmp_path):
+    expected = run(DequeEventBus())
+
+    def streaming(events):
+        return StreamingCSVDataHandler(events, DATA_DIR, ["BTC-USD"], chunksize=700, max_lookback=200)
+
+    path = str(tmp_path / "run")
+    CRASH_AT["bar"] = 2000
+    try:
+        with pytest.raises(Crash):
+            events = DequeEventBus()
+            run(events, Checkpointer(path, every_bars=300), data=streaming(events))
+    finally:
+        CRASH_AT["bar"] = None
+
+    stats, portfolio = resume_backtest(path, streaming(None))
+    pd.testing.assert_frame_equal(portfolio.equity_curve, expected, check_exact=True)
+
+def test_handlers_without_state_are_rejected(tmp_path):
+    with pytest.raises(ValueError, match="cannot be checkpointed"):
+        Checkpointer(str(tmp_path / "run")).attach(DequeEventBus(), DataHandler(), None, None, None)
@@ -0,0 +1,73 @@
+import os
+import queue
+import shutil
+
+import numpy as np
+import pytest
+
+from backtester.data import DataLoadError, HistoricCSVDataHandler, StreamingCSVDataHandler
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+
+
+def test_latest_data_is_a_view_of_the_last_n_rows():
+    events = queue.Queue()
+    data = HistoricCSVDataHandler(events, DATA_DIR, ["BTC-USD"])
+
+    for _ in range(5):
+        data.update_latest_data()
+
+    bars = data.get_latest_data("BTC-USD", N=3)
+    assert len(bars) == 3
+    assert np.shares_memory(bars.close, data.symbol_data["BTC-USD"].columns["close"])
+    assert str(bars.timestamps()[-1])[:10] == "2015-01-05"
+    assert events.qsize() == 5
+
+def test_data_handler_stops_at_end_of_data():
+    data = HistoricCSVDataHandler(queue.Queue(), DATA_DIR, ["BTC-USD"])
+    n = len(data.symbol_data["BTC-USD"])
+    for _ in range(n):
+        data.update_latest_data()
+    assert data.continue_backtest
+    data.update_latest_data()
+    assert not data.continue_backtest
+
+def test_streaming_handler_matches_in_memory_handler():
+    historic = HistoricCSVDataHandler(queue.Queue(), DATA_DIR, ["BTC-USD"])
+    streaming = StreamingCSVDataHandler(queue.Queue(), DATA_DIR, ["BTC-USD"],
+                                        chunksize=100, max_lookback=20)
+
+    while True:
+        historic.update_latest_data()
+        streaming.update_latest_data()
+        assert historic.continue_backtest == streaming.continue_backtest
+        if not historic.continue_backtest:
+            break
+        expected = historic.get_latest_data("BTC-USD", N=20)
+        actual = streaming.get_latest_data("BTC-USD", N=20)
+        np.testing.assert_array_equal(actual.datetime, expected.datetime)
+        np.testing.assert_array_equal(actual.close, expected.close)
+
+def test_parallel_load_is_deterministic(tmp_path):
+    for symbol in ("A", "B", "C", "D"):
+        shutil.copy(os.path.join(DATA_DIR, "BTC-USD.csv"), tmp_path / (symbol + ".csv"))
+    symbols = ["D", "B", "A", "C"]
+
+    serial = HistoricCSVDataHandler(queue.Queue(), str(tmp_path), symbols)
+    parallel = HistoricCSVDataHandler(queue.Queue(), str(tmp_path), symbols, workers=4)
+
+    assert [record.symbol for record in parallel.load_report] == symbols
+    assert all(record.error is None and record.rows > 0 for record in parallel.load_report)
+    for symbol in symbols:
+        np.testing.assert_array_equal(parallel.symbol_data[symbol].columns["close"],
+                                      serial.symbol_data[symbol].columns["close"])
+
+def test_missing_symbol_file_raises_structured_error(tmp_path):
+    shutil.copy(os.path.join(DATA_DIR, "BTC-USD.csv"), tmp_path / "BTC-USD.csv")
+
+    with pytest.raises(DataLoadError) as excinfo:
+        HistoricCSVDataHandler(queue.Queue(), str(tmp_path), ["BTC-USD", "NOPE"], workers=2)
+
+    failures = excinfo.value.failures
+    assert [record.symbol for record in failures] == ["NOPE"]
+    assert isinstance(failures[0].error, FileNotFoundError)
@@ -1,4 +1,4 @@
-from backtester.event import MarketEvent, SignalEvent, OrderEvent, FillEvent
+from backtester.event import EventPool, MarketEvent, SignalEvent, OrderEvent, FillEvent
 from datetime import datetime
 
 def test_market_event_initialization():
@@ -57,4 +57,21 @@ def test_fill_event_commission_calculation_above_500():
     assert fill_event_large.commision == max(1.3, 0.008 * fill_event_large.quantity)
 
 
- 
\ No newline at end of file
+ 
+def test_events_have_no_instance_dict():
+    # Events are slotted and the type is shared by the class
+    signal_event = SignalEvent("AAPL", datetime.now(), "LONG")
+
+    assert not hasattr(signal_event, "__dict__")
+    assert SignalEvent.type == "SIGNAL"
+
+def test_event_pool_recycles_market_events():
+    pool = EventPool(MarketEvent, max_size=1)
+    first = pool.acquire("2024-01-01", ["AAPL"])
+    pool.release(first)
+
+    second = pool.acquire("2024-01-02", ["GOOG"])
+
+    assert second is first
+    assert second.datetime == "2024-01-02"
+    assert second.symbols == ["GOOG"]
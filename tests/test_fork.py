@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtester.bus import DequeEventBus
+from backtester.data import HistoricCSVDataHandler, StreamingCSVDataHandler
+from backtester.execution import SimulatedExecutionHandler
+from backtester.fork import BranchError, fork_backtest
+from backtester.main_loop import backtest
+from backtester.portfolio import NaivePortfolio
+from backtester.strategy import MovingAverageCrossStrategy
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+FORK_AT = "2020-01-01"
+
+
+def engine():
+    events = DequeEventBus()
+    data = HistoricCSVDataHandler(events, DATA_DIR, ["BTC-USD"])
+    portfolio = NaivePortfolio(data, events, None)
+    strategy = MovingAverageCrossStrategy(data, events, short_window=10, long_window=40)
+    return events, data, portfolio, strategy, SimulatedExecutionHandler(events)
+
+def faster(branch):
+    branch.strategy.short_window = 5
+
+def broken(branch):
+    raise RuntimeError("bad scenario")
+
+@pytest.mark.parametrize("use_fork", [True, False])
+def test_branches_continue_from_the_fork_point(monkeypatch, use_fork):
+    if not use_fork:
+        monkeypatch.delattr(os, "fork")
+    expected = engine()
+    backtest(*expected)
+    expected = expected[2].equity_curve
+
+    components = engine()
+    same, changed = fork_backtest(*components, at=FORK_AT, scenarios=[None, faster])
+    pd.testing.assert_frame_equal(same.equity_curve, expected, check_exact=True)
+
+    # Identical up to the fork, then the branch with the faster average diverges
+    before = expected.index[1:] <= np.datetime64(FORK_AT)
+    after = ~before
+    pd.testing.assert_frame_equal(changed.equity_curve.iloc[1:][before], expected.iloc[1:][before])
+    assert not np.allclose(changed.equity_curve["total"].iloc[1:][after], expected["total"].iloc[1:][after])
+
+    # The caller's components stay at the fork point and can be carried on
+    assert components[1].next_timestamp() > pd.Timestamp(FORK_AT).value
+    backtest(*components)
+    pd.testing.assert_frame_equal(components[2].equity_curve, expected, check_exact=True)
+
+def test_failed_branches_are_reported():
+    with pytest.raises(BranchError) as error:
+        fork_backtest(*engine(), at=FORK_AT, scenarios=[None, broken])
+    assert list(error.value.failures) == [1]
+    assert "bad scenario" in error.value.failures[1]
+
+def streaming_engine():
+    events, _, _, _, broker = engine()
+    data = StreamingCSVDataHandler(events, DATA_DIR, ["BTC-USD"], chunksize=50, max_lookback=100)
+    portfolio = NaivePortfolio(data, events, None)
+    strategy = MovingAverageCrossStrategy(data, events, short_window=10, long_window=40)
+    return events, data, portfolio, strategy, broker
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_threaded_handlers_are_not_forked():
+    components = streaming_engine()
+    with pytest.raises(ValueError, match="background threads"):
+        fork_backtest(*components, at=FORK_AT, scenarios=[None])
+    # Rejected before anything was run
+    assert components[1].rows_read["BTC-USD"] == 0
+    components[1].close()
+
+def test_copied_branches_leave_the_streaming_baseline_intact(monkeypatch):
+    monkeypatch.delattr(os, "fork")
+    expected = streaming_engine()
+    backtest(*expected)
+    expected = expected[2].equity_curve
+
+    components = streaming_engine()
+    same, _ = fork_backtest(*components, at=FORK_AT, scenarios=[None, faster])
+    pd.testing.assert_frame_equal(same.equity_curve, expected, check_exact=True)
+    backtest(*components)
+    pd.testing.assert_frame_equal(components[2].equity_curve, expected, check_exact=True)
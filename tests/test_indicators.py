@@ -0,0 +1,81 @@
+import os
+import queue
+
+import numpy as np
+import pytest
+
+from backtester.data import HistoricCSVDataHandler
+from backtester.indicators import IndicatorRegistry
+from backtester.strategy import MovingAverageCrossStrategy
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+
+CASES = [
+    ("sma", {"window": 20}),
+    ("ema", {"span": 12}),
+    ("var", {"window": 30}),
+    ("std", {"window": 30}),
+    ("max", {"window": 15}),
+    ("min", {"window": 15, "field": "low"}),
+    ("rsi", {"period": 14}),
+    ("atr", {"period": 14}),
+]
+
+
+@pytest.mark.parametrize("name, params", CASES)
+def test_streaming_matches_vectorised_warm_up(name, params):
+    data = HistoricCSVDataHandler(queue.Queue(), DATA_DIR, ["BTC-USD"])
+    streamed = data.indicators.get("BTC-USD", name, **params)
+    values = []
+    for _ in range(500):
+        data.update_latest_data()
+        values.append(streamed.value)
+
+    history = data.get_latest_data("BTC-USD", N=500)
+    warm = IndicatorRegistry().get("BTC-USD", name, **params)
+    expected = warm.warm_up(history)
+    np.testing.assert_allclose(values, expected, rtol=1e-9, equal_nan=True)
+
+    # A warmed up indicator carries on exactly where the streamed one is
+    for _ in range(50):
+        data.update_latest_data()
+        bar = data.get_latest_data("BTC-USD")
+        warm.update([bar[field][-1] for field in ("open", "high", "low", "close", "adj_close", "volume")])
+    assert warm.value == pytest.approx(streamed.value, rel=1e-9)
+
+def test_indicators_are_shared_between_consumers():
+    events = queue.Queue()
+    data = HistoricCSVDataHandler(events, DATA_DIR, ["BTC-USD"])
+    first = MovingAverageCrossStrategy(data, events, 10, 30)
+    second = MovingAverageCrossStrategy(data, events, 10, 50)
+
+    for _ in range(100):
+        data.update_latest_data()
+        event = events.get()
+        first.calculate_signals(event)
+        second.calculate_signals(event)
+        while not events.empty():
+            assert events.get().type == "SIGNAL"
+
+    assert len(data.indicators) == 3
+
+@pytest.mark.parametrize("name, params", CASES)
+def test_indicators_recover_once_a_missing_value_leaves_the_window(name, params):
+    close = 100.0 + 10.0 * np.sin(np.arange(80) / 5.0)
+    close[10] = np.nan
+    fields = ("open", "high", "low", "close", "adj_close", "volume")
+    history = {field: close + (1.0 if field == "high" else -1.0 if field == "low" else 0.0) for field in fields}
+    bars = [[history[field][i] for field in fields] for i in range(len(close))]
+
+    streamed = IndicatorRegistry().get("X", name, **params)
+    values = [streamed.update(bar) for bar in bars]
+    expected = IndicatorRegistry().get("X", name, **params).warm_up(history)
+    np.testing.assert_allclose(values, expected, rtol=1e-9, equal_nan=True)
+    assert np.isfinite(values[-1])
+
+    # Warmed up over the missing value, it carries on as the streamed one
+    warm = IndicatorRegistry().get("X", name, **params)
+    warm.warm_up({field: column[:40] for field, column in history.items()})
+    for bar in bars[40:]:
+        warm.update(bar)
+    assert warm.value == pytest.approx(streamed.value, rel=1e-9)
@@ -0,0 +1,56 @@
+import json
+import os
+
+import numpy as np
+
+from backtester.bus import DequeEventBus
+from backtester.data import HistoricCSVDataHandler
+from backtester.execution import SimulatedExecutionHandler
+from backtester.instrument import Instrumentation, LatencyHistogram
+from backtester.main_loop import backtest
+from backtester.portfolio import NaivePortfolio
+from backtester.strategy import MovingAverageCrossStrategy
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+
+
+def test_latency_histogram_percentiles():
+    values = np.random.default_rng(0).lognormal(10, 1, size=20000).astype(np.int64)
+    histogram = LatencyHistogram(bits=7)
+    for value in values.tolist():
+        histogram.record(value)
+    assert histogram.count == len(values)
+    assert histogram.max == values.max()
+    for q in (50, 90, 99):
+        assert abs(histogram.percentile(q) / np.percentile(values, q) - 1.0) < 0.02
+    # Small values are exact
+    small = LatencyHistogram(bits=7)
+    for value in range(100):
+        small.record(value)
+    assert small.percentile(50) == 49
+
+def test_instrumented_backtest(tmp_path):
+    events = DequeEventBus()
+    data = HistoricCSVDataHandler(events, DATA_DIR, ["BTC-USD"])
+    portfolio = NaivePortfolio(data, events, None)
+    strategy = MovingAverageCrossStrategy(data, events, short_window=10, long_window=40)
+    instrumentation = Instrumentation(trace=True)
+    backtest(events, data, portfolio, strategy, SimulatedExecutionHandler(events),
+             instrumentation=instrumentation)
+
+    summary = instrumentation.summary()
+    bars = len(data.symbol_data["BTC-USD"])
+    # One MarketEvent per bar, the data handler is also called once at the end of the data
+    assert summary.loc[("event", "MarketEvent"), "count"] == bars
+    assert summary.loc[("handler", "HistoricCSVDataHandler.update_latest_data"), "count"] == bars + 1
+    assert summary.loc[("handler", "NaivePortfolio.update_fill"), "count"] == \
+        summary.loc[("event", "FillEvent"), "count"] > 0
+    assert (summary["total_ms"] > 0).all()
+
+    instrumentation.write_chrome_trace(str(tmp_path / "trace.json"))
+    with open(tmp_path / "trace.json") as f:
+        trace = json.load(f)["traceEvents"]
+    assert {event["ph"] for event in trace} == {"X", "C"}
+    instrumentation.write_json(str(tmp_path / "summary.json"))
+    with open(tmp_path / "summary.json") as f:
+        assert json.load(f)["queue_depth"]["samples"] > bars
@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtester.bus import DequeEventBus
+from backtester.data import HistoricCSVDataHandler
+from backtester.execution import SimulatedExecutionHandler
+from backtester.ledger import Ledger
+from backtester.main_loop import backtest
+from backtester.portfolio import LedgerPortfolio, NaivePortfolio
+from backtester.strategy import MovingAverageCrossStrategy
+from backtester.synthetic import generate_universe
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+
+
+def run(portfolio_class, symbols, **kwargs):
+    events = DequeEventBus()
+    data = HistoricCSVDataHandler(events, DATA_DIR, symbols, **kwargs)
+    portfolio = portfolio_class(data, events, None)
+    strategy = MovingAverageCrossStrategy(data, events, short_window=10, long_window=40)
+    stats = backtest(events, data, portfolio, strategy, SimulatedExecutionHandler(events))
+    return portfolio, stats
+
+def test_ledger_portfolio_matches_naive_portfolio():
+    naive, expected = run(NaivePortfolio, ["BTC-USD"])
+    ledger, stats = run(LedgerPortfolio, ["BTC-USD"])
+    assert stats == expected
+    pd.testing.assert_frame_equal(ledger.equity_curve, naive.equity_curve, check_exact=True)
+    assert ledger.current_positions == naive.current_positions
+
+@pytest.mark.parametrize("alignment", ["pad", "sparse"])
+def test_ledger_portfolio_matches_on_misaligned_symbols(alignment):
+    universe = generate_universe(12, 300, seed=1, gaps=0.1, misaligned=True)
+    kwargs = dict(symbol_data=universe, alignment=alignment)
+    naive, _ = run(NaivePortfolio, list(universe), **kwargs)
+    ledger, _ = run(LedgerPortfolio, list(universe), **kwargs)
+    # Only the order the market values are summed in may differ
+    pd.testing.assert_frame_equal(ledger.equity_curve, naive.equity_curve, rtol=1e-12)
+    positions = pd.DataFrame(naive.all_positions).set_index("datestamp")
+    pd.testing.assert_frame_equal(ledger.ledger.positions_frame(), positions.astype(float))
+
+def test_ledger_grows_and_equity_curve_is_a_view():
+    ledger = Ledger(["A", "B"], initial_capital=1000.0, initial_size=2)
+    for i in range(5):
+        ledger.fill("A", 1.0, 10.0, 0.5)
+        ledger.record(np.datetime64(i, "D"), np.array([11.0, 3.0]))
+    curve = ledger.equity_curve()
+    assert len(curve) == 6
+    assert list(curve["A"]) == [0.0, 11.0, 22.0, 33.0, 44.0, 55.0]
+    assert curve["total"].iloc[-1] == 1000.0 - 5 * 10.5 + 55.0
+    assert np.shares_memory(curve.to_numpy(), ledger._holdings)
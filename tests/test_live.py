@@ -0,0 +1,79 @@
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from backtester.bus import DequeEventBus
+from backtester.data import HistoricCSVDataHandler
+from backtester.execution import SimulatedExecutionHandler
+from backtester.live import LiveDataHandler, ReplayServer
+from backtester.main_loop import backtest
+from backtester.portfolio import NaivePortfolio
+from backtester.strategy import MovingAverageCrossStrategy
+from backtester.synthetic import generate_universe
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+
+
+@pytest.fixture
+def server():
+    servers = []
+
+    def serve(*args, **kwargs):
+        replay = ReplayServer(*args, **kwargs)
+        servers.append(replay)
+        return replay.serve_in_thread()
+    yield serve
+    for replay in servers:
+        replay.close()
+
+def run(data, events):
+    portfolio = NaivePortfolio(data, events, None)
+    strategy = MovingAverageCrossStrategy(data, events, short_window=10, long_window=40)
+    backtest(events, data, portfolio, strategy, SimulatedExecutionHandler(events))
+    return portfolio.equity_curve
+
+def test_live_backtest_matches_historic(server):
+    host, port = server(DATA_DIR, ["BTC-USD"], speed=None, max_batch=100)
+    events = DequeEventBus()
+    live = LiveDataHandler(events, host, port)
+    curve = run(live, events)
+
+    events = DequeEventBus()
+    expected = run(HistoricCSVDataHandler(events, DATA_DIR, ["BTC-USD"]), events)
+    pd.testing.assert_frame_equal(curve, expected, check_exact=True)
+    assert live.latency.count == len(expected) - 1
+
+def drain(data, events):
+    seen = []
+    while data.continue_backtest:
+        data.update_latest_data()
+        event = events.get()
+        seen.append((event.datetime, list(event.symbols) if event.symbols is not None else None))
+    return seen
+
+@pytest.mark.parametrize("alignment", ["pad", "sparse"])
+def test_misaligned_symbols_give_the_same_events(server, alignment):
+    universe = generate_universe(3, 200, seed=3, gaps=0.2, misaligned=True)
+    symbols = list(universe)
+    host, port = server(None, symbols, speed=None, max_batch=7, symbol_data=universe)
+
+    events = DequeEventBus()
+    live = LiveDataHandler(events, host, port, symbol_list=symbols[1:], alignment=alignment)
+    historic = HistoricCSVDataHandler(DequeEventBus(), None, symbols[1:], symbol_data=universe,
+                                      alignment=alignment)
+    assert drain(live, events) == drain(historic, historic.events)
+    for symbol in symbols[1:]:
+        assert (live.get_latest_data(symbol, N=50).close == historic.get_latest_data(symbol, N=50).close).all()
+
+def test_replay_is_paced(server):
+    universe = generate_universe(1, 6, freq="1min", seed=0)
+    # Five minutes of bars at 1500x real time take at least 0.2s
+    host, port = server(None, list(universe), speed=1500.0, symbol_data=universe)
+    events = DequeEventBus()
+    start = time.perf_counter()
+    live = LiveDataHandler(events, host, port)
+    drain(live, events)
+    assert time.perf_counter() - start >= 0.2
+    assert live.latency.count == 6
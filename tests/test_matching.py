@@ -0,0 +1,110 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from backtester.bus import DequeEventBus
+from backtester.data import HistoricCSVDataHandler
+from backtester.event import FillEvent, OrderCancelEvent, OrderEvent
+from backtester.execution import SimulatedExecutionHandler
+from backtester.main_loop import backtest
+from backtester.matching import MatchingExecutionHandler, matching_dispatcher
+from backtester.portfolio import NaivePortfolio
+from backtester.store import ColumnarBars
+from backtester.strategy import MovingAverageCrossStrategy
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+
+
+def exchange(bars, **kwargs):
+    # bars: (open, high, low, close, volume) per day
+    open_, high, low, close, volume = (np.array(column, dtype=np.float64) for column in zip(*bars))
+    datetime = np.arange(len(bars), dtype=np.int64) * 86400 * 10**9
+    columns = {"open": open_, "high": high, "low": low, "close": close, "adj_close": close, "volume": volume}
+    events = DequeEventBus()
+    data = HistoricCSVDataHandler(events, None, ["X"], symbol_data={"X": ColumnarBars("X", datetime, columns)})
+    broker = MatchingExecutionHandler(events, data, **kwargs)
+
+    def step():
+        data.update_latest_data()
+        broker.on_market(events.get())
+    return events, broker, step
+
+def fills(events):
+    result = []
+    event = events.get()
+    while event is not None:
+        if isinstance(event, OrderCancelEvent):
+            result.append(("CANCEL", event.quantity, event.order.stop_price))
+        else:
+            assert isinstance(event, FillEvent)
+            result.append((event.direction, event.quantity, event.fill_cost))
+        event = events.get()
+    return result
+
+def test_limits_fill_by_price_then_time_with_volume_caps():
+    events, broker, step = exchange([(100, 101, 99, 100, 1000), (100, 100, 97, 98, 1000),
+                                     (96, 97, 95, 96, 1000)], participation=0.1)
+    step()
+    first, second = OrderEvent("X", "LMT", 30, "BUY", price=99.0), OrderEvent("X", "LMT", 30, "BUY", price=99.0)
+    deep = OrderEvent("X", "LMT", 50, "BUY", price=97.0)
+    for order in (deep, first, second):
+        broker.execute_order(order)
+    assert fills(events) == [] and broker.queue_position(second) == 30
+
+    # 99 is traded through and fills in time order, 97 is only touched: 5% of
+    # the volume trades there and the 10% cap leaves 40 of it for the order
+    step()
+    assert fills(events) == [("BUY", 30, 99.0), ("BUY", 30, 99.0), ("BUY", 40, 97.0)]
+    # The next bar opens below the limit and fills the rest at the open
+    step()
+    assert fills(events) == [("BUY", 10, 96.0)]
+    assert broker.orders == {}
+
+def test_market_and_stop_orders():
+    events, broker, step = exchange([(100, 101, 99, 100, 1000), (102, 103, 101, 102, 1000),
+                                     (96, 97, 90, 95, 1000)], participation=0.1)
+    step()
+    broker.execute_order(OrderEvent("X", "MKT", 150, "BUY"))
+    stop = OrderEvent("X", "STP", 80, "SELL", stop_price=97.0)
+    broker.execute_order(stop)
+    cancelled = OrderEvent("X", "STP", 10, "BUY", stop_price=102.5)
+    broker.execute_order(cancelled)
+    assert broker.cancel(cancelled) == 10
+    # Capped at 10% of the volume, the rest of the market order fills at the next open
+    assert fills(events) == [("BUY", 100, 100.0), ("CANCEL", 10, 102.5)]
+    step()
+    assert fills(events) == [("BUY", 50, 102.0)]
+    # The sell stop gaps: triggered by the low, filled at the open below the stop
+    step()
+    assert fills(events) == [("SELL", 80, 96.0)]
+
+def test_queue_ahead_is_worked_off_by_touches():
+    bars = [(100, 101, 99, 100, 1000)] + [(100, 100, 99, 100, 1000)] * 3
+    events, broker, step = exchange(bars, participation=None, queue_fraction=0.08, touch_fraction=0.05)
+    step()
+    order = OrderEvent("X", "LMT", 40, "BUY", price=99.0)
+    broker.execute_order(order)
+    assert broker.queue_position(order) == 80.0
+    step()
+    assert fills(events) == [] and broker.queue_position(order) == 30.0
+    step()
+    assert fills(events) == [("BUY", 20, 99.0)] and broker.queue_position(order) == 0.0
+    step()
+    assert fills(events) == [("BUY", 20, 99.0)]
+
+def test_uncapped_market_orders_match_the_simulated_handler():
+    curves = []
+    for matching in (False, True):
+        events = DequeEventBus()
+        data = HistoricCSVDataHandler(events, DATA_DIR, ["BTC-USD"])
+        portfolio = NaivePortfolio(data, events, None)
+        strategy = MovingAverageCrossStrategy(data, events, short_window=10, long_window=40)
+        if matching:
+            broker = MatchingExecutionHandler(events, data, participation=None)
+            dispatcher = matching_dispatcher(strategy, portfolio, broker)
+        else:
+            broker, dispatcher = SimulatedExecutionHandler(events), None
+        backtest(events, data, portfolio, strategy, broker, dispatcher=dispatcher)
+        curves.append(portfolio.equity_curve)
+    pd.testing.assert_frame_equal(curves[1], curves[0], check_exact=True)
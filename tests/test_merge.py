@@ -0,0 +1,79 @@
+import queue
+
+import numpy as np
+import pandas as pd
+
+from backtester.data import HistoricCSVDataHandler
+from backtester.merge import TimeMerger
+
+
+def write_symbol(csv_dir, symbol, dates):
+    frame = pd.DataFrame(
+        {
+            "Open": np.arange(len(dates), dtype=float),
+            "High": np.arange(len(dates), dtype=float),
+            "Low": np.arange(len(dates), dtype=float),
+            "Close": np.arange(len(dates), dtype=float),
+            "Adj Close": np.arange(len(dates), dtype=float),
+            "Volume": np.ones(len(dates)),
+        },
+        index=pd.DatetimeIndex(dates, name="Date"),
+    )
+    frame.to_csv(csv_dir / (symbol + ".csv"))
+
+def test_merger_emits_in_global_time_order():
+    merger = TimeMerger({"A": [(1, "a1"), (3, "a3")], "B": [(1, "b1"), (2, "b2"), (4, "b4")]},
+                        mode="sparse")
+
+    steps = list(merger)
+
+    assert steps == [
+        (1, [("A", "a1"), ("B", "b1")]),
+        (2, [("B", "b2")]),
+        (3, [("A", "a3")]),
+        (4, [("B", "b4")]),
+    ]
+
+def test_pad_mode_keeps_latest_snapshot():
+    merger = TimeMerger({"A": [(1, "a1"), (3, "a3")], "B": [(2, "b2")]}, mode="pad")
+
+    next(merger)
+    next(merger)
+    assert merger.latest == {"A": "a1", "B": "b2"}
+    next(merger)
+    assert merger.latest == {"A": "a3", "B": "b2"}
+
+def test_handler_lines_up_different_calendars(tmp_path):
+    crypto = pd.date_range("2024-01-05", "2024-01-10", freq="D")   # Fri..Wed, every day
+    equity = pd.bdate_range("2024-01-04", "2024-01-10")           # Thu..Wed, weekdays only
+    write_symbol(tmp_path, "BTC-USD", crypto)
+    write_symbol(tmp_path, "SPY", equity)
+
+    events = queue.Queue()
+    data = HistoricCSVDataHandler(events, str(tmp_path), ["BTC-USD", "SPY"])
+    seen = []
+    while True:
+        data.update_latest_data()
+        if not data.continue_backtest:
+            break
+        event = events.get()
+        seen.append((str(event.datetime)[:10], list(event.symbols)))
+
+    assert len(seen) == len(crypto.union(equity))
+    assert seen[0] == ("2024-01-04", ["SPY"])
+    # Over the weekend SPY is padded forward from Friday
+    assert seen[2] == ("2024-01-06", ["BTC-USD", "SPY"])
+    assert str(data.get_latest_data("SPY").timestamps()[-1])[:10] == "2024-01-10"
+
+def test_sparse_alignment_reports_updated_symbols_only(tmp_path):
+    write_symbol(tmp_path, "BTC-USD", pd.date_range("2024-01-05", "2024-01-08", freq="D"))
+    write_symbol(tmp_path, "SPY", pd.bdate_range("2024-01-05", "2024-01-08"))
+
+    events = queue.Queue()
+    data = HistoricCSVDataHandler(events, str(tmp_path), ["BTC-USD", "SPY"], alignment="sparse")
+    symbols = []
+    for _ in range(4):
+        data.update_latest_data()
+        symbols.append(events.get().symbols)
+
+    assert symbols == [["BTC-USD", "SPY"], ["BTC-USD"], ["BTC-USD"], ["BTC-USD", "SPY"]]
@@ -0,0 +1,63 @@
+import os
+
+import pandas as pd
+import pytest
+
+from backtester.bus import DequeEventBus
+from backtester.data import HistoricCSVDataHandler
+from backtester.event import EventPool, MarketEvent
+from backtester.execution import SimulatedExecutionHandler
+from backtester.main_loop import backtest
+from backtester.multibook import MultiBookBacktest
+from backtester.portfolio import LedgerPortfolio, NaivePortfolio
+from backtester.strategy import BuyAndHoldStrategy, MovingAverageCrossStrategy, Strategy
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+WINDOWS = [(5, 20), (10, 40), (20, 40)]
+
+
+def single(strategy_class, portfolio_class=NaivePortfolio, **params):
+    events = DequeEventBus()
+    data = HistoricCSVDataHandler(events, DATA_DIR, ["BTC-USD"])
+    portfolio = portfolio_class(data, events, None)
+    stats = backtest(events, data, portfolio, strategy_class(data, events, **params),
+                     SimulatedExecutionHandler(events))
+    return stats, portfolio.equity_curve
+
+def test_books_match_their_own_backtests():
+    data = HistoricCSVDataHandler(None, DATA_DIR, ["BTC-USD"])
+    data.market_pool = EventPool(MarketEvent)
+    engine = MultiBookBacktest(data)
+    for short, long in WINDOWS:
+        engine.add_book(("ma", short, long), MovingAverageCrossStrategy,
+                        dict(short_window=short, long_window=long))
+    engine.add_book("hold", BuyAndHoldStrategy, portfolio_class=LedgerPortfolio)
+    stats = engine.run()
+
+    for short, long in WINDOWS:
+        expected_stats, expected_curve = single(MovingAverageCrossStrategy, short_window=short, long_window=long)
+        assert stats[("ma", short, long)] == expected_stats
+        pd.testing.assert_frame_equal(engine.books[("ma", short, long)].portfolio.equity_curve,
+                                      expected_curve, check_exact=True)
+    expected_stats, expected_curve = single(BuyAndHoldStrategy, LedgerPortfolio)
+    assert stats["hold"] == expected_stats
+    # Shared moving averages are registered once, whichever books use them
+    assert len(data.indicators) == len({w for pair in WINDOWS for w in pair})
+
+class Vandal(Strategy):
+    def __init__(self, data, events):
+        self.data = data
+
+    def calculate_signals(self, event):
+        self.data.get_latest_data("BTC-USD").volume[-1] = 0.0
+
+def test_books_cannot_change_the_shared_bars():
+    data = HistoricCSVDataHandler(None, DATA_DIR, ["BTC-USD"])
+    engine = MultiBookBacktest(data)
+    engine.add_book("vandal", Vandal)
+    with pytest.raises(ValueError):
+        engine.run()
+    # Made writable again after the run
+    assert data.symbol_data["BTC-USD"].columns["volume"].flags.writeable
+    with pytest.raises(ValueError):
+        engine.add_book("vandal", Vandal)
@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtester.bus import DequeEventBus
+from backtester.data import HistoricCSVDataHandler
+from backtester.execution import SimulatedExecutionHandler
+from backtester.main_loop import backtest
+from backtester.performance import (ONLINE_METRICS, OnlineMetrics, create_drawdowns, create_metrics,
+                                    create_sharpe_ratio)
+from backtester.portfolio import LedgerPortfolio, NaivePortfolio
+from backtester.strategy import MovingAverageCrossStrategy
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+
+
+def looped_drawdowns(equity_curve):
+    # The original scalar loop of create_drawdowns
+    high_water_mark = [0]
+    drawdown = pd.Series(0.0, index=equity_curve.index)
+    duration = pd.Series(0.0, index=equity_curve.index)
+    for t in range(1, len(equity_curve)):
+        high_water_mark.append(max(high_water_mark[t - 1], equity_curve.iloc[t]))
+        drawdown.iloc[t] = high_water_mark[t] - equity_curve.iloc[t]
+        duration.iloc[t] = 0 if drawdown.iloc[t] == 0 else duration.iloc[t - 1] + 1
+    return drawdown.max(), duration.max()
+
+def test_create_drawdowns_matches_the_scalar_loop():
+    rng = np.random.default_rng(0)
+    curve = pd.Series(np.cumprod(1.0 + rng.normal(0.0, 0.02, 500)))
+    curve.iloc[0] = np.nan
+    curve.iloc[[50, 51, 300]] = np.nan
+    assert create_drawdowns(curve) == looped_drawdowns(curve)
+
+@pytest.mark.parametrize("portfolio_class", [NaivePortfolio, LedgerPortfolio])
+def test_online_metrics_match_the_batch_and_the_summary(portfolio_class):
+    events = DequeEventBus()
+    data = HistoricCSVDataHandler(events, DATA_DIR, ["BTC-USD"])
+    metrics = OnlineMetrics()
+    portfolio = portfolio_class(data, events, None, metrics=metrics)
+    strategy = MovingAverageCrossStrategy(data, events, short_window=10, long_window=40)
+    backtest(events, data, portfolio, strategy, SimulatedExecutionHandler(events))
+
+    curve = portfolio.equity_curve
+    online = metrics.to_dict()
+    assert list(online) == list(ONLINE_METRICS)
+    # Compounded and drawn down exactly as the equity curve
+    assert online["total_return"] == curve["equity_curve"].iloc[-1] - 1.0
+    assert (online["max_drawdown"], online["max_drawdown_duration"]) == create_drawdowns(curve["equity_curve"])
+    assert online["sharpe_ratio"] == pytest.approx(create_sharpe_ratio(curve["returns"]), rel=1e-9)
+    assert 0.0 < online["exposure"] < 1.0 and online["turnover"] > 0.0
+
+    gross = curve["BTC-USD"].abs().to_numpy()
+    traded = np.abs(np.diff(curve["cash"].to_numpy() + curve["commission"].to_numpy(), prepend=np.nan))
+    batch = create_metrics(curve["total"], gross, traded)
+    assert batch == pytest.approx(online, rel=1e-9)
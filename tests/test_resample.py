@@ -0,0 +1,47 @@
+import os
+import queue
+
+import numpy as np
+import pandas as pd
+
+from backtester.data import HistoricCSVDataHandler
+from backtester.resample import resample_bars
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+
+
+def test_vectorised_resample_matches_pandas():
+    data = HistoricCSVDataHandler(queue.Queue(), DATA_DIR, ["BTC-USD"])
+    bars = data.symbol_data["BTC-USD"]
+
+    weekly = resample_bars(bars, "168h")
+
+    frame = pd.DataFrame(bars.columns, index=pd.to_datetime(bars.datetime))
+    expected = frame.resample("168h", origin="epoch").agg(
+        {"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"}
+    )
+    np.testing.assert_array_equal(weekly.datetime, expected.index.values.astype(np.int64))
+    for field in ("open", "high", "low", "close", "volume"):
+        np.testing.assert_allclose(weekly.columns[field], expected[field].to_numpy())
+
+def test_incremental_resample_matches_vectorised():
+    data = HistoricCSVDataHandler(queue.Queue(), DATA_DIR, ["BTC-USD"])
+    data.add_timeframe("7D")
+    for _ in range(100):
+        data.update_latest_data()
+
+    # Attached mid-run, this one is warmed up from the first 100 bars
+    data.add_timeframe("30D")
+    for _ in range(200):
+        data.update_latest_data()
+
+    history = data.get_latest_data("BTC-USD", N=300)
+    for timeframe in ("7D", "30D"):
+        expected = resample_bars(history, timeframe)
+        completed = data.get_latest_data("BTC-USD", N=1000, timeframe=timeframe)
+        np.testing.assert_array_equal(completed.datetime, expected.datetime[:-1])
+        np.testing.assert_allclose(completed.high, expected.columns["high"][:-1])
+
+        with_partial = data.resamplers[timeframe].get_latest_data("BTC-USD", N=2, include_partial=True)
+        assert with_partial.datetime[-1] == expected.datetime[-1]
+        assert with_partial.volume[-1] == expected.columns["volume"][-1]
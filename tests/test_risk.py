@@ -0,0 +1,156 @@
+import numpy as np
+import pytest
+
+from backtester.bus import DequeEventBus, default_dispatcher
+from backtester.data import HistoricCSVDataHandler
+from backtester.event import RebalanceEvent, SignalEvent
+from backtester.execution import SimulatedExecutionHandler
+from backtester.main_loop import backtest
+from backtester.matching import MatchingExecutionHandler, matching_dispatcher
+from backtester.portfolio import RiskManagedPortfolio
+from backtester.risk import (EWMACovariance, FactorCovariance, RiskEngine, RollingCovariance,
+                             risk_parity_weights, volatility_target)
+from backtester.strategy import BuyAndHoldStrategy, MovingAverageCrossStrategy
+from backtester.synthetic import generate_universe
+
+
+def correlated_returns(bars=300, n=6, seed=0):
+    rng = np.random.default_rng(seed)
+    market = rng.normal(0.0, 0.01, (bars, 1))
+    return market * rng.uniform(0.5, 1.5, n) + rng.normal(0.0, 0.01, (bars, n)) * rng.uniform(0.5, 2.0, n)
+
+def test_estimators_match_their_batch_definitions():
+    returns = correlated_returns()
+    ewma, rolling = EWMACovariance(6, halflife=20), RollingCovariance(6, window=50)
+    for r in returns:
+        ewma.update(r)
+        rolling.update(r)
+
+    decay = 0.5 ** (1.0 / 20)
+    weights = (1.0 - decay) * decay ** np.arange(len(returns))[::-1]
+    expected = (returns * weights[:, np.newaxis]).T @ returns / weights.sum()
+    np.testing.assert_allclose(ewma.covariance(), expected, rtol=1e-10)
+    np.testing.assert_allclose(rolling.covariance(), np.cov(returns[-50:].T), rtol=1e-8)
+    np.testing.assert_allclose(rolling.variance(), np.diag(np.cov(returns[-50:].T)), rtol=1e-8)
+
+    w = np.linspace(0.1, 0.6, 6)
+    np.testing.assert_allclose(rolling.dot(w), np.cov(returns[-50:].T) @ w, rtol=1e-8)
+    rolling.shrinkage = 0.3
+    shrunk = 0.7 * np.cov(returns[-50:].T) + 0.3 * np.diag(np.diag(np.cov(returns[-50:].T)))
+    np.testing.assert_allclose(rolling.covariance(), shrunk, rtol=1e-8)
+
+def test_factor_model_never_needs_the_full_matrix():
+    returns = correlated_returns(n=40)
+    loadings = np.column_stack([np.ones(40), np.repeat([1.0, 0.0], 20)])
+    model = FactorCovariance(40, loadings, halflife=20)
+    for r in returns:
+        model.update(r)
+    full = loadings @ model.factors.covariance() @ loadings.T + np.diag(model.specific_variance())
+    w = np.random.default_rng(1).random(40)
+    np.testing.assert_allclose(model.dot(w), full @ w, rtol=1e-10)
+    np.testing.assert_allclose(model.variance(), np.diag(full), rtol=1e-10)
+
+@pytest.mark.parametrize("estimator", [EWMACovariance(6), RollingCovariance(6, window=100),
+                                       FactorCovariance(6)])
+def test_risk_parity_equalises_contributions_and_hits_the_target(estimator):
+    for r in correlated_returns():
+        estimator.update(r)
+    active = np.array([True, True, False, True, True, True])
+    weights = risk_parity_weights(estimator, active)
+    assert weights[2] == 0.0 and weights.sum() == pytest.approx(1.0)
+    contributions = (weights * estimator.dot(weights))[active]
+    np.testing.assert_allclose(contributions, contributions.mean(), rtol=1e-6)
+
+    scaled = volatility_target(weights, estimator, 0.1, max_leverage=None)
+    assert np.sqrt(scaled @ estimator.dot(scaled) * 252) == pytest.approx(0.1)
+
+def test_risk_managed_portfolio_sizes_to_the_target():
+    universe = generate_universe(5, 400, seed=2)
+    events = DequeEventBus()
+    data = HistoricCSVDataHandler(events, None, list(universe), symbol_data=universe)
+    risk = RiskEngine(data.symbol_list, EWMACovariance(5, halflife=20), target_volatility=0.05)
+    portfolio = RiskManagedPortfolio(data, events, None, risk=risk, rebalance_every=20)
+    backtest(events, data, portfolio, BuyAndHoldStrategy(data, events), SimulatedExecutionHandler(events))
+
+    positions = np.array([portfolio.current_positions[symbol] for symbol in data.symbol_list])
+    assert (positions > 0).all()
+    # The last bar rebalanced to the target weights, rounded down to whole shares
+    expected = risk.target_weights() * portfolio.all_holdings[-1]["total"] / risk.prices
+    assert (np.abs(positions - expected) < 1).all()
+
+@pytest.mark.parametrize("make", [lambda n, bars: EWMACovariance(n, halflife=20),
+                                  lambda n, bars: RollingCovariance(n, window=bars, min_periods=2)])
+def test_symbols_without_a_new_bar_are_left_out(make):
+    rng = np.random.default_rng(4)
+    prices = 100.0 * np.cumprod(1.0 + rng.normal(0.0, 0.01, (200, 2)), axis=0)
+    # The window of 40 bars holds 20 of B's
+    engine, alone = RiskEngine(["A", "B"], make(2, 40)), make(1, 20)
+    for i, bar in enumerate(prices):
+        # B only trades every other bar, its return spans the gap
+        stale = i % 2 == 1
+        engine.update([bar[0], np.nan if stale else bar[1]])
+        if not stale and i > 0:
+            alone.update([bar[1] / prices[i - 2, 1] - 1.0])
+    assert engine.estimator.variance()[1] == pytest.approx(alone.variance()[0], rel=1e-10)
+
+def test_signals_of_a_bar_are_rebalanced_once():
+    universe = generate_universe(4, 400, seed=3)
+    events = DequeEventBus()
+    data = HistoricCSVDataHandler(events, None, list(universe), symbol_data=universe)
+    portfolio = RiskManagedPortfolio(data, events, None, rebalance_every=1)
+    orders = []
+
+    class Broker(SimulatedExecutionHandler):
+        def execute_order(self, event):
+            orders.append((len(portfolio.all_holdings), event.symbol))
+            SimulatedExecutionHandler.execute_order(self, event)
+
+    strategy = MovingAverageCrossStrategy(data, events, short_window=5, long_window=20)
+    backtest(events, data, portfolio, strategy, Broker(events))
+
+    assert len(orders) == len(set(orders))
+    positions = np.array([portfolio.current_positions[symbol] for symbol in data.symbol_list])
+    expected = portfolio.risk.target_weights(portfolio.held) * portfolio.all_holdings[-1]["total"] \
+        / portfolio.risk.prices
+    assert (np.abs(positions - expected) < 1).all()
+
+def test_rebalances_are_routed_to_the_portfolio_alone():
+    universe = generate_universe(2, 100, seed=5)
+    events = DequeEventBus()
+    data = HistoricCSVDataHandler(events, None, list(universe), symbol_data=universe)
+    portfolio = RiskManagedPortfolio(data, events, None, rebalance_every=10)
+    strategy, broker = BuyAndHoldStrategy(data, events), SimulatedExecutionHandler(events)
+    signals, rebalances = [], []
+    dispatcher = default_dispatcher(strategy, portfolio, broker)
+    dispatcher.subscribe(SignalEvent, signals.append)
+    dispatcher.subscribe(RebalanceEvent, rebalances.append)
+    backtest(events, data, portfolio, strategy, broker, dispatcher)
+
+    assert all(event.type == "SIGNAL" for event in signals)
+    # One for the signals of the first bar, then one every 10 bars
+    assert len(rebalances) == 11 and not portfolio._rebalance_posted
+    assert all(portfolio.current_positions[symbol] > 0 for symbol in data.symbol_list)
+
+def test_cancelled_orders_are_no_longer_pending():
+    universe = generate_universe(3, 200, seed=6)
+    events = DequeEventBus()
+    data = HistoricCSVDataHandler(events, None, list(universe), symbol_data=universe)
+    portfolio = RiskManagedPortfolio(data, events, None, rebalance_every=5)
+    strategy = BuyAndHoldStrategy(data, events)
+    # A tiny share of the volume, so orders take many bars to fill
+    broker = MatchingExecutionHandler(events, data, participation=0.000001)
+    dispatcher = matching_dispatcher(strategy, portfolio, broker)
+
+    def outstanding():
+        quantities = np.zeros(len(data.symbol_list))
+        for order in broker.orders.values():
+            quantities[portfolio.risk.index[order.event.symbol]] += order.side * order.remaining
+        return quantities
+
+    backtest(events, data, portfolio, strategy, broker, dispatcher, until="2015-03-01")
+    assert outstanding().any()
+    np.testing.assert_array_equal(portfolio.pending, outstanding())
+    for order in list(broker.orders.values()):
+        broker.cancel(order.event)
+    backtest(events, data, portfolio, strategy, broker, dispatcher)
+    np.testing.assert_array_equal(portfolio.pending, outstanding())
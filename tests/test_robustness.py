@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from backtester.performance import (create_batch_drawdowns, create_batch_sharpe_ratios,
+                                    create_drawdowns, create_sharpe_ratio)
+from backtester.robustness import (BlockBootstrap, MonteCarlo, NoiseInjection, StreamingQuantiles,
+                                   TradeShuffle, batch_metrics)
+
+
+def test_batch_metrics_match_single_curve_metrics():
+    rng = np.random.default_rng(0)
+    returns = rng.normal(0.0005, 0.01, size=(3, 300))
+    sharpe = create_batch_sharpe_ratios(returns)
+    drawdown, duration = create_batch_drawdowns(np.cumprod(1.0 + returns, axis=1))
+    for i in range(3):
+        # An equity curve as the portfolio builds it, with the initial row first
+        series = pd.Series(np.concatenate(([np.nan], returns[i])))
+        curve = (1.0 + series).cumprod()
+        assert np.isclose(sharpe[i], create_sharpe_ratio(series))
+        expected_dd, expected_duration = create_drawdowns(curve)
+        assert np.isclose(drawdown[i], expected_dd)
+        assert duration[i] == expected_duration
+
+def test_resampling_methods():
+    rng = np.random.default_rng(1)
+    returns = np.arange(10, dtype=np.float64)
+    blocks = BlockBootstrap(block=4).sample(returns, 5, rng)
+    assert blocks.shape == (5, 10)
+    # Within a block consecutive returns follow each other, wrapping around
+    assert np.all((blocks[:, 1:4] - blocks[:, :3]) % 10 == 1)
+
+    shuffled = TradeShuffle().sample(returns, 5, rng)
+    assert np.all(np.sort(shuffled, axis=1) == returns)
+    metrics = batch_metrics(shuffled / 100.0)
+    assert np.allclose(metrics["total_return"], metrics["total_return"][0])
+
+    assert NoiseInjection(scale=0.1).sample(returns, 5, rng).shape == (5, 10)
+
+def test_streaming_quantiles_are_close_to_exact():
+    rng = np.random.default_rng(2)
+    values = rng.normal(size=200000)
+    sketch = StreamingQuantiles(capacity=512)
+    for batch in np.array_split(values, 200):
+        sketch.update(batch)
+    assert sketch.count == len(values)
+    assert sum(len(level) for level in sketch.levels) < 512 * 10
+    q = np.array([0.05, 0.5, 0.95])
+    assert np.allclose(sketch.quantile(q), np.quantile(values, q), atol=0.05)
+
+def test_monte_carlo_is_reproducible_across_workers():
+    returns = np.random.default_rng(3).normal(0.001, 0.02, size=500)
+    single = MonteCarlo(returns, resamples=2500, batch_size=400, seed=42).run().summary()
+    again = MonteCarlo(returns, resamples=2500, batch_size=400, seed=42).run().summary()
+    parallel = MonteCarlo(returns, resamples=2500, batch_size=400, seed=42, workers=2).run().summary()
+    pd.testing.assert_frame_equal(single, again)
+    pd.testing.assert_frame_equal(single, parallel)
+    assert (single["count"] == 2500).all()
+    assert single.loc["sharpe_ratio", "q0.05"] < single.loc["sharpe_ratio", "observed"] < single.loc["sharpe_ratio", "q0.95"]
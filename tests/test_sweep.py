@@ -0,0 +1,47 @@
+import json
+import os
+
+import numpy as np
+
+from backtester.bus import DequeEventBus
+from backtester.data import HistoricCSVDataHandler
+from backtester.strategy import MovingAverageCrossStrategy
+from backtester.sweep import BacktestJob, SharedMarketData, SweepRunner, parameter_grid
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+
+
+def load():
+    return HistoricCSVDataHandler(DequeEventBus(), DATA_DIR, ["BTC-USD"])
+
+def test_shared_market_data_round_trips():
+    data = load()
+    with SharedMarketData(data.symbol_data) as shared:
+        attached = SharedMarketData.attach(shared.descriptor)
+        close = attached.symbol_data["BTC-USD"].columns["close"]
+        np.testing.assert_array_equal(close, data.symbol_data["BTC-USD"].columns["close"])
+        attached.close()
+
+def test_sweep_matches_single_runs_and_resumes(tmp_path):
+    data = load()
+    job = BacktestJob(MovingAverageCrossStrategy, vectorized=True)
+    grid = parameter_grid(short_window=[5, 10], long_window=[30, 60])
+    results_path = str(tmp_path / "sweep.jsonl")
+
+    runner = SweepRunner(data, job, workers=2, results_path=results_path, max_pending=1)
+    first = []
+    for params, result in runner.run(grid):
+        first.append(params)
+        runner.cancel()
+    # Cancelling stops new submissions, the job already running is still reported
+    assert 1 <= len(first) < len(grid)
+
+    resumed = dict((SweepRunner.key(p), r) for p, r in SweepRunner(data, job, workers=2, results_path=results_path).run(grid))
+    assert len(resumed) == len(grid) - len(first)
+    with open(results_path) as f:
+        assert len([json.loads(line) for line in f]) == len(grid)
+
+    for params in grid[:2]:
+        expected = job(load(), params)
+        stored = SweepRunner(data, job, results_path=results_path).completed()[SweepRunner.key(params)]
+        assert stored == expected
@@ -0,0 +1,29 @@
+import numpy as np
+
+from backtester.bus import DequeEventBus
+from backtester.data import HistoricCSVDataHandler
+from backtester.synthetic import generate_bars, generate_universe, write_csv
+
+
+def test_generate_bars():
+    bars = generate_bars("TEST", 1000, freq="1min", seed=1, gaps=0.2)
+    assert len(bars) == 1000
+    steps = np.diff(bars.datetime)
+    assert steps.min() == 60 * 10**9 and steps.max() > 60 * 10**9
+    assert np.all(bars.columns["high"] >= np.maximum(bars.columns["open"], bars.columns["close"]))
+    assert np.all(bars.columns["low"] <= np.minimum(bars.columns["open"], bars.columns["close"]))
+    np.testing.assert_array_equal(generate_bars("TEST", 1000, freq="1min", seed=1, gaps=0.2).columns["close"],
+                                  bars.columns["close"])
+
+def test_universe_round_trips_through_csv(tmp_path):
+    universe = generate_universe(3, 200, seed=7, misaligned=True)
+    assert list(universe) == ["SYM00000", "SYM00001", "SYM00002"]
+    starts = {int(bars.datetime[0]) for bars in universe.values()}
+    assert len(starts) > 1
+    for bars in universe.values():
+        write_csv(bars, str(tmp_path))
+
+    data = HistoricCSVDataHandler(DequeEventBus(), str(tmp_path), list(universe))
+    for symbol, bars in universe.items():
+        np.testing.assert_array_equal(data.symbol_data[symbol].datetime, bars.datetime)
+        np.testing.assert_allclose(data.symbol_data[symbol].columns["close"], bars.columns["close"])
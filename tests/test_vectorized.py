@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtester.event import FillEvent
+from backtester.strategy import BuyAndHoldStrategy, MovingAverageCrossStrategy
+from backtester.vectorized import check_parity, ib_commission
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+
+
+def write_random_walk(csv_dir, symbol, dates, seed):
+    rng = np.random.default_rng(seed)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates))))
+    frame = pd.DataFrame(
+        {"Open": close, "High": close * 1.01, "Low": close * 0.99, "Close": close,
+         "Adj Close": close, "Volume": 1000.0},
+        index=pd.DatetimeIndex(dates, name="Date"),
+    )
+    frame.to_csv(csv_dir / (symbol + ".csv"))
+
+def test_commission_matches_fill_event():
+    quantity = np.array([0, 50, 100, 500, 501, 1000, 5000])
+    expected = [0.0] + [FillEvent(None, "A", "X", q, "BUY", None).commission for q in quantity[1:]]
+    np.testing.assert_allclose(ib_commission(quantity), expected)
+
+@pytest.mark.parametrize("strategy_class, kwargs", [
+    (BuyAndHoldStrategy, {}),
+    (MovingAverageCrossStrategy, {"short_window": 10, "long_window": 30}),
+])
+def test_parity_on_btc(strategy_class, kwargs):
+    report = check_parity(DATA_DIR, ["BTC-USD"], strategy_class, kwargs)
+    assert report.ok, report
+
+def test_parity_across_misaligned_calendars(tmp_path):
+    write_random_walk(tmp_path, "BTC-USD", pd.date_range("2023-01-01", periods=300, freq="D"), 1)
+    write_random_walk(tmp_path, "SPY", pd.bdate_range("2023-01-10", periods=200), 2)
+
+    report = check_parity(str(tmp_path), ["BTC-USD", "SPY"], MovingAverageCrossStrategy,
+                          {"short_window": 5, "long_window": 20})
+
+    assert report.ok, report
+    assert len(report.event_curve) == len(pd.date_range("2023-01-01", periods=300)) + 1
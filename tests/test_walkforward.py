@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from backtester.bus import DequeEventBus
+from backtester.data import HistoricCSVDataHandler
+from backtester.performance import create_summary_metrics
+from backtester.strategy import MovingAverageCrossStrategy
+from backtester.sweep import parameter_grid
+from backtester.vectorized import AlignedHistory, VectorizedBacktest
+from backtester.walkforward import Window, WalkForward, walk_forward_windows
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+
+
+def load():
+    return HistoricCSVDataHandler(DequeEventBus(), DATA_DIR, ["BTC-USD"])
+
+def test_walk_forward_windows():
+    datetime = np.arange(10, dtype=np.int64)
+    assert walk_forward_windows(datetime, 4, 3) == [Window(0, 0, 4, 7), Window(1, 3, 7, 10)]
+    assert walk_forward_windows(datetime, 4, 3, anchored=True)[1] == Window(1, 0, 7, 10)
+    assert walk_forward_windows(datetime, 6, 3, step=2)[-1] == Window(1, 2, 8, 10)
+
+    days = np.arange("2020-01-01", "2020-01-11", dtype="datetime64[D]").astype("datetime64[ns]").view(np.int64)
+    assert walk_forward_windows(days, "4D", "3D") == walk_forward_windows(datetime, 4, 3)
+
+def test_walk_forward_matches_direct_runs_and_parallel():
+    data = load()
+    grid = parameter_grid(short_window=[5, 10], long_window=[30, 60])
+    walk = WalkForward(data, MovingAverageCrossStrategy, grid, train=500, test=250)
+    result = walk.run()
+    assert len(result) == len(walk.windows) > 1
+    # Indicators are computed once for all the windows
+    assert len(walk.history._indicators) == 4
+
+    record = result.records[1]
+    window = walk.windows[1]
+    history = AlignedHistory(load())
+    strategy = MovingAverageCrossStrategy(data, data.events, **record["params"])
+    curve = VectorizedBacktest(history.slice(window.train_stop, window.test_stop), strategy).run()
+    assert record["out_of_sample"] == create_summary_metrics(curve)
+    assert len(result.returns) == walk.windows[-1].test_stop - walk.windows[0].train_stop
+
+    parallel = WalkForward(data, MovingAverageCrossStrategy, grid, train=500, test=250, workers=2).run()
+    assert [r["params"] for r in parallel.records] == [r["params"] for r in result.records]
+    pd.testing.assert_frame_equal(parallel.to_frame(), result.to_frame())